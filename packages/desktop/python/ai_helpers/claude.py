@@ -1,31 +1,95 @@
-import os
-from dotenv import load_dotenv
-import anthropic
-from datetime import datetime
-
-# Get the directory of the current script
-current_dir = os.path.dirname(os.path.abspath(__file__))
-# Construct the path to the .env file
-env_path = os.path.join(os.path.dirname(current_dir), '.env')
-# Load the .env file
-load_dotenv(env_path)
+from ai_helpers.clients import anthropic_client
+from ai_helpers.response_cache import make_key, load, store
+from ai_helpers.llm_gateway import LLMGateway
+from ai_helpers.prompt_rendering import render_prompt_data
 
 # Define the variables
 PERSON_NAME = "Stefano"
 language = "English"
 interests = "philosophy, technology and neuroscience"
 
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+MODEL = "claude-3-5-sonnet-20240620"
+# Takes over while MODEL is rate limited or overloaded
+FALLBACK_MODEL = "claude-3-haiku-20240307"
 
-client = anthropic.Anthropic(
-    api_key=ANTHROPIC_API_KEY,
-)
+def message_usage(message):
+    # input_tokens only counts what came after the last cache breakpoint, the prompts set none yet
+    usage = message.usage
+    return {
+        "input_tokens": usage.input_tokens,
+        "cached_input_tokens": getattr(usage, "cache_read_input_tokens", None) or 0,
+        "cache_write_tokens": getattr(usage, "cache_creation_input_tokens", None) or 0,
+        "output_tokens": usage.output_tokens,
+    }
 
-def generate_mood_recap(mood_data):    
+# USD per million tokens, for the cost estimates on /metrics. Cache writes cost 25% more than
+# input, cache reads a tenth of it
+PRICES = {
+    MODEL: {"input_tokens": 3.0, "cached_input_tokens": 0.3, "cache_write_tokens": 3.75, "output_tokens": 15.0},
+    FALLBACK_MODEL: {"input_tokens": 0.25, "cached_input_tokens": 0.03, "cache_write_tokens": 0.3, "output_tokens": 1.25},
+}
+
+gateway = LLMGateway("anthropic", fallbacks={MODEL: FALLBACK_MODEL}, usage=message_usage, prices=PRICES)
+
+# Token budgets for the rendered <data> block of each prompt
+WEEKLY_DATA_BUDGET = 6000
+MONTHLY_DATA_BUDGET = 12000
+
+def _message_args(system, content, max_tokens, temperature, model):
+    return {
+        "model": model,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "system": system,
+        "messages": [
+            {
+                "role": "user",
+                "content": content
+            }
+        ]
+    }
+
+def create_message(system, content, max_tokens, temperature, model=MODEL, use_cache=True):
+    params = {"max_tokens": max_tokens, "temperature": temperature}
+    key = make_key(model, system, content, params)
+
+    if use_cache:
+        cached = load(key)
+        if cached is not None:
+            return cached
+
+    def request(current_model):
+        return anthropic_client().messages.with_raw_response.create(**_message_args(system, content, max_tokens, temperature, current_model))
+
+    message, answered_by = gateway.call(request, model)
+    text = message.content[0].text
+    # A fallback answer does for this request, but it should not be served later as the primary model's
+    if answered_by == model:
+        store(key, text)
+    return text
+
+def stream_message(system, content, max_tokens, temperature, model=MODEL, use_cache=True):
+    params = {"max_tokens": max_tokens, "temperature": temperature}
+    key = make_key(model, system, content, params)
+
+    if use_cache:
+        cached = load(key)
+        if cached is not None:
+            yield cached
+            return
+
+    def open_stream(current_model):
+        return anthropic_client().messages.stream(**_message_args(system, content, max_tokens, temperature, current_model))
+
+    text, answered_by = yield from gateway.stream(open_stream, model)
+    if answered_by == model:
+        store(key, text)
+
+def mood_recap_request(mood_data):
     original_prompt = f"""
 Here is the summary of the daily notes and mood data for the week:
 <data>
-{mood_data}
+{render_prompt_data(mood_data, WEEKLY_DATA_BUDGET, "weekly recap")}
 </data>
 
 Please carefully analyze this data. Based on your analysis, write a thoughtful <reflection> with the following sections:
@@ -40,31 +104,29 @@ Please begin your response with the <reflection> and end with the <questions_to_
 
     mood_user_message = original_prompt
 
-    message = client.messages.create(
-        model="claude-3-5-sonnet-20240620",
-        max_tokens=1000,
-        temperature=0.5,
-        system=f"You are an assistant tasked with analyzing and reflecting on {PERSON_NAME}'s data. He likes {interests} so keep that in mind when reflecting.",
-        messages=[
+    return {
+        "system": f"You are an assistant tasked with analyzing and reflecting on {PERSON_NAME}'s data. He likes {interests} so keep that in mind when reflecting.",
+        "content": [
             {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": mood_user_message
-                    }
-                ]
+                "type": "text",
+                "text": mood_user_message
             }
-        ]
-    )
+        ],
+        "max_tokens": 1000,
+        "temperature": 0.5
+    }
+
+def generate_mood_recap(mood_data, use_cache=True):
+    return create_message(**mood_recap_request(mood_data), use_cache=use_cache)
 
-    return message
+def stream_mood_recap(mood_data, use_cache=True):
+    return stream_message(**mood_recap_request(mood_data), use_cache=use_cache)
 
-def generate_monthly_mood_recap(mood_data):
+def monthly_mood_recap_request(mood_data):
     original_prompt = f"""
 Here is the summary of the daily notes and mood data for the month, also included are the weekly summaries for the month:
 <data>
-{mood_data}
+{render_prompt_data(mood_data, MONTHLY_DATA_BUDGET, "monthly recap")}
 </data>
 
 Please carefully analyze this data. Based on your analysis, write a thoughtful <reflection> with the following sections:
@@ -79,40 +141,63 @@ Please begin your response with the <reflection> and end with the <questions_to_
 
     mood_user_message = original_prompt
 
-    message = client.messages.create(
-        model="claude-3-5-sonnet-20240620",
-        max_tokens=2000,
-        temperature=0.5,
-        system=f"You are an assistant tasked with analyzing and reflecting on {PERSON_NAME}'s data. He likes {interests} so keep that in mind when reflecting.",
-        messages=[
+    return {
+        "system": f"You are an assistant tasked with analyzing and reflecting on {PERSON_NAME}'s data. He likes {interests} so keep that in mind when reflecting.",
+        "content": [
             {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": mood_user_message
-                    }
-                ]
+                "type": "text",
+                "text": mood_user_message
             }
-        ]
-    )
+        ],
+        "max_tokens": 2000,
+        "temperature": 0.5
+    }
 
-    return message
+def generate_monthly_mood_recap(mood_data, use_cache=True):
+    return create_message(**monthly_mood_recap_request(mood_data), use_cache=use_cache)
 
-def generate_journal_entry(journal_entries):
-    try:
-        current_date = datetime.now().strftime("%Y-%m-%d %H:%M")
-        
-        # Combine all journal entries into a single string
-        all_entries = "\n\n".join([f"Date: {entry['date']}\nEntry: {entry['text']}" for entry in journal_entries])
-        
-        prompt = f"""As an AI assistant, your task is to analyze and reflect on {PERSON_NAME}'s journal entries from a specific period. Here are all the entries:
+def stream_monthly_mood_recap(mood_data, use_cache=True):
+    return stream_message(**monthly_mood_recap_request(mood_data), use_cache=use_cache)
 
-{'-' * 40}
-{all_entries}
-{'-' * 40}
+def monthly_recap_from_weeks_request(monthly_data):
+    original_prompt = f"""
+Here are the weekly summaries for the month, each one with compact statistics for that week's daily notes and mood data:
+<data>
+{render_prompt_data(monthly_data, MONTHLY_DATA_BUDGET, "monthly recap from weeks")}
+</data>
+
+Please carefully analyze this data. Based on your analysis, write a thoughtful <reflection> on the month as a whole with the following sections:
 
-Based on these entries, please provide an AI-generated recap and reflection. Your response should include:
+- 'Nice' (A nice verbose summary of what went well in all areas)
+- 'Not so nice' (A nice verbose summary of what didn't go so well in all areas)
+
+After the reflection, please add a <questions_to_ponder> section with 4 insightful questions the person could ask themselves to further reflect on their habits progress and challenges, based solely on the provided data. Single questions and please smart questions that a behavioural psychologist would ask.
+    
+Please begin your response with the <reflection> and end with the <questions_to_ponder>. Always address the user directly in second person.
+"""
+
+    return {
+        "system": f"You are an assistant tasked with analyzing and reflecting on {PERSON_NAME}'s data. He likes {interests} so keep that in mind when reflecting.",
+        "content": [
+            {
+                "type": "text",
+                "text": original_prompt
+            }
+        ],
+        "max_tokens": 2000,
+        "temperature": 0.5
+    }
+
+def generate_monthly_recap_from_weeks(monthly_data, use_cache=True):
+    return create_message(**monthly_recap_from_weeks_request(monthly_data), use_cache=use_cache)
+
+def stream_monthly_recap_from_weeks(monthly_data, use_cache=True):
+    return stream_message(**monthly_recap_from_weeks_request(monthly_data), use_cache=use_cache)
+
+JOURNAL_SYSTEM = "You are an AI assistant tasked with analyzing and reflecting on a series of personal journal entries."
+
+def journal_reflection_instructions(source):
+    return f"""Based on these {source}, please provide an AI-generated recap and reflection. Your response should include:
 
 1. A comprehensive summary of the main themes, events, and emotions expressed across all of {PERSON_NAME}'s journal entries.
 2. Your perspective on {PERSON_NAME}'s reflections over this period, including potential insights, patterns, or developments that {PERSON_NAME} might not have noticed.
@@ -124,23 +209,67 @@ Remember, this is an YOUR reflection, not {PERSON_NAME}'s direct words.
 
 Write your response in {language}."""
 
-        # Make the API call to Claude
-        message = client.messages.create(
-            model="claude-3-5-sonnet-20240620",
-            max_tokens=2000,
-            temperature=0.7,
-            system="You are an AI assistant tasked with analyzing and reflecting on a series of personal journal entries.",
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-        )
-
-        # Extract and return the generated entry
-        return message.content[0].text
-
-    except Exception as e:
-        print(f"Error in generate_journal_entry: {str(e)}")
-        return f"An error occurred while generating the AI reflection: {str(e)}"
\ No newline at end of file
+def format_journal_entries(journal_entries):
+    return "\n\n".join([f"Date: {entry['date']}\nEntry: {entry['text']}" for entry in journal_entries])
+
+def journal_entry_request(journal_entries):
+    # Combine all journal entries into a single string
+    all_entries = format_journal_entries(journal_entries)
+
+    prompt = f"""As an AI assistant, your task is to analyze and reflect on {PERSON_NAME}'s journal entries from a specific period. Here are all the entries:
+
+{'-' * 40}
+{all_entries}
+{'-' * 40}
+
+{journal_reflection_instructions("entries")}"""
+
+    return {
+        "system": JOURNAL_SYSTEM,
+        "content": prompt,
+        "max_tokens": 2000,
+        "temperature": 0.7
+    }
+
+def journal_chunk_request(period, journal_entries):
+    prompt = f"""Here are {PERSON_NAME}'s journal entries for {period}:
+
+{'-' * 40}
+{format_journal_entries(journal_entries)}
+{'-' * 40}
+
+Write a compact summary of this period (at most 250 words) covering the main events, themes, emotions and any notable thoughts or decisions. Keep concrete details that might matter when looking back over a longer period. Do not add advice or questions.
+
+Write your response in {language}."""
+
+    return {
+        "system": JOURNAL_SYSTEM,
+        "content": prompt,
+        "max_tokens": 500,
+        "temperature": 0.3
+    }
+
+def journal_reduce_request(chunk_summaries):
+    all_summaries = "\n\n".join([f"Period: {chunk['period']}\nSummary: {chunk['summary']}" for chunk in chunk_summaries])
+
+    prompt = f"""As an AI assistant, your task is to analyze and reflect on {PERSON_NAME}'s journal entries from a specific period. The period is long, so here are summaries of the entries, one per chunk of time, in chronological order:
+
+{'-' * 40}
+{all_summaries}
+{'-' * 40}
+
+{journal_reflection_instructions("summaries")}"""
+
+    return {
+        "system": JOURNAL_SYSTEM,
+        "content": prompt,
+        "max_tokens": 2000,
+        "temperature": 0.7
+    }
+
+def generate_journal_entry(journal_entries, use_cache=True):
+    # Make the API call to Claude and return the generated entry, failures are raised to the endpoint
+    return create_message(**journal_entry_request(journal_entries), use_cache=use_cache)
+
+def stream_journal_entry(journal_entries, use_cache=True):
+    return stream_message(**journal_entry_request(journal_entries), use_cache=use_cache)
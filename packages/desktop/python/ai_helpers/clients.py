@@ -0,0 +1,50 @@
+import threading
+
+import settings
+from logger import logger
+
+#^ the SDKs are the slowest part of starting the server, so they are imported and their clients
+#^ built on first use. Under a pre-fork server that also means every worker builds its own clients
+#^ after the fork instead of sharing connection pools with the parent
+
+_lock = threading.Lock()
+_clients = {}
+
+def _get(name, build):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = build()
+    return client
+
+def _build_anthropic():
+    import anthropic
+
+    # Retries are done by the gateway, which also knows about the rate limits
+    return anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY, max_retries=0)
+
+def _build_openai():
+    import openai
+
+    return openai.OpenAI(api_key=settings.OPENAI_API_KEY, max_retries=0)
+
+def anthropic_client():
+    return _get("anthropic", _build_anthropic)
+
+def openai_client():
+    return _get("openai", _build_openai)
+
+def _warm_up():
+    for name, factory in (("anthropic", anthropic_client), ("openai", openai_client)):
+        try:
+            factory()
+        except Exception as e:
+            # Most likely a missing key, the first real call will report it
+            logger.warning(f"Could not set up the {name} client: {str(e)}")
+
+def warm_up():
+    # Builds the clients in the background once a worker is up, so it starts taking requests right
+    # away and the first LLM call does not pay for the SDK imports either
+    threading.Thread(target=_warm_up, name="clients-warm-up", daemon=True).start()
@@ -1,18 +1,50 @@
-import json
-import os
-import openai
-from dotenv import load_dotenv
 from logger import logger
-
-load_dotenv('./.env')
+from ai_helpers.clients import openai_client
+from ai_helpers.response_cache import make_key, load, store
+from ai_helpers.llm_gateway import LLMGateway
+from ai_helpers.prompt_rendering import render_prompt_data
+from ai_helpers.thoughts import Thoughts, ThoughtsValidationError, parse_thoughts, validate_sections, partial_sections
 
 EMBED_MODEL = "text-embedding-ada-002"
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+# Inputs per embeddings request, the API takes up to 2048
+EMBED_BATCH_SIZE = 256
+
+# Token budget for the rendered user data
+THOUGHTS_DATA_BUDGET = 4000
+
+MODEL = "gpt-4o"
+# Takes over while MODEL is rate limited
+FALLBACK_MODEL = "gpt-4o-mini"
+
+# Follow up turns asking only for the sections that failed validation, before giving up on them
+MAX_SECTION_REPAIRS = 2
+
+def completion_usage(completion):
+    # OpenAI caches long prompt prefixes by itself, prompt_tokens includes the cached part
+    usage = completion.usage
+    details = getattr(usage, "prompt_tokens_details", None)
+    # Older SDKs pass the details through as a plain dict
+    if isinstance(details, dict):
+        cached = details.get("cached_tokens") or 0
+    else:
+        cached = getattr(details, "cached_tokens", None) or 0
+    return {
+        "input_tokens": usage.prompt_tokens - cached,
+        "cached_input_tokens": cached,
+        # Embedding responses have no completion part
+        "output_tokens": getattr(usage, "completion_tokens", None) or 0,
+    }
+
+# USD per million tokens, for the cost estimates on /metrics. Cached prompt tokens are half price
+PRICES = {
+    MODEL: {"input_tokens": 2.5, "cached_input_tokens": 1.25, "output_tokens": 10.0},
+    FALLBACK_MODEL: {"input_tokens": 0.15, "cached_input_tokens": 0.075, "output_tokens": 0.6},
+    EMBED_MODEL: {"input_tokens": 0.1},
+}
 
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
+gateway = LLMGateway("openai", fallbacks={MODEL: FALLBACK_MODEL}, usage=completion_usage, prices=PRICES)
 
-def create_thoughts(data, pillars, model="gpt-4o"):    
-    system_message = '''
+THOUGHTS_SYSTEM = '''
 You are an AI assistant with expertise in behavioral psychology and neuroscience. Your task is to analyze the user's data and provide insightful feedback.
 
 You will be provided with a data structure containing:
@@ -56,33 +88,100 @@ Carefully analyze this data and return a JSON object with the following structur
 
 Ensure your analysis is empathetic and constructive.
 '''
-    
-    user_message = f'''Please create the summary based on this data: {data}
+
+def create_thoughts(data, pillars, model=MODEL, use_cache=True):
+    user_message = f'''Please create the summary based on this data:
+{render_prompt_data(data, THOUGHTS_DATA_BUDGET, "thoughts")}
 
 The user's life pillars are:
-{pillars}
+{render_prompt_data({"pillars": pillars}, name="pillars")}
 
 Please use these pillars when creating the next_week_goals.'''
 
     messages = [
-        {"role": "system", "content": system_message},
+        {"role": "system", "content": THOUGHTS_SYSTEM},
         {"role": "user", "content": user_message},
     ]
 
-    try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=0.8,
-            response_format={'type': "json_object"}
-        )
-
-        answer = json.loads(response.choices[0].message.content.strip()) 
-
-        return answer
-
-    except Exception as e:
-        print(f"An error occurred: {e}")
-
-
-
+    params = {"temperature": 0.8, "response_format": "json_object"}
+
+    key = make_key(model, THOUGHTS_SYSTEM, user_message, params)
+    if use_cache:
+        cached = load(key)
+        if cached is not None:
+            return cached
+
+    def complete(conversation):
+        def request(current_model):
+            return openai_client().chat.completions.with_raw_response.create(
+                model=current_model,
+                messages=conversation,
+                temperature=0.8,
+                response_format={'type': "json_object"}
+            )
+
+        # Failures are raised instead of printed, the pipeline decides what a missing answer means
+        response, answered_by = gateway.call(request, model)
+        return response.choices[0].message.content, answered_by
+
+    content, answered_by = complete(messages)
+    answered_by_primary = answered_by == model
+    raw = parse_thoughts(content)
+    sections, errors = validate_sections(raw, pillars)
+    replies = [raw]
+
+    # Only the broken sections are asked for again, on top of the same conversation so the prompt
+    # prefix is shared and the answer stays short
+    for attempt in range(MAX_SECTION_REPAIRS):
+        if not errors:
+            break
+        logger.warning(f'GPT thoughts failed validation, asking again for {", ".join(errors)} ({attempt + 1}/{MAX_SECTION_REPAIRS}): {errors}')
+        messages = messages + [
+            {"role": "assistant", "content": content},
+            {"role": "user", "content": repair_prompt(errors, pillars)},
+        ]
+        content, answered_by = complete(messages)
+        answered_by_primary = answered_by_primary and answered_by == model
+        raw = parse_thoughts(content)
+        fixed, errors = validate_sections(raw, pillars, list(errors))
+        sections.update(fixed)
+        replies.append(raw)
+
+    if errors:
+        if all(reply is None for reply in replies):
+            raise ThoughtsValidationError(errors)
+        # Keep what is usable of the failed sections, the clients expect every list to be there
+        logger.error(f'GPT thoughts still invalid after {MAX_SECTION_REPAIRS} repairs, returning what is valid: {errors}')
+        for reply in replies:
+            for section, value in partial_sections(reply, pillars, list(errors)).items():
+                if len(value) > len(sections.get(section, [])):
+                    sections[section] = value
+
+    answer = Thoughts(**sections).to_dict()
+    if answered_by_primary and not errors:
+        store(key, answer)
+    return answer
+
+def repair_prompt(errors, pillars):
+    problems = "\n".join(f"- {section}: {', '.join(section_problems)}" for section, section_problems in errors.items())
+    prompt = f'''These sections of your reply need fixing:
+{problems}
+
+Reply with a JSON object with only these keys: {", ".join(errors)}. Keep the same structure as before.'''
+    if "next_week_goals" in errors and pillars:
+        choices = "\n".join(f"- {pillar.get('uuid')} | {pillar.get('name')} | {pillar.get('emoji', '')}" for pillar in pillars)
+        prompt += f"\n\nEvery goal must use one of these pillars (uuid | name | emoji):\n{choices}"
+    return prompt
+
+def create_embeddings(texts, model=EMBED_MODEL):
+    # One vector per text, in the same order
+    vectors = []
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        batch = texts[start:start + EMBED_BATCH_SIZE]
+
+        def request(current_model):
+            return openai_client().embeddings.with_raw_response.create(model=current_model, input=batch)
+
+        response, _ = gateway.call(request, model)
+        vectors.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+    return vectors
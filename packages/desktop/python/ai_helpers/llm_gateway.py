@@ -0,0 +1,385 @@
+import re
+import time
+import random
+import threading
+from datetime import datetime, timezone
+
+from logger import logger
+from metrics import LLM_CALL_SECONDS, LLM_FIRST_TOKEN_SECONDS, LLM_TOKENS, LLM_COST, CACHE_REQUESTS, ERRORS
+
+# Worth another try: timeouts, conflicts, rate limits, server errors and Anthropic's 529 overloaded
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+# The ones that mean we are sending too much, these shrink the concurrency limit
+SATURATED_STATUSES = {429, 529}
+
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 1.0  # Seconds, doubled per attempt, the actual sleep is a random fraction of it
+BACKOFF_MAX = 30.0
+ACQUIRE_TIMEOUT = 60  # Longest a call waits for a free slot before giving up
+
+INITIAL_CONCURRENCY = 4
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 16
+# When the headers say we are about to run out, new calls wait for the window to reset
+LOW_REMAINING_REQUESTS = 1
+LOW_REMAINING_TOKENS = 2000
+# A primary model that would make us wait longer than this, or that was just rate limited twice
+# in a row, hands its calls over to the fallback model
+FALLBACK_AFTER = 10.0
+SATURATED_STREAK = 2
+
+# Anthropic and OpenAI name their rate limit headers differently
+REMAINING_REQUESTS_HEADERS = ("anthropic-ratelimit-requests-remaining", "x-ratelimit-remaining-requests")
+RESET_REQUESTS_HEADERS = ("anthropic-ratelimit-requests-reset", "x-ratelimit-reset-requests")
+REMAINING_TOKENS_HEADERS = ("anthropic-ratelimit-tokens-remaining", "x-ratelimit-remaining-tokens")
+RESET_TOKENS_HEADERS = ("anthropic-ratelimit-tokens-reset", "x-ratelimit-reset-tokens")
+
+# One line per LLM call with its tokens and cost, can be sampled through LOG_SAMPLING
+llm_logger = logger.getChild("llm")
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+class LLMUnavailableError(Exception):
+    pass
+
+def error_type(error):
+    # The HTTP status when there is one, so 429s and 529s can be told apart from timeouts
+    status = getattr(error, "status_code", None)
+    return str(status) if status is not None else type(error).__name__
+
+def _header(headers, names):
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            return value
+    return None
+
+def parse_reset(value):
+    # Seconds until a reset given as "12", "1m30s"/"250ms" (OpenAI) or an RFC 3339 timestamp (Anthropic)
+    if value is None:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if parts and "".join(number + unit for number, unit in parts) == value:
+        return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+    try:
+        reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return max((reset_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except ValueError:
+        return None
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def is_transient(error):
+    if getattr(error, "status_code", None) in RETRY_STATUSES:
+        return True
+    # Connection errors and timeouts from either SDK, without importing both here
+    return any(cls.__name__ == "APIConnectionError" for cls in type(error).__mro__)
+
+def _error_headers(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "headers", None)
+
+class AdaptiveLimiter:
+    # AIMD concurrency limit for one model: each success adds 1/limit (about +1 per full round of
+    # calls), each rate limit or overload halves it. The rate limit headers can also hold every
+    # new call back until the provider's window resets
+    def __init__(self, name, initial=INITIAL_CONCURRENCY, minimum=MIN_CONCURRENCY, maximum=MAX_CONCURRENCY):
+        self.name = name
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.saturated_streak = 0
+        self._condition = threading.Condition()
+        self.stats = {"calls": 0, "saturated": 0, "errors": 0}
+
+    def wait_time(self):
+        return max(self.blocked_until - time.monotonic(), 0.0)
+
+    def is_saturated(self):
+        # The streak only counts while the model is still held back, so it gets tried again afterwards
+        wait = self.wait_time()
+        return wait > FALLBACK_AFTER or (wait > 0 and self.saturated_streak >= SATURATED_STREAK)
+
+    def acquire(self, timeout=ACQUIRE_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                blocked = self.blocked_until - now
+                if blocked <= 0 and self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return True
+                remaining = deadline - now
+                if remaining <= 0:
+                    return False
+                self._condition.wait(min(blocked, remaining) if blocked > 0 else remaining)
+
+    def release(self, outcome):
+        with self._condition:
+            self.in_flight -= 1
+            self.stats["calls"] += 1
+            if outcome == "ok":
+                self.limit = min(self.limit + 1 / self.limit, self.maximum)
+                self.saturated_streak = 0
+            elif outcome == "saturated":
+                self.limit = max(self.limit / 2, self.minimum)
+                self.saturated_streak += 1
+                self.stats["saturated"] += 1
+            else:
+                self.stats["errors"] += 1
+            self._condition.notify_all()
+
+    def block_for(self, seconds):
+        with self._condition:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def observe(self, headers):
+        if not headers:
+            return
+        waits = []
+        remaining_requests = _to_int(_header(headers, REMAINING_REQUESTS_HEADERS))
+        if remaining_requests is not None and remaining_requests <= LOW_REMAINING_REQUESTS:
+            waits.append(parse_reset(_header(headers, RESET_REQUESTS_HEADERS)))
+        remaining_tokens = _to_int(_header(headers, REMAINING_TOKENS_HEADERS))
+        if remaining_tokens is not None and remaining_tokens <= LOW_REMAINING_TOKENS:
+            waits.append(parse_reset(_header(headers, RESET_TOKENS_HEADERS)))
+        waits = [wait for wait in waits if wait]
+        if waits:
+            logger.info(f"{self.name}: close to the rate limit, holding new calls for {max(waits):.1f}s")
+            self.block_for(max(waits))
+
+    def snapshot(self):
+        with self._condition:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "blocked_for": round(self.wait_time(), 2),
+                **self.stats,
+            }
+
+class UsageStats:
+    # Token counts and latency for one model, split by whether the provider served part of the
+    # prompt from its prompt cache
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals = {
+            "calls": 0,
+            "cached_calls": 0,
+            "input_tokens": 0,  # Billed at the full rate
+            "cached_input_tokens": 0,  # Read from the prompt cache
+            "cache_write_tokens": 0,  # Written to the prompt cache (Anthropic bills these a bit higher)
+            "output_tokens": 0,
+        }
+        self.cost = 0.0
+        self.latency = {"cached": 0.0, "uncached": 0.0}
+        self.first_token = {"calls": 0, "cached": 0.0, "uncached": 0.0}
+
+    def record(self, usage, latency, first_token=None, cost=None):
+        cached = usage.get("cached_input_tokens", 0) > 0
+        kind = "cached" if cached else "uncached"
+        with self._lock:
+            self.totals["calls"] += 1
+            self.totals["cached_calls"] += cached
+            for field, value in usage.items():
+                self.totals[field] += value
+            self.cost += cost or 0.0
+            self.latency[kind] += latency
+            if first_token is not None:
+                self.first_token["calls"] += 1
+                self.first_token[kind] += first_token
+
+    def snapshot(self):
+        with self._lock:
+            totals = dict(self.totals)
+            cached_calls = totals["cached_calls"]
+            uncached_calls = totals["calls"] - cached_calls
+            prompt_tokens = totals["input_tokens"] + totals["cached_input_tokens"] + totals["cache_write_tokens"]
+            return {
+                **totals,
+                "cost_usd": round(self.cost, 4),
+                "cached_prompt_share": round(totals["cached_input_tokens"] / prompt_tokens, 3) if prompt_tokens else 0.0,
+                "avg_latency_cached": round(self.latency["cached"] / cached_calls, 3) if cached_calls else None,
+                "avg_latency_uncached": round(self.latency["uncached"] / uncached_calls, 3) if uncached_calls else None,
+                # Streams only, the calls are not split here since they are few
+                "avg_first_token": round((self.first_token["cached"] + self.first_token["uncached"]) / self.first_token["calls"], 3) if self.first_token["calls"] else None,
+            }
+
+class LLMGateway:
+    # One per provider. Every call goes through the limiter of the model it runs on, transient
+    # failures are retried with jittered backoff and a saturated model falls back to its secondary.
+    # usage(response) turns the provider's usage block into UsageStats fields, prices maps a model to
+    # the USD per million tokens of each of those fields
+    def __init__(self, name, fallbacks=None, usage=None, prices=None):
+        self.name = name
+        self.fallbacks = fallbacks or {}
+        self.usage = usage
+        self.prices = prices or {}
+        self._limiters = {}
+        self._usage_stats = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, model):
+        with self._lock:
+            limiter = self._limiters.get(model)
+            if limiter is None:
+                limiter = self._limiters[model] = AdaptiveLimiter(f"{self.name}/{model}")
+            return limiter
+
+    def usage_stats(self, model):
+        with self._lock:
+            stats = self._usage_stats.get(model)
+            if stats is None:
+                stats = self._usage_stats[model] = UsageStats()
+            return stats
+
+    def cost(self, model, usage):
+        prices = self.prices.get(model)
+        if prices is None:
+            return None
+        return sum(usage.get(field, 0) * price for field, price in prices.items()) / 1_000_000
+
+    def _record_usage(self, model, response, latency, first_token=None):
+        if first_token is not None:
+            LLM_FIRST_TOKEN_SECONDS.observe(first_token, provider=self.name, model=model)
+        usage = None
+        if self.usage is not None and response is not None:
+            try:
+                usage = self.usage(response)
+            except (AttributeError, TypeError) as e:
+                logger.warning(f"{self.name}: could not read the usage of a {model} response ({e})")
+        if usage is None:
+            LLM_CALL_SECONDS.observe(latency, provider=self.name, model=model, prompt_cache="unknown")
+            return
+
+        cost = self.cost(model, usage)
+        prompt_cache = "hit" if usage.get("cached_input_tokens", 0) > 0 else "miss"
+        self.usage_stats(model).record(usage, latency, first_token, cost)
+        LLM_CALL_SECONDS.observe(latency, provider=self.name, model=model, prompt_cache=prompt_cache)
+        CACHE_REQUESTS.inc(cache=f"{self.name}_prompt", result=prompt_cache)
+        for field, value in usage.items():
+            LLM_TOKENS.inc(value, provider=self.name, model=model, type=field.removesuffix("_tokens"))
+        if cost:
+            LLM_COST.inc(cost, provider=self.name, model=model)
+        llm_logger.info(f"{self.name}: {model} answered in {latency:.2f}s", extra={"fields": {
+            "provider": self.name,
+            "model": model,
+            "latency": round(latency, 3),
+            "first_token": round(first_token, 3) if first_token is not None else None,
+            **usage,
+            "cost_usd": round(cost, 6) if cost is not None else None,
+        }})
+
+    def _choose(self, model):
+        fallback = self.fallbacks.get(model)
+        if fallback and self.limiter(model).is_saturated() and not self.limiter(fallback).is_saturated():
+            logger.warning(f"{self.name}: {model} is saturated, using {fallback}")
+            return fallback
+        return model
+
+    def _failed(self, limiter, error, attempt):
+        # Returns the outcome for the limiter and how long to sleep before the next attempt
+        headers = _error_headers(error)
+        limiter.observe(headers)
+        if getattr(error, "status_code", None) in SATURATED_STATUSES:
+            retry_after = parse_reset(headers.get("retry-after")) if headers else None
+            # The limiter holds the model back, which leaves the fallback free to take over right away
+            limiter.block_for(retry_after if retry_after is not None else self._backoff(attempt))
+            return "saturated", 0.0
+        return "error", self._backoff(attempt)
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX))
+
+    def _attempts(self, model):
+        for attempt in range(MAX_ATTEMPTS):
+            current = self._choose(model)
+            limiter = self.limiter(current)
+            if not limiter.acquire():
+                ERRORS.inc(component=self.name, type="no_free_slot")
+                raise LLMUnavailableError(f"{self.name}: no free slot for {current} after {ACQUIRE_TIMEOUT}s")
+            yield attempt, current, limiter
+
+    def call(self, request, model):
+        # request(model) must return a raw SDK response (with_raw_response), so the rate limit
+        # headers can be read. Returns (parsed response, model that answered)
+        last_error = None
+        for attempt, current, limiter in self._attempts(model):
+            outcome, delay = "error", 0.0
+            try:
+                started = time.perf_counter()
+                raw = request(current)
+                latency = time.perf_counter() - started
+                limiter.observe(raw.headers)
+                outcome = "ok"
+                parsed = raw.parse()
+                self._record_usage(current, parsed, latency)
+                return parsed, current
+            except Exception as e:
+                ERRORS.inc(component=self.name, type=error_type(e))
+                if not is_transient(e):
+                    raise
+                outcome, delay = self._failed(limiter, e, attempt)
+                last_error = e
+                logger.warning(f"{self.name}: {current} attempt {attempt + 1}/{MAX_ATTEMPTS} failed ({e}), retrying")
+            finally:
+                limiter.release(outcome)
+            if attempt < MAX_ATTEMPTS - 1:
+                time.sleep(delay)
+        ERRORS.inc(component=self.name, type="unavailable")
+        raise LLMUnavailableError(f"{self.name}: {model} still failing after {MAX_ATTEMPTS} attempts: {last_error}") from last_error
+
+    def stream(self, open_stream, model):
+        # open_stream(model) returns the SDK's stream context manager. Yields text as it arrives and
+        # returns (full text, model that answered). Only failures before the first token are retried
+        last_error = None
+        for attempt, current, limiter in self._attempts(model):
+            outcome, delay = "error", 0.0
+            chunks = []
+            try:
+                started = time.perf_counter()
+                first_token = None
+                with open_stream(current) as stream:
+                    limiter.observe(getattr(getattr(stream, "response", None), "headers", None))
+                    for text in stream.text_stream:
+                        if first_token is None:
+                            first_token = time.perf_counter() - started
+                        chunks.append(text)
+                        yield text
+                    final = stream.get_final_message() if hasattr(stream, "get_final_message") else None
+                outcome = "ok"
+                self._record_usage(current, final, time.perf_counter() - started, first_token)
+                return "".join(chunks), current
+            except Exception as e:
+                ERRORS.inc(component=self.name, type=error_type(e))
+                if chunks or not is_transient(e):
+                    raise
+                outcome, delay = self._failed(limiter, e, attempt)
+                last_error = e
+                logger.warning(f"{self.name}: {current} stream attempt {attempt + 1}/{MAX_ATTEMPTS} failed ({e}), retrying")
+            finally:
+                limiter.release(outcome)
+            if attempt < MAX_ATTEMPTS - 1:
+                time.sleep(delay)
+        ERRORS.inc(component=self.name, type="unavailable")
+        raise LLMUnavailableError(f"{self.name}: {model} still failing after {MAX_ATTEMPTS} attempts: {last_error}") from last_error
+
+    def snapshot(self):
+        with self._lock:
+            limiters = dict(self._limiters)
+            usage_stats = dict(self._usage_stats)
+        snapshot = {model: limiter.snapshot() for model, limiter in limiters.items()}
+        for model, stats in usage_stats.items():
+            snapshot.setdefault(model, {})["usage"] = stats.snapshot()
+        return snapshot
@@ -0,0 +1,158 @@
+import copy
+
+from logger import logger
+from metrics import PROMPT_DATA_TOKENS
+
+# One line per rendered prompt, sampled through LOG_SAMPLING. The token counts also go to
+# PROMPT_DATA_TOKENS, which sees every prompt
+prompt_logger = logger.getChild("prompts")
+
+# Budgets are in estimated prompt tokens for the rendered <data> block
+DEFAULT_TOKEN_BUDGET = 6000
+
+# Text fields get shortened to these lengths, one step at a time, before anything is dropped
+TRUNCATE_STEPS = [600, 300, 150]
+# Fields dropped first when truncating is not enough, least useful first
+LOW_VALUE_FIELDS = ["startTime", "endTime", "description", "comment", "tag", "morningComment"]
+
+def estimate_tokens(text):
+    #^ rough heuristic, ~4 characters per token for English text
+    return len(text) // 4
+
+def _format_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:g}"
+    if isinstance(value, (list, tuple)):
+        return ", ".join(_format_value(item) for item in value)
+    if isinstance(value, dict):
+        return "; ".join(f"{key}={_format_value(item)}" for key, item in value.items())
+    return str(value).replace("\n", " / ").replace("|", "/")
+
+def _flatten(row):
+    flat = {}
+    for key, value in row.items():
+        if isinstance(value, dict):
+            for sub_key, sub_value in value.items():
+                flat[f"{key}.{sub_key}"] = sub_value
+        else:
+            flat[key] = value
+    return flat
+
+def render_table(rows):
+    rows = [_flatten(row) for row in rows]
+    columns = []
+    for row in rows:
+        for key in row:
+            if key not in columns:
+                columns.append(key)
+
+    lines = ["|".join(columns)]
+    for row in rows:
+        lines.append("|".join(_format_value(row.get(column)) for column in columns))
+    return "\n".join(lines)
+
+def render_data(data):
+    if not isinstance(data, dict):
+        return _format_value(data)
+
+    sections = []
+    for name, value in data.items():
+        if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+            sections.append(f"## {name} ({len(value)} rows)\n{render_table(value)}")
+        elif isinstance(value, list):
+            sections.append(f"## {name}\n" + "\n".join(f"- {_format_value(item)}" for item in value))
+        elif isinstance(value, str):
+            sections.append(f"## {name}\n{value}")
+        else:
+            sections.append(f"## {name}\n{_format_value(value)}")
+    return "\n\n".join(sections)
+
+def _tables(data):
+    if not isinstance(data, dict):
+        return []
+    return [value for value in data.values() if isinstance(value, list) and value and all(isinstance(item, dict) for item in value)]
+
+def _truncate_text(data, limit):
+    truncated = False
+    for table in _tables(data):
+        for row in table:
+            for key, value in row.items():
+                if isinstance(value, str) and len(value) > limit:
+                    row[key] = value[:limit] + "..."
+                    truncated = True
+    return truncated
+
+def _drop_field(data, field):
+    dropped = False
+    for table in _tables(data):
+        for row in table:
+            if field in row:
+                del row[field]
+                dropped = True
+    return dropped
+
+def _sort_by_date(data):
+    # Rows are not guaranteed to arrive in date order, tables where every row has a date are
+    # sorted so the oldest rows really are the ones dropped
+    for table in _tables(data):
+        if all(isinstance(row.get("date"), str) for row in table):
+            table.sort(key=lambda row: row["date"])
+
+def _drop_oldest_row(data):
+    tables = _tables(data)
+    if not tables:
+        return None
+    # The oldest row of the biggest table goes first
+    return max(tables, key=len).pop(0)
+
+def fit_to_budget(data, budget):
+    data = copy.deepcopy(data)
+    trimmed = []
+    text = render_data(data)
+
+    for limit in TRUNCATE_STEPS:
+        if estimate_tokens(text) <= budget:
+            return text, trimmed
+        if _truncate_text(data, limit):
+            trimmed.append(f"truncated text to {limit} chars")
+            text = render_data(data)
+
+    for field in LOW_VALUE_FIELDS:
+        if estimate_tokens(text) <= budget:
+            return text, trimmed
+        if _drop_field(data, field):
+            trimmed.append(f"dropped {field}")
+            text = render_data(data)
+
+    dropped_rows = 0
+    excess = estimate_tokens(text) - budget
+    if excess > 0:
+        _sort_by_date(data)
+    while excess > 0:
+        row = _drop_oldest_row(data)
+        if row is None:
+            break
+        # Estimate from the row's own line instead of re-rendering everything per row
+        excess -= estimate_tokens(render_table([row]).split("\n", 1)[1]) + 1
+        dropped_rows += 1
+    if dropped_rows:
+        text = render_data(data)
+        trimmed.append(f"dropped {dropped_rows} oldest rows")
+
+    return text, trimmed
+
+def render_prompt_data(data, budget=DEFAULT_TOKEN_BUDGET, name="prompt"):
+    text, trimmed = fit_to_budget(data, budget)
+
+    repr_tokens = estimate_tokens(str(data))
+    rendered_tokens = estimate_tokens(text)
+    PROMPT_DATA_TOKENS.inc(rendered_tokens, prompt=name, type="rendered")
+    PROMPT_DATA_TOKENS.inc(max(repr_tokens - rendered_tokens, 0), prompt=name, type="saved")
+    prompt_logger.info(
+        f'{name}: ~{rendered_tokens} tokens (repr ~{repr_tokens}, saved ~{repr_tokens - rendered_tokens})'
+        + (f', trimmed: {", ".join(trimmed)}' if trimmed else '')
+    )
+
+    return text
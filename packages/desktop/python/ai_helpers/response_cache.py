@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+from metrics import CACHE_REQUESTS
+
+# Get the directory of the current script
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+CACHE_DIR = os.path.join(os.path.dirname(current_dir), 'cache')
+CACHE_PATH = os.path.join(CACHE_DIR, 'llm_responses.sqlite3')
+CACHE_TTL = 7 * 24 * 60 * 60  # Seconds a cached response stays valid
+MAX_CACHE_BYTES = 50 * 1024 * 1024  # Least recently used entries are evicted above this
+
+_lock = threading.Lock()
+_connection = None
+
+def _get_connection():
+    global _connection
+    if _connection is None:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        _connection = sqlite3.connect(CACHE_PATH, check_same_thread=False)
+        _connection.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        _connection.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses (last_access)")
+        _connection.commit()
+    return _connection
+
+def make_key(model, system, prompt, params):
+    payload = json.dumps({
+        "model": model,
+        "system": system,
+        "prompt": prompt,
+        "params": params
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def load(key):
+    now = time.time()
+    with _lock:
+        conn = _get_connection()
+        row = conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            CACHE_REQUESTS.inc(cache="responses", result="miss")
+            return None
+        value, created_at = row
+        if now - created_at > CACHE_TTL:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            conn.commit()
+            CACHE_REQUESTS.inc(cache="responses", result="miss")
+            return None
+        conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        conn.commit()
+    CACHE_REQUESTS.inc(cache="responses", result="hit")
+    return json.loads(value)
+
+def store(key, value):
+    now = time.time()
+    serialized = json.dumps(value, ensure_ascii=False)
+    with _lock:
+        conn = _get_connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+            (key, serialized, len(serialized), now, now)
+        )
+        _evict(conn, now)
+        conn.commit()
+
+def _evict(conn, now):
+    conn.execute("DELETE FROM responses WHERE created_at < ?", (now - CACHE_TTL,))
+    total_size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    if total_size <= MAX_CACHE_BYTES:
+        return
+    # Drop least recently used entries until we are back under the limit
+    for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall():
+        conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        total_size -= size
+        if total_size <= MAX_CACHE_BYTES:
+            break
+
+def clear():
+    with _lock:
+        conn = _get_connection()
+        conn.execute("DELETE FROM responses")
+        conn.commit()
@@ -0,0 +1,326 @@
+import os
+import re
+import json
+import uuid
+import hashlib
+import threading
+from contextlib import contextmanager
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows, where the server always runs as a single process (waitress)
+
+import settings
+from ai_helpers.gpt import EMBED_MODEL, create_embeddings
+from logger import logger
+
+# Get the directory of the current script
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+INDEX_DIR = os.path.join(os.path.dirname(current_dir), 'cache', 'semantic_index')
+EMBED_BACKEND = settings.EMBED_BACKEND
+LOCAL_EMBED_DIM = 256
+# ada-002 takes up to 8191 tokens per input, at ~4 characters per token
+MAX_EMBED_CHARS = 24000
+# Past entries added to a summary prompt when related entries are requested
+RELATED_TOP_K = 8
+
+# The note fields worth searching, each one is indexed as its own entry
+NOTE_FIELDS = ["morningComment", "success", "beBetter"]
+
+_TOKEN = re.compile(r"\w+")
+
+class SemanticIndexUnavailable(Exception):
+    pass
+
+def local_embed(texts):
+    # Feature hashing of the words and word pairs: no network, the same vector for the same text
+    # on every machine, and texts sharing words still end up close to each other
+    vectors = np.zeros((len(texts), LOCAL_EMBED_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = _TOKEN.findall(text.lower())
+        for feature in words + [f"{first} {second}" for first, second in zip(words, words[1:])]:
+            digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], 'little') % LOCAL_EMBED_DIM
+            vectors[row, bucket] += 1.0 if digest[4] & 1 else -1.0
+    return vectors
+
+def openai_embed(texts):
+    return create_embeddings(texts)
+
+# Vectors of different models never share an index, each gets its own folder
+EMBEDDERS = {
+    "openai": (EMBED_MODEL, openai_embed),
+    "local": (f"local-hash-{LOCAL_EMBED_DIM}", local_embed),
+}
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def _text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def _unique_id(seen, entry_id):
+    # Several entries can fall on the same day, the later ones get a #n suffix
+    seen[entry_id] = seen.get(entry_id, 0) + 1
+    if seen[entry_id] > 1:
+        return f"{entry_id}#{seen[entry_id]}"
+    return entry_id
+
+def records_from_data(data):
+    # Journal entries and the free text note fields of a request, one record per piece of text.
+    # Ids only depend on kind and date, so an edited entry replaces its old vector
+    records = []
+    seen = {}
+    for entry in data.get("journalData") or []:
+        text = entry.get("text")
+        if entry.get("date") and isinstance(text, str) and text.strip():
+            entry_id = _unique_id(seen, f"journal:{entry['date'][:10]}")
+            records.append({"id": entry_id, "date": entry["date"][:10], "kind": "journal", "text": text})
+    for note in data.get("dailyNoteData") or []:
+        if not note.get("date"):
+            continue
+        for field in NOTE_FIELDS:
+            text = note.get(field)
+            if isinstance(text, str) and text.strip():
+                entry_id = _unique_id(seen, f"{field}:{note['date'][:10]}")
+                records.append({"id": entry_id, "date": note["date"][:10], "kind": field, "text": text})
+    return records
+
+class SemanticIndex:
+    # Brute force cosine search over normalised vectors, which is plenty for a personal journal.
+    # The vectors live in a .npy file opened as a memory map, the entries and the name of the
+    # current vectors file in a small manifest. Every save writes a new, uniquely named vectors
+    # file and then swaps the manifest, so readers never see half an update (and Windows never has
+    # to replace a file that is still mapped). Several server workers can share the folder: updates
+    # take a file lock and start from the latest manifest, searches pick up a newer one on their own
+    def __init__(self, name, embed_fn, directory):
+        self.name = name
+        self.embed_fn = embed_fn
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self.lock_path = os.path.join(directory, 'index.lock')
+        self.entries = []
+        self.positions = {}
+        self.vectors = None
+        self.vectors_file = None
+        self.generation = 0
+        self.manifest_version = None
+        # Searches read whatever is current, updates are serialised so nothing is embedded twice
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self.stats = {"embedded": 0, "unchanged": 0, "searches": 0}
+        self._load()
+
+    def _vectors_path(self, vectors_file):
+        return os.path.join(self.directory, vectors_file)
+
+    def _read_manifest_version(self):
+        try:
+            stat = os.stat(self.manifest_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    @contextmanager
+    def _process_lock(self):
+        # Keeps the updates of other worker processes out while this one reads, embeds and saves
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        version = self._read_manifest_version()
+        if version is None:
+            return
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            # Manifests written before the files got unique names only have the generation
+            vectors_file = manifest.get("vectors") or f'vectors-{manifest["generation"]}.npy'
+            vectors = np.load(self._vectors_path(vectors_file), mmap_mode='r')
+            if vectors.shape[0] != len(manifest["entries"]):
+                raise ValueError(f"{vectors.shape[0]} vectors for {len(manifest['entries'])} entries")
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Semantic index {self.name} could not be loaded: {str(e)}")
+            return
+        with self._lock:
+            # A slow reload must not put back an older index than the one just saved
+            if manifest["generation"] < self.generation:
+                return
+            self.generation = manifest["generation"]
+            self.entries = manifest["entries"]
+            self.positions = {entry["id"]: row for row, entry in enumerate(self.entries)}
+            self.vectors = vectors
+            self.vectors_file = vectors_file
+            self.manifest_version = version
+
+    def _refresh(self):
+        # Another worker may have saved since, a stat per call is all it costs when nothing changed
+        version = self._read_manifest_version()
+        if version is not None and version != self.manifest_version:
+            self._load()
+
+    def _save(self, entries, vectors):
+        # Called with the process lock held
+        generation = self.generation + 1
+        vectors_file = f'vectors-{generation}-{uuid.uuid4().hex[:12]}.npy'
+        np.save(self._vectors_path(vectors_file), vectors)
+
+        temp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"model": self.name, "generation": generation, "vectors": vectors_file, "entries": entries}, f, ensure_ascii=False)
+        os.replace(temp_path, self.manifest_path)
+
+        old_file = self.vectors_file
+        mapped = np.load(self._vectors_path(vectors_file), mmap_mode='r')
+        with self._lock:
+            self.generation = generation
+            self.entries = entries
+            self.positions = {entry["id"]: row for row, entry in enumerate(entries)}
+            self.vectors = mapped
+            self.vectors_file = vectors_file
+            self.manifest_version = self._read_manifest_version()
+        if old_file is None:
+            return
+        try:
+            # Other workers that still map it keep their view (POSIX), they reload on their next call
+            os.remove(self._vectors_path(old_file))
+        except OSError:
+            pass  # Still mapped by a search in flight (Windows), or never existed
+
+    def update(self, records):
+        # Only records that are new or whose text changed are embedded. A record id that shows up
+        # twice keeps the last one, a row has to exist before it can be overwritten
+        records = list({record["id"]: record for record in records}.values())
+        with self._update_lock, self._process_lock():
+            self._refresh()
+            with self._lock:
+                entries = list(self.entries)
+                positions = dict(self.positions)
+                vectors = self.vectors
+
+            pending = []
+            for record in records:
+                text_hash = _text_hash(record["text"])
+                row = positions.get(record["id"])
+                if row is not None and entries[row]["hash"] == text_hash:
+                    continue
+                pending.append({**record, "hash": text_hash})
+
+            unchanged = len(records) - len(pending)
+            self.stats["unchanged"] += unchanged
+            if not pending:
+                return {"embedded": 0, "unchanged": unchanged, "total": len(entries)}
+
+            embedded = _normalize(self.embed_fn([record["text"][:MAX_EMBED_CHARS] for record in pending]))
+            matrix = np.array(vectors) if vectors is not None else np.zeros((0, embedded.shape[1]), dtype=np.float32)
+            added = []
+            for record, vector in zip(pending, embedded):
+                row = positions.get(record["id"])
+                if row is None:
+                    positions[record["id"]] = len(entries)
+                    added.append(vector)
+                    entries.append(record)
+                else:
+                    matrix[row] = vector
+                    entries[row] = record
+            if added:
+                matrix = np.vstack([matrix, np.stack(added)])
+
+            self._save(entries, matrix)
+            self.stats["embedded"] += len(pending)
+            logger.info(f"Semantic index {self.name}: embedded {len(pending)} entries, {unchanged} unchanged, {len(entries)} total")
+            return {"embedded": len(pending), "unchanged": unchanged, "total": len(entries)}
+
+    def search(self, query, k=RELATED_TOP_K, kinds=None, start=None, end=None, exclude_dates=None):
+        self._refresh()
+        with self._lock:
+            entries = self.entries
+            vectors = self.vectors
+        self.stats["searches"] += 1
+        if vectors is None or not entries:
+            return []
+
+        query_vector = _normalize(self.embed_fn([query[:MAX_EMBED_CHARS]]))[0]
+        scores = np.asarray(vectors @ query_vector, dtype=np.float32)
+
+        if kinds or start or end or exclude_dates:
+            excluded = set(exclude_dates or ())
+            keep = np.array([
+                (not kinds or entry["kind"] in kinds)
+                and (not start or entry["date"] >= start[:10])
+                and (not end or entry["date"] <= end[:10])
+                and entry["date"] not in excluded
+                for entry in entries
+            ])
+            scores = np.where(keep, scores, -np.inf)
+
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {"date": entries[row]["date"], "kind": entries[row]["kind"], "text": entries[row]["text"], "score": round(float(scores[row]), 4)}
+            for row in top
+        ]
+
+    def snapshot(self):
+        with self._lock:
+            return {"model": self.name, "entries": len(self.entries), **self.stats}
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index(backend=None):
+    if np is None:
+        raise SemanticIndexUnavailable("The semantic index needs numpy, install it to enable search")
+    backend = backend or EMBED_BACKEND
+    if backend not in EMBEDDERS:
+        raise SemanticIndexUnavailable(f"Unknown embedding backend '{backend}', expected one of: {', '.join(EMBEDDERS)}")
+    with _indexes_lock:
+        index = _indexes.get(backend)
+        if index is None:
+            name, embed_fn = EMBEDDERS[backend]
+            index = _indexes[backend] = SemanticIndex(name, embed_fn, os.path.join(INDEX_DIR, name))
+        return index
+
+def index_snapshots():
+    # Only the indexes already in use, a metrics scrape should not load one
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    return [index.snapshot() for index in indexes]
+
+def index_data(data):
+    return get_index().update(records_from_data(data))
+
+def search(query, k=RELATED_TOP_K, kinds=None, start=None, end=None):
+    return get_index().search(query, k, kinds, start, end)
+
+def related_entries(cleaned_data, k=RELATED_TOP_K):
+    # Past entries closest to what was written in this period, the period itself is left out since
+    # its data is in the prompt already
+    index = get_index()
+    records = records_from_data(cleaned_data)
+    index.update(records)
+    if not records:
+        return []
+    query = "\n".join(record["text"] for record in records)
+    results = index.search(query, k, exclude_dates={record["date"] for record in records})
+    return [{key: result[key] for key in ("date", "kind", "text")} for result in results]
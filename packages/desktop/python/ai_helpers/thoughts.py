@@ -0,0 +1,115 @@
+import json
+from dataclasses import dataclass, field, asdict
+
+# How many items the prompt asks for in each section
+SECTION_SIZES = {
+    "successes": 3,
+    "areas_for_improvement": 3,
+    "insights": 3,
+    "next_week_goals": 3,
+}
+TEXT_SECTIONS = ["successes", "areas_for_improvement", "insights"]
+
+class ThoughtsValidationError(ValueError):
+    def __init__(self, errors):
+        # Section name -> what is wrong with it
+        self.errors = errors
+        super().__init__("Invalid thoughts: " + "; ".join(f"{section}: {', '.join(problems)}" for section, problems in errors.items()))
+
+@dataclass
+class Goal:
+    goal: str
+    pillar_uuid: str = None
+    pillar_name: str = None
+    pillar_emoji: str = None
+
+@dataclass
+class Thoughts:
+    successes: list = field(default_factory=list)
+    areas_for_improvement: list = field(default_factory=list)
+    insights: list = field(default_factory=list)
+    next_week_goals: list = field(default_factory=list)  # Goal
+
+    def to_dict(self):
+        # The shape the clients and the response cache already know
+        return asdict(self)
+
+def parse_thoughts(content):
+    # The completion as a dict, or None when it is not a JSON object
+    try:
+        parsed = json.loads((content or "").strip())
+    except ValueError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+def _validate_text_section(value, size):
+    if not isinstance(value, list):
+        return [], ["missing or not a list"]
+    items = [item.strip() for item in value if isinstance(item, str) and item.strip()]
+    if len(items) < size:
+        return items, [f"expected {size} non empty strings, got {len(items)}"]
+    return items[:size], []
+
+def _pillar_lookup(pillars):
+    by_uuid = {pillar.get("uuid"): pillar for pillar in pillars if pillar.get("uuid")}
+    by_name = {str(pillar.get("name", "")).strip().lower(): pillar for pillar in pillars if pillar.get("name")}
+    return by_uuid, by_name
+
+def _validate_goals(value, size, pillars):
+    if not isinstance(value, list):
+        return [], ["missing or not a list"]
+    by_uuid, by_name = _pillar_lookup(pillars)
+    goals = []
+    problems = []
+    for index, item in enumerate(value[:size]):
+        if not isinstance(item, dict) or not isinstance(item.get("goal"), str) or not item["goal"].strip():
+            problems.append(f"goal {index + 1} has no goal text")
+            continue
+        if not pillars:
+            # Nothing to check against, better no pillar than an invented one
+            goals.append(Goal(item["goal"].strip()))
+            continue
+        # Name and emoji always come from the fetched pillar, a uuid the model made up is recovered
+        # from the pillar name when that matches. Anything but a string counts as an unknown pillar
+        pillar_uuid = item.get("pillar_uuid")
+        pillar_name = item.get("pillar_name")
+        pillar = by_uuid.get(pillar_uuid) if isinstance(pillar_uuid, str) else None
+        if pillar is None and isinstance(pillar_name, str):
+            pillar = by_name.get(pillar_name.strip().lower())
+        if pillar is None:
+            problems.append(f"goal {index + 1} has unknown pillar_uuid {item.get('pillar_uuid')!r}")
+            continue
+        goals.append(Goal(item["goal"].strip(), pillar["uuid"], pillar.get("name"), pillar.get("emoji")))
+    if len(goals) < size and not problems:
+        problems.append(f"expected {size} goals, got {len(goals)}")
+    return goals, problems
+
+def validate_sections(raw, pillars, sections=None):
+    # Returns (valid sections, section -> problems) for the requested sections
+    sections = sections or list(SECTION_SIZES)
+    if raw is None:
+        return {}, {section: ["the reply was not a JSON object"] for section in sections}
+    valid = {}
+    errors = {}
+    for section in sections:
+        if section == "next_week_goals":
+            value, problems = _validate_goals(raw.get(section), SECTION_SIZES[section], pillars)
+        else:
+            value, problems = _validate_text_section(raw.get(section), SECTION_SIZES[section])
+        if problems:
+            errors[section] = problems
+        else:
+            valid[section] = value
+    return valid, errors
+
+def partial_sections(raw, pillars, sections):
+    # Whatever is usable in sections that never validated, so one bad goal does not cost the others
+    if raw is None:
+        return {}
+    partial = {}
+    for section in sections:
+        if section == "next_week_goals":
+            partial[section], _ = _validate_goals(raw.get(section), SECTION_SIZES[section], pillars)
+        else:
+            partial[section], _ = _validate_text_section(raw.get(section), SECTION_SIZES[section])
+    return partial
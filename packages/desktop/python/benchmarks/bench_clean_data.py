@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_processing.data_cleaning import clean_data
+
+#^ run from the python folder: python benchmarks/bench_clean_data.py [rows ...]
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+REPEATS = 3
+
+def reference_clean_data(data):
+    # The loop based clean_data this engine replaced, kept here to compare against
+    cleaned = {
+        "quantifiableHabits": {},
+        "booleanHabits": {},
+        "dailyNoteData": [],
+        "timeData": [],
+        "moneyData": [],
+        "moodData": [],
+        "journalData": []
+    }
+
+    for note in data['dailyNoteData']:
+        date = note.get("date")
+        if date:
+            cleaned["quantifiableHabits"][date] = note["quantifiableHabits"]
+            cleaned["booleanHabits"][date] = note["booleanHabits"]
+
+        cleaned["dailyNoteData"].append({
+            "date": date,
+            "morningComment": note["morningComment"],
+            "energy": note["energy"],
+            "success": note["success"],
+            "beBetter": note["beBetter"],
+            "dayRating": note["dayRating"],
+        })
+
+    for time_entry in data["timeData"]:
+        cleaned["timeData"].append({
+            "date": time_entry["date"],
+            "tag": time_entry["tag"],
+            "description": time_entry["description"],
+            "duration": time_entry["duration"],
+            "startTime": time_entry["startTime"],
+            "endTime": time_entry["endTime"]
+        })
+
+    for money_entry in data["moneyData"]:
+        cleaned["moneyData"].append({
+            "date": money_entry["date"],
+            "amount": money_entry["amount"],
+            "type": money_entry["type"],
+            "tag": money_entry["tag"],
+            "description": money_entry["description"]
+        })
+
+    for mood_entry in data["moodData"]:
+        cleaned["moodData"].append({
+            "date": mood_entry["date"],
+            "rating": mood_entry["rating"],
+            "comment": mood_entry["comment"],
+            "tag": mood_entry["tag"],
+        })
+
+    for journal_entry in data["journalData"]:
+        cleaned["journalData"].append({
+            "date": journal_entry["date"],
+            "text": journal_entry["text"]
+        })
+
+    return cleaned
+
+def make_payload(rows):
+    dates = [f"{2000 + i // 366}-{(i // 28) % 12 + 1:02d}-{i % 28 + 1:02d}" for i in range(rows)]
+    return {
+        "dailyNoteData": [
+            {"date": f"{date}#{i}", "quantifiableHabits": {"pushups": i % 50}, "booleanHabits": {"read": i % 2 == 0},
+             "morningComment": "slept ok", "energy": i % 5, "wakeHour": "07:00", "success": "shipped it",
+             "beBetter": "sleep earlier", "dayRating": i % 5 + 1, "sleepTime": "23:30"}
+            for i, date in enumerate(dates)
+        ],
+        "timeData": [
+            {"date": date, "tag": "work", "description": "deep work", "duration": "01:30:00",
+             "startTime": f"{date}T09:00", "endTime": f"{date}T10:30"}
+            for date in dates
+        ],
+        "moneyData": [
+            {"date": date, "amount": 12.5, "type": "expense", "tag": "food", "description": "lunch"}
+            for date in dates
+        ],
+        "moodData": [
+            {"date": f"{date}T12:00:00", "rating": 4, "comment": "fine", "tag": "calm"}
+            for date in dates
+        ],
+        "journalData": [
+            {"date": date, "text": "wrote some thoughts"}
+            for date in dates
+        ],
+    }
+
+def best_of(fn, data):
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(data)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+
+    print(f"{'rows':>10} {'reference':>12} {'clean_data':>12} {'speedup':>8} {'columnar':>12}")
+    for rows in sizes:
+        data = make_payload(rows)
+        assert clean_data(data) == reference_clean_data(data)
+
+        reference = best_of(reference_clean_data, data)
+        fast = best_of(clean_data, data)
+        columnar = best_of(lambda payload: clean_data(payload, columnar=True), data)
+        print(f"{rows:>10} {reference:>11.3f}s {fast:>11.3f}s {reference / fast:>7.2f}x {columnar:>11.3f}s")
+
+if __name__ == '__main__':
+    main()
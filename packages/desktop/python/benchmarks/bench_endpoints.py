@@ -0,0 +1,239 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_backends import StubBackends
+from benchmarks.load_test import free_port, start_server, stop_server, percentile, format_seconds
+from benchmarks.payloads import ENDPOINTS, make_records
+
+#^ run from the python folder: python benchmarks/bench_endpoints.py [--scales 7,31,90] [--requests 20]
+#^ times clean_data and the prompt construction in process, then replays synthetic payloads of
+#^ every scale against main_server running on the stub backends. --save writes the numbers to
+#^ benchmarks/baseline.json, --compare fails when they got worse than the saved ones
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_SCALES = [7, 31, 90]  # Days of data per request
+OFFLINE_REPEATS = 20  # The best run counts, like in bench_clean_data
+# A result is a regression when it is this much worse than the baseline, and worse by more than
+# MIN_DELTA seconds so a few milliseconds of noise on a fast path do not count
+TOLERANCE = 0.25
+MIN_DELTA = 0.005
+OFFLINE_MIN_DELTA = 0.002  # The same for the in process stages, which take milliseconds and jitter a lot
+LATENCY_FIELDS = ["p50", "p95", "p99"]
+
+def offline_stages(scales, repeats=OFFLINE_REPEATS):
+    # The CPU bound steps on their own, no server and no network
+    from data_processing.data_cleaning import clean_data
+    from ai_helpers.claude import mood_recap_request, monthly_mood_recap_request, journal_entry_request
+
+    # render_prompt_data logs every call
+    logging.getLogger("ai-helpers").setLevel(logging.WARNING)
+
+    stages = {
+        "clean_data": lambda data, cleaned: clean_data(data),
+        "weekly_prompt": lambda data, cleaned: mood_recap_request({"note_data": cleaned["dailyNoteData"], "mood_data": cleaned["moodData"]}),
+        "monthly_prompt": lambda data, cleaned: monthly_mood_recap_request({"weekly_AI_summaries": [], "note_data": cleaned["dailyNoteData"], "mood_data": cleaned["moodData"]}),
+        "journal_prompt": lambda data, cleaned: journal_entry_request(cleaned["journalData"]),
+    }
+    results = {}
+    for days in scales:
+        data = make_records(days)
+        cleaned = clean_data(data)
+        for name, stage in stages.items():
+            times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                stage(data, cleaned)
+                times.append(time.perf_counter() - start)
+            results[f"{name}@{days}d"] = {"best": min(times), "median": statistics.median(times)}
+    return results
+
+def _send(session, url, body, stream):
+    if not stream:
+        return session.post(url, json=body, timeout=600).status_code == 200
+    # Read to the end, the stream is only done when the last event arrives
+    with session.post(url, json=body, timeout=600, stream=True) as response:
+        if response.status_code != 200:
+            return False
+        text = b"".join(response.iter_content(chunk_size=None))
+        return b"event: done" in text
+
+def replay(base_url, endpoint, days, total, concurrency, warmup=1):
+    build = ENDPOINTS[endpoint]
+    url = f"{base_url}/{endpoint}"
+    stream = endpoint.endswith("/stream")
+    local = threading.local()
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(seed):
+        nonlocal errors
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        body = build(seed, days)
+        start = time.perf_counter()
+        try:
+            ok = _send(local.session, url, body, stream)
+        except requests.exceptions.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    # Not counted, the first calls pay for the SDK imports and opening connections
+    with requests.Session() as session:
+        for seed in range(warmup):
+            _send(session, url, build(-1 - seed, days), stream)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "errors": errors,
+        "throughput": len(latencies) / wall if wall else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "max": max(latencies) if latencies else None,
+    }
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    # Returns the regressions as readable lines
+    regressions = []
+    for key, result in results.items():
+        saved = baseline.get(key)
+        if saved is None:
+            continue
+        for field in LATENCY_FIELDS + ["best"]:
+            current, before = result.get(field), saved.get(field)
+            if current is None or before is None:
+                continue
+            floor = OFFLINE_MIN_DELTA if field == "best" else MIN_DELTA
+            if current > before * (1 + tolerance) and current - before > floor:
+                shown = format_ms if field == "best" else format_seconds
+                regressions.append(f"{key} {field}: {shown(before)} -> {shown(current)}")
+        current, before = result.get("throughput"), saved.get("throughput")
+        if current is not None and before and current < before * (1 - tolerance):
+            regressions.append(f"{key} throughput: {before:.2f} -> {current:.2f} req/s")
+        if result.get("errors", 0) > saved.get("errors", 0):
+            regressions.append(f"{key} errors: {saved.get('errors', 0)} -> {result['errors']}")
+    return regressions
+
+def format_ms(value):
+    return f"{value * 1000:.2f}ms"
+
+def print_offline(results):
+    print(f"\n{'stage':<24} {'best':>10} {'median':>10}")
+    for key, result in results.items():
+        print(f"{key:<24} {format_ms(result['best']):>10} {format_ms(result['median']):>10}")
+
+def print_endpoints(results):
+    print(f"\n{'endpoint':<30} {'ok':>5} {'errors':>7} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for key, result in results.items():
+        print(
+            f"{key:<30} {result['requests'] - result['errors']:>5} {result['errors']:>7} {result['throughput']:>8.2f} "
+            f"{format_seconds(result['p50']):>9} {format_seconds(result['p95']):>9} "
+            f"{format_seconds(result['p99']):>9} {format_seconds(result['max']):>9}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay synthetic payloads against main_server on stub backends")
+    parser.add_argument("--scales", default=",".join(str(days) for days in DEFAULT_SCALES), help="days of data per request, comma separated")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma separated, any of: " + ", ".join(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=20, help="per endpoint and scale")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--mode", default="prod", help="dev (main_server.py) or prod (serve.py)")
+    parser.add_argument("--claude-latency", type=float, default=0.5)
+    parser.add_argument("--gpt-latency", type=float, default=0.3)
+    parser.add_argument("--db-latency", type=float, default=0.01)
+    parser.add_argument("--jitter", type=float, default=0.2, help="mean extra share of the stub latencies, exponentially distributed")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of LLM calls the stubs answer with 429/529")
+    parser.add_argument("--seed", type=int, default=0, help="seeds the stub latencies and errors")
+    parser.add_argument("--offline-only", action="store_true", help="skip the server replay")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="exit with 1 on a regression against the baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--verbose", action="store_true", help="show the server output")
+    args = parser.parse_args()
+
+    scales = [int(days) for days in args.scales.split(",")]
+    endpoints = args.endpoints.split(",")
+    unknown = [endpoint for endpoint in endpoints if endpoint not in ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown endpoint(s): {', '.join(unknown)}")
+
+    results = offline_stages(scales)
+    print_offline(results)
+
+    if not args.offline_only:
+        stubs = StubBackends(
+            claude_latency=args.claude_latency, gpt_latency=args.gpt_latency, db_latency=args.db_latency,
+            error_rate=args.error_rate, jitter=args.jitter, seed=args.seed,
+        ).start()
+        endpoint_results = {}
+        port = free_port()
+        process = start_server(args.mode, port, {**stubs.env(), "LOG_FORMAT": "text"}, args.verbose)
+        try:
+            for endpoint in endpoints:
+                for days in scales:
+                    print(f"{endpoint} @ {days} days: {args.requests} requests, {args.concurrency} concurrent ...", flush=True)
+                    endpoint_results[f"{endpoint}@{days}d"] = replay(f"http://127.0.0.1:{port}", endpoint, days, args.requests, args.concurrency)
+        finally:
+            stop_server(process)
+            stubs.stop()
+        print_endpoints(endpoint_results)
+        print(f"\nstub calls: {json.dumps(stubs.stats)}")
+        results.update(endpoint_results)
+
+    status = 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.tolerance)
+        changed = [key for key, value in baseline["settings"].items() if key != "offline_only" and vars(args).get(key) != value]
+        if changed:
+            print(f"\nThe baseline was taken with different settings ({', '.join(changed)}), expect differences")
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline} ({baseline['machine']}):")
+            for line in regressions:
+                print(f"  {line}")
+            status = 1 if args.compare else 0
+        else:
+            print(f"\nNo regressions against {args.baseline}")
+    elif args.compare:
+        print(f"\nNo baseline at {args.baseline}, run with --save first")
+        status = 1
+
+    if args.save:
+        # The numbers only mean something on the machine that made them, so it is recorded too
+        baseline = {
+            "machine": f"{platform.machine()} {os.cpu_count()} cpu, python {platform.python_version()}",
+            "settings": {key: value for key, value in vars(args).items() if key not in ("baseline", "save", "compare", "verbose", "offline_only")},
+            "results": results,
+        }
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Saved the baseline to {args.baseline}")
+
+    sys.exit(status)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+#^ run from the python folder: python benchmarks/bench_import_time.py [--runs 5] [--max-ms 600]
+#^ imports the server in fresh interpreters with python -X importtime, the way every worker of a
+#^ pre-fork server starts. Exits with 1 when an SDK is imported eagerly again or the import gets
+#^ slower than the budget, so it can guard startup time in CI
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Only imported on the first LLM call, see ai_helpers/clients.py
+LAZY_MODULES = ["anthropic", "openai"]
+DEFAULT_MODULE = "main_server"
+
+def import_times(module):
+    # (cumulative microseconds of each direct import of module, every module imported, total
+    # microseconds) of one cold import
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PYTHON_DIR,
+        capture_output=True,
+        text=True,
+        # No keys on purpose, importing must not need them
+        env={key: value for key, value in os.environ.items() if not key.endswith("_API_KEY")},
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    packages = {}
+    imported = set()
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # The header line
+        imported.add(name.strip())
+        # Nesting shows as two more spaces per level in the name column
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0 and name.strip() == module:
+            total = int(cumulative)
+        elif depth == 1:
+            packages[name.strip()] = int(cumulative)
+    return packages, imported, total
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure and guard the cold import time of the server")
+    parser.add_argument("--module", default=DEFAULT_MODULE)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None, help="fail when the median import takes longer")
+    parser.add_argument("--top", type=int, default=10, help="slowest direct imports to list")
+    args = parser.parse_args()
+
+    totals = []
+    packages = {}
+    imported = set()
+    for _ in range(args.runs):
+        run_packages, run_imported, total = import_times(args.module)
+        imported |= run_imported
+        totals.append(total / 1000)
+        for name, cumulative in run_packages.items():
+            packages.setdefault(name, []).append(cumulative / 1000)
+
+    median = statistics.median(totals)
+    print(f"import {args.module}: median {median:.1f}ms, min {min(totals):.1f}ms, max {max(totals):.1f}ms over {args.runs} runs\n")
+    print(f"{'imported by ' + args.module:<40} {'ms':>8}")
+    slowest = sorted(packages.items(), key=lambda item: -statistics.median(item[1]))
+    for name, times in slowest[:args.top]:
+        print(f"{name:<40} {statistics.median(times):>8.1f}")
+
+    failures = []
+    eager = [name for name in LAZY_MODULES if name in imported]
+    if eager:
+        failures.append(f"imported at startup, should be lazy: {', '.join(eager)}")
+    if args.max_ms is not None and median > args.max_ms:
+        failures.append(f"median import {median:.1f}ms is over the {args.max_ms:.0f}ms budget")
+    for failure in failures:
+        print(f"\nFAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
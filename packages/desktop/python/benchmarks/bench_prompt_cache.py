@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_backends import StubBackends
+from benchmarks.load_test import make_week_request
+
+#^ run from the python folder: python benchmarks/bench_prompt_cache.py [--rounds 5] [--live]
+#^ sends the same kinds of prompt over and over with fresh data each time, the response cache is
+#^ bypassed so every call reaches the provider. Compares cached and uncached input tokens and latency.
+#^ The prompts set no cache breakpoints and their static parts are below the providers' 1024 token
+#^ minimum, so expect cached_calls 0 until that changes
+USAGE_COLUMNS = ["calls", "cached_calls", "input_tokens", "cached_input_tokens", "cache_write_tokens", "output_tokens"]
+
+def journal_entries(seed, days=7):
+    return [{"date": f"2024-01-0{day + 1}", "text": f"round {seed}, day {day}: " + "wrote about the week " * 30} for day in range(days)]
+
+def run(rounds, stream):
+    # Imported late, the clients read their base urls from the environment
+    from ai_helpers.claude import create_message, stream_message, mood_recap_request, journal_entry_request
+    from ai_helpers.gpt import create_thoughts
+
+    pillars = [{"uuid": "bench-health", "name": "Health", "emoji": "🔵"}]
+    for seed in range(rounds):
+        week = make_week_request(seed)
+        started = time.perf_counter()
+        create_message(**mood_recap_request({"dailyNoteData": week["dailyNoteData"], "moodData": week["moodData"]}), use_cache=False)
+        create_message(**journal_entry_request(journal_entries(seed)), use_cache=False)
+        create_thoughts({"dailyNoteData": week["dailyNoteData"]}, pillars, use_cache=False)
+        if stream:
+            "".join(stream_message(**mood_recap_request({"moodData": week["moodData"]}), use_cache=False))
+        print(f"round {seed + 1}/{rounds}: {time.perf_counter() - started:.2f}s", flush=True)
+
+def format_value(value):
+    if value is None:
+        return "-"
+    return f"{value:.3f}" if isinstance(value, float) else str(value)
+
+def report(gateways):
+    columns = USAGE_COLUMNS + ["cached_prompt_share", "avg_latency_cached", "avg_latency_uncached", "avg_first_token"]
+    print(f"\n{'model':<30} " + " ".join(f"{column:>20}" for column in columns))
+    for provider, gateway in gateways.items():
+        for model, snapshot in gateway.snapshot().items():
+            usage = snapshot.get("usage")
+            if usage:
+                print(f"{provider + '/' + model:<30} " + " ".join(f"{format_value(usage[column]):>20}" for column in columns))
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how much of each prompt is served from the provider's prompt cache")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--live", action="store_true", help="call the real APIs with the keys from .env instead of the stubs")
+    parser.add_argument("--no-stream", action="store_true", help="skip the streamed recap and its time to first token")
+    parser.add_argument("--claude-latency", type=float, default=0.5)
+    parser.add_argument("--gpt-latency", type=float, default=0.3)
+    parser.add_argument("--cache-min-tokens", type=int, default=1024, help="smallest prefix the stubs cache")
+    args = parser.parse_args()
+
+    stubs = None
+    if not args.live:
+        stubs = StubBackends(claude_latency=args.claude_latency, gpt_latency=args.gpt_latency, cache_min_tokens=args.cache_min_tokens).start()
+        os.environ.update(stubs.env())
+    try:
+        run(args.rounds, not args.no_stream)
+    finally:
+        if stubs:
+            stubs.stop()
+
+    from ai_helpers.claude import gateway as claude_gateway
+    from ai_helpers.gpt import gateway as gpt_gateway
+    report({"anthropic": claude_gateway, "openai": gpt_gateway})
+
+if __name__ == '__main__':
+    main()
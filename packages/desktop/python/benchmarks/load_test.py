@@ -0,0 +1,177 @@
+import os
+import sys
+import time
+import json
+import signal
+import socket
+import argparse
+import threading
+import subprocess
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_backends import StubBackends
+
+#^ run from the python folder: python benchmarks/load_test.py [--requests 200] [--concurrency 16]
+#^ starts the server in each mode against the stub backends and fires summary requests at it
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = {
+    "dev": ["main_server.py"],
+    "prod": ["serve.py"],
+}
+STARTUP_TIMEOUT = 30
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def make_week_request(seed, start=date(2024, 1, 1)):
+    # A unique comment per request keeps the response cache and request coalescing out of the numbers
+    days = [(start + timedelta(days=offset)).isoformat() for offset in range(7)]
+    return {
+        "dailyNoteData": [
+            {"date": day, "quantifiableHabits": {"pushups": 20}, "booleanHabits": {"read": True},
+             "morningComment": f"request {seed}", "energy": 3, "success": "shipped it",
+             "beBetter": "sleep earlier", "dayRating": 4}
+            for day in days
+        ],
+        "timeData": [
+            {"date": day, "tag": "work", "description": "deep work", "duration": "01:30:00",
+             "startTime": f"{day}T09:00", "endTime": f"{day}T10:30"}
+            for day in days
+        ],
+        "moneyData": [{"date": day, "amount": 12.5, "type": "expense", "tag": "food", "description": "lunch"} for day in days],
+        "moodData": [{"date": f"{day}T12:00:00", "rating": 4, "comment": f"request {seed}", "tag": "calm"} for day in days],
+        "journalData": [],
+        "bypassCache": True,
+    }
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+def start_server(mode, port, env, verbose=False):
+    output = None if verbose else subprocess.DEVNULL
+    process = subprocess.Popen(
+        [sys.executable, *MODES[mode]],
+        cwd=PYTHON_DIR,
+        env={**os.environ, **env, "SERVER_PORT": str(port)},
+        stdout=output,
+        stderr=output,
+        # The dev server's reloader forks a child, a new session lets us stop both
+        start_new_session=True,
+    )
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/metrics/coalescing", timeout=1).status_code == 200:
+                return process
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    stop_server(process)
+    raise RuntimeError(f"{mode} server did not come up on port {port}")
+
+def stop_server(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except (AttributeError, ProcessLookupError):
+        process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def run_load(url, total, concurrency):
+    local = threading.local()
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(seed):
+        nonlocal errors
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            ok = local.session.post(url, json=make_week_request(seed), timeout=300).status_code == 200
+        except requests.exceptions.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "errors": errors,
+        "throughput": len(latencies) / wall if wall else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "max": max(latencies) if latencies else None,
+    }
+
+def format_seconds(value):
+    return f"{value:.3f}s" if value is not None else "-"
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test main_server against stubbed LLM and DB backends")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--modes", default="dev,prod", help="comma separated, any of: " + ", ".join(MODES))
+    parser.add_argument("--endpoint", default="weekly_summary")
+    parser.add_argument("--claude-latency", type=float, default=0.5)
+    parser.add_argument("--gpt-latency", type=float, default=0.3)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of LLM calls the stubs answer with 429/529")
+    parser.add_argument("--workers", type=int, default=None, help="SERVER_WORKERS for the prod mode")
+    parser.add_argument("--threads", type=int, default=None, help="SERVER_THREADS for the prod mode")
+    parser.add_argument("--pipeline-workers", type=int, default=None, help="PIPELINE_WORKERS, the shared LLM stage pool")
+    parser.add_argument("--verbose", action="store_true", help="show the server output")
+    args = parser.parse_args()
+
+    stubs = StubBackends(claude_latency=args.claude_latency, gpt_latency=args.gpt_latency, error_rate=args.error_rate).start()
+    env = stubs.env()
+    if args.workers:
+        env["SERVER_WORKERS"] = str(args.workers)
+    if args.threads:
+        env["SERVER_THREADS"] = str(args.threads)
+    if args.pipeline_workers:
+        env["PIPELINE_WORKERS"] = str(args.pipeline_workers)
+
+    results = {}
+    try:
+        for mode in args.modes.split(","):
+            port = free_port()
+            process = start_server(mode, port, env, args.verbose)
+            try:
+                print(f"{mode}: {args.requests} requests, {args.concurrency} concurrent ...", flush=True)
+                results[mode] = run_load(f"http://127.0.0.1:{port}/{args.endpoint}", args.requests, args.concurrency)
+            finally:
+                stop_server(process)
+    finally:
+        stubs.stop()
+
+    print(f"\n{'mode':<6} {'ok':>6} {'errors':>7} {'req/s':>8} {'p50':>9} {'p95':>9} {'max':>9}")
+    for mode, result in results.items():
+        print(
+            f"{mode:<6} {result['requests'] - result['errors']:>6} {result['errors']:>7} {result['throughput']:>8.2f} "
+            f"{format_seconds(result['p50']):>9} {format_seconds(result['p95']):>9} {format_seconds(result['max']):>9}"
+        )
+    print(f"\nstub calls: {json.dumps(stubs.stats)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import random
+from datetime import date, timedelta
+
+#^ synthetic request bodies shaped like the ones the apps send. The same seed and scale always give
+#^ the same payload, a different seed changes the text so the response cache and request
+#^ coalescing stay out of the numbers
+DEFAULT_START = date(2024, 1, 1)
+WORDS = (
+    "slept worked walked read cooked called wrote trained rested planned finished started met "
+    "early late tired calm focused restless happy anxious grateful busy quiet long short good "
+    "morning evening project friends family gym book music coffee rain sun deadline meeting"
+).split()
+HABITS = ["pushups", "pages", "meditation", "water"]
+BOOLEAN_HABITS = ["read", "stretch", "journal"]
+TIME_TAGS = ["work", "study", "sport", "social", "chores"]
+MONEY_TAGS = ["food", "transport", "books", "rent", "fun"]
+MOOD_TAGS = ["calm", "tired", "happy", "stressed", "focused"]
+
+def _text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+def _dates(days, start):
+    return [(start + timedelta(days=offset)).isoformat() for offset in range(days)]
+
+def make_records(days, seed=0, start=DEFAULT_START, per_day=3, journal_words=150):
+    # The five record collections for days days, per_day time, money and mood entries per day
+    rng = random.Random(seed)
+    dates = _dates(days, start)
+    records = {"dailyNoteData": [], "timeData": [], "moneyData": [], "moodData": [], "journalData": []}
+    for day in dates:
+        records["dailyNoteData"].append({
+            "date": day,
+            "quantifiableHabits": {habit: rng.randint(0, 50) for habit in HABITS},
+            "booleanHabits": {habit: rng.random() < 0.6 for habit in BOOLEAN_HABITS},
+            "morningComment": _text(rng, 12),
+            "energy": rng.randint(1, 5),
+            "wakeHour": f"{rng.randint(5, 9):02d}:{rng.choice(['00', '30'])}",
+            "success": _text(rng, 8),
+            "beBetter": _text(rng, 8),
+            "dayRating": rng.randint(1, 5),
+            "sleepTime": f"{rng.randint(22, 23)}:{rng.choice(['00', '30'])}",
+        })
+        for entry in range(per_day):
+            hour = 8 + entry * 3
+            minutes = rng.randint(15, 150)
+            records["timeData"].append({
+                "date": day,
+                "tag": rng.choice(TIME_TAGS),
+                "description": _text(rng, 4),
+                "duration": f"{minutes // 60:02d}:{minutes % 60:02d}:00",
+                "startTime": f"{day}T{hour:02d}:00",
+                "endTime": f"{day}T{hour + minutes // 60:02d}:{minutes % 60:02d}",
+            })
+            records["moneyData"].append({
+                "date": day,
+                "amount": round(rng.uniform(2, 80), 2),
+                "type": "income" if rng.random() < 0.1 else "expense",
+                "tag": rng.choice(MONEY_TAGS),
+                "description": _text(rng, 3),
+            })
+            records["moodData"].append({
+                "date": f"{day}T{hour:02d}:30:00",
+                "rating": rng.randint(1, 5),
+                "comment": _text(rng, 6),
+                "tag": rng.choice(MOOD_TAGS),
+            })
+        records["journalData"].append({"date": day, "text": _text(rng, journal_words)})
+    return records
+
+def weekly_summary_request(seed, days=7, **scale):
+    return {**make_records(days, seed, **scale), "bypassCache": True}
+
+def monthly_summary_request(seed, days=31, **scale):
+    # Incremental like the apps send it, half of the weeks already have a summary
+    records = make_records(days, seed, **scale)
+    weeks = sorted({date.fromisoformat(note["date"]).strftime("%G-W%V") for note in records["dailyNoteData"]})
+    summaries = [{"date": week, "summary": f"Week {week}: {_text(random.Random(f'{seed}{week}'), 80)}"} for week in weeks[::2]]
+    return {**records, "weeklyAISummaries": summaries, "currentDate": weeks[-1], "incremental": True, "bypassCache": True}
+
+def journal_request(seed, days=7, **scale):
+    records = make_records(days, seed, **scale)
+    entries = records["journalData"]
+    return {"journalEntries": entries, "startDate": entries[0]["date"], "endDate": entries[-1]["date"], "bypassCache": True}
+
+def stats_request(seed, days=31, **scale):
+    return {**make_records(days, seed, **scale), "period": "month" if days > 7 else "week"}
+
+# Endpoint path -> request builder, what the replay harness runs by default
+ENDPOINTS = {
+    "weekly_summary": weekly_summary_request,
+    "weekly_summary/stream": weekly_summary_request,
+    "monthly_summary": monthly_summary_request,
+    "generate_journal": journal_request,
+    "stats": stats_request,
+}
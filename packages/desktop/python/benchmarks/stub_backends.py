@@ -0,0 +1,280 @@
+import json
+import hashlib
+import random
+import sys
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+#^ stand-ins for the Anthropic and OpenAI APIs and the local DB service, so the server can be load
+#^ tested without spending tokens. Run from the python folder: python benchmarks/stub_backends.py [port]
+CLAUDE_TEXT = (
+    "<reflection>Nice: you kept a steady routine and your mood held up. "
+    "Not so nice: sleep slipped midweek.</reflection>"
+    "<questions_to_ponder>1. What made the good days good?</questions_to_ponder>"
+)
+THOUGHTS = {
+    "successes": ["Kept the routine", "Exercised", "Finished the project"],
+    "areas_for_improvement": ["Sleep earlier", "Fewer late screens", "Plan the week"],
+    "insights": ["Energy follows sleep", "Mornings matter", "Social days rate higher"],
+    "next_week_goals": [
+        {"goal": "In bed by 23:00", "pillar_uuid": "stub-health", "pillar_name": "Health", "pillar_emoji": "🔵"},
+    ] * 3,
+}
+PILLARS = [
+    {"uuid": "stub-health", "name": "Health", "emoji": "🔵"},
+    {"uuid": "stub-work", "name": "Work", "emoji": "🟢"},
+]
+STREAM_CHUNK_CHARS = 20
+RATE_LIMIT_RETRY_AFTER = 1  # Seconds, sent with the injected 429 and 529 responses
+# Prompt caching as the providers do it: prefixes shorter than this are never cached
+CACHE_MIN_TOKENS = 1024
+# Share of the latency that goes away for the cached part of a prompt
+CACHE_SPEEDUP = 0.5
+# Far smaller than the real models' vectors, the index does not care
+STUB_EMBED_DIM = 64
+
+def estimate_tokens(value):
+    return max(1, len(json.dumps(value, ensure_ascii=False)) // 4)
+
+def stub_embedding(text):
+    # Same text, same vector
+    digest = hashlib.shake_256(text.encode('utf-8')).digest(STUB_EMBED_DIM)
+    return [byte / 255 - 0.5 for byte in digest]
+
+def _fingerprint(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _latency(self, base):
+        # jitter is the mean extra share of the base latency, drawn from an exponential so there is a tail
+        if not self.server.jitter:
+            return base
+        return base * (1 + self.server.random.expovariate(1 / self.server.jitter))
+
+    def _count(self, name, latency):
+        self.server.stats[name] += 1
+        time.sleep(self._latency(latency))
+
+    def _prompt_cache(self, prefix):
+        # Returns (cached tokens, written tokens) for a prompt starting with prefix
+        tokens = estimate_tokens(prefix) if prefix else 0
+        if tokens < self.server.cache_min_tokens:
+            return 0, 0
+        key = _fingerprint(prefix)
+        with self.server.cache_lock:
+            if key in self.server.prompt_cache:
+                self.server.stats["cache_hits"] += 1
+                return tokens, 0
+            self.server.prompt_cache.add(key)
+        return 0, tokens
+
+    def _claude_usage(self, body):
+        # Everything up to the last cache_control breakpoint of the system blocks is the prefix
+        system = body.get("system")
+        prefix = None
+        if isinstance(system, list):
+            marked = [index for index, block in enumerate(system) if block.get("cache_control")]
+            if marked:
+                prefix = [body.get("model"), system[:marked[-1] + 1]]
+        cached, written = self._prompt_cache(prefix)
+        total = estimate_tokens([system, body.get("messages")])
+        return {
+            "input_tokens": max(total - cached - written, 1),
+            "cache_read_input_tokens": cached,
+            "cache_creation_input_tokens": written,
+            "output_tokens": 300,
+        }, cached / total
+
+    def _gpt_usage(self, body):
+        # OpenAI caches on its own, the system message is the part that repeats
+        messages = body.get("messages") or []
+        prefix = [body.get("model"), messages[:1]] if messages and messages[0].get("role") == "system" else None
+        cached, _ = self._prompt_cache(prefix)
+        total = estimate_tokens(messages)
+        return {
+            "prompt_tokens": total,
+            "completion_tokens": 200,
+            "total_tokens": total + 200,
+            "prompt_tokens_details": {"cached_tokens": cached},
+        }, cached / total
+
+    def _wait(self, latency, cached_share):
+        time.sleep(self._latency(latency) * (1 - CACHE_SPEEDUP * cached_share))
+
+    def _rate_limited(self, name, status):
+        # Injected failures, so retries and fallbacks can be exercised
+        if self.server.error_rate and self.server.random.random() < self.server.error_rate:
+            self.server.stats[f"{name}_errors"] += 1
+            body = json.dumps({"type": "error", "error": {"type": "rate_limit_error", "message": "stub rate limit"}}).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('retry-after', str(RATE_LIMIT_RETRY_AFTER))
+            self.end_headers()
+            self.wfile.write(body)
+            return True
+        return False
+
+    def do_GET(self):
+        if self.path.startswith('/pillars/list'):
+            self._count("db", self.server.db_latency)
+            return self._send_json(PILLARS)
+        self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        body = self._read_json()
+        if self.path.endswith('/messages'):
+            self.server.stats["claude"] += 1
+            if self._rate_limited("claude", 529):
+                return
+            usage, cached_share = self._claude_usage(body)
+            self._wait(self.server.claude_latency, cached_share)
+            if body.get("stream"):
+                return self._stream_message(body, usage)
+            return self._send_json(self._message(body, usage))
+        if self.path.endswith('/chat/completions'):
+            self.server.stats["gpt"] += 1
+            if self._rate_limited("gpt", 429):
+                return
+            usage, cached_share = self._gpt_usage(body)
+            self._wait(self.server.gpt_latency, cached_share)
+            return self._send_json({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": json.dumps(THOUGHTS)}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+        if self.path.endswith('/embeddings'):
+            self._count("embeddings", self.server.gpt_latency)
+            texts = body.get("input") or []
+            texts = [texts] if isinstance(texts, str) else texts
+            return self._send_json({
+                "object": "list",
+                "model": body.get("model"),
+                "data": [{"object": "embedding", "index": index, "embedding": stub_embedding(text)} for index, text in enumerate(texts)],
+                "usage": {"prompt_tokens": sum(estimate_tokens(text) for text in texts), "total_tokens": sum(estimate_tokens(text) for text in texts)},
+            })
+        if self.path.startswith('/gpt/upsert'):
+            self._count("db", self.server.db_latency)
+            with self.server.cache_lock:
+                self.server.upserts.append(body)
+            return self._send_json(body, 201)
+        self._send_json({"error": "not found"}, 404)
+
+    def _message(self, body, usage):
+        return {
+            "id": "msg_stub",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model"),
+            "content": [{"type": "text", "text": CLAUDE_TEXT}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": usage,
+        }
+
+    def _stream_message(self, body, usage):
+        message = self._message(body, usage)
+        events = [("message_start", {"type": "message_start", "message": {**message, "content": [], "stop_reason": None}})]
+        events.append(("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}))
+        for start in range(0, len(CLAUDE_TEXT), STREAM_CHUNK_CHARS):
+            text = CLAUDE_TEXT[start:start + STREAM_CHUNK_CHARS]
+            events.append(("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text}}))
+        events.append(("content_block_stop", {"type": "content_block_stop", "index": 0}))
+        events.append(("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": 300}}))
+        events.append(("message_stop", {"type": "message_stop"}))
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        for event, data in events:
+            self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        self.close_connection = True
+
+class StubBackends:
+    def __init__(self, port=0, claude_latency=0.5, gpt_latency=0.3, db_latency=0.01, error_rate=0.0, cache_min_tokens=CACHE_MIN_TOKENS, jitter=0.0, seed=None):
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+        self.server.daemon_threads = True
+        self.server.claude_latency = claude_latency
+        self.server.gpt_latency = gpt_latency
+        self.server.db_latency = db_latency
+        # Share of LLM calls answered with a 529 (Claude) or 429 (GPT)
+        self.server.error_rate = error_rate
+        self.server.jitter = jitter
+        # Seeded so the injected errors and latencies repeat from run to run
+        self.server.random = random.Random(seed)
+        self.server.cache_min_tokens = cache_min_tokens
+        self.server.prompt_cache = set()
+        self.server.cache_lock = threading.Lock()
+        # Every record posted to /gpt/upsert, in arrival order
+        self.server.upserts = []
+        self.server.stats = {"claude": 0, "gpt": 0, "embeddings": 0, "db": 0, "claude_errors": 0, "gpt_errors": 0, "cache_hits": 0}
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    @property
+    def stats(self):
+        return dict(self.server.stats)
+
+    @property
+    def upserts(self):
+        with self.server.cache_lock:
+            return list(self.server.upserts)
+
+    def env(self):
+        # The SDKs pick their base urls up from the environment, the keys only have to be non empty
+        return {
+            "ANTHROPIC_BASE_URL": self.url,
+            "ANTHROPIC_API_KEY": "stub",
+            "OPENAI_BASE_URL": f"{self.url}/v1",
+            "OPENAI_API_KEY": "stub",
+            "DB_SERVICE_URL": self.url,
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="stub-backends", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8089
+    stubs = StubBackends(port).start()
+    for key, value in stubs.env().items():
+        print(f"{key}={value}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stubs.stop()
+
+if __name__ == '__main__':
+    main()
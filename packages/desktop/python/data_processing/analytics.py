@@ -0,0 +1,251 @@
+import math
+from collections import defaultdict
+from datetime import date as date_cls, timedelta
+
+from data_processing.data_cleaning import to_number
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ROLLING_WINDOW = 7
+# Correlations on fewer paired days than this are mostly noise
+MIN_CORRELATION_DAYS = 5
+TOP_CORRELATIONS = 5
+
+def _day(date_str):
+    return date_cls.fromisoformat(date_str[:10])
+
+def _round(value, digits=2):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return round(value, digits)
+
+def _mean(values):
+    values = [value for value in values if not math.isnan(value)]
+    return sum(values) / len(values) if values else math.nan
+
+def _period_key(date_str, period):
+    day = _day(date_str)
+    if period == 'month':
+        return day.strftime('%Y-%m')
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week}"
+
+def _streaks(done_days):
+    # done_days: sorted list of (date, done) pairs, a missing calendar day breaks a streak
+    longest = current = 0
+    previous = None
+    for day, done in done_days:
+        if not done or (previous is not None and day - previous != timedelta(days=1)):
+            current = 0
+        if done:
+            current += 1
+            longest = max(longest, current)
+        previous = day
+    return current, longest
+
+def habit_stats(quantifiable_habits, boolean_habits):
+    series = defaultdict(list)
+    for kind, habits_by_date in (('quantifiable', quantifiable_habits), ('boolean', boolean_habits)):
+        for date, habits in habits_by_date.items():
+            for habit, value in (habits or {}).items():
+                series[(kind, habit)].append((_day(date), value))
+
+    stats = []
+    for (kind, habit), values in sorted(series.items(), key=lambda item: item[0][1]):
+        values.sort(key=lambda pair: pair[0])
+        if kind == 'boolean':
+            done = [(day, bool(value)) for day, value in values]
+        else:
+            numbers = [to_number(value) for _, value in values]
+            done = [(day, number > 0) for (day, _), number in zip(values, numbers)]
+        current_streak, longest_streak = _streaks(done)
+        row = {
+            "habit": habit,
+            "kind": kind,
+            "days_tracked": len(done),
+            "completion_rate": _round(sum(flag for _, flag in done) / len(done)) if done else None,
+            "current_streak": current_streak,
+            "longest_streak": longest_streak,
+        }
+        if kind == 'quantifiable':
+            row["total"] = _round(sum(number for number in numbers if not math.isnan(number)))
+            row["mean"] = _round(_mean(numbers))
+        stats.append(row)
+    return stats
+
+def time_per_tag(time_data):
+    seconds = defaultdict(float)
+    entries = defaultdict(int)
+    for entry in time_data:
+        duration = to_number(entry["duration"])
+        if not math.isnan(duration):
+            seconds[entry["tag"]] += duration
+            entries[entry["tag"]] += 1
+    return [
+        {"tag": tag, "hours": _round(total / 3600), "entries": entries[tag]}
+        for tag, total in sorted(seconds.items(), key=lambda item: -item[1])
+    ]
+
+def spend_per_tag(money_data):
+    totals = defaultdict(float)
+    entries = defaultdict(int)
+    for entry in money_data:
+        amount = to_number(entry["amount"])
+        if not math.isnan(amount):
+            key = (entry["type"], entry["tag"])
+            totals[key] += amount
+            entries[key] += 1
+    return [
+        {"type": kind, "tag": tag, "amount": _round(total), "entries": entries[(kind, tag)]}
+        for (kind, tag), total in sorted(totals.items(), key=lambda item: -abs(item[1]))
+    ]
+
+def _daily_series(rows, field):
+    # One value per calendar day (days with several entries are averaged), in date order
+    by_day = defaultdict(list)
+    for row in rows:
+        if row.get("date"):
+            value = to_number(row[field])
+            if not math.isnan(value):
+                by_day[row["date"][:10]].append(value)
+    dates = sorted(by_day)
+    return dates, [sum(by_day[date]) / len(by_day[date]) for date in dates]
+
+def rolling_mean(values, window=ROLLING_WINDOW):
+    if not values:
+        return []
+    window = min(window, len(values))
+    if np is not None:
+        array = np.asarray(values, dtype=np.float64)
+        sums = np.convolve(array, np.ones(window), mode='valid')
+        return (sums / window).tolist()
+    total = sum(values[:window])
+    means = [total / window]
+    for index in range(window, len(values)):
+        total += values[index] - values[index - window]
+        means.append(total / window)
+    return means
+
+def _trend(field_name, dates, values, window):
+    if not values:
+        return {"metric": field_name, "days": 0}
+    rolling = rolling_mean(values, window)
+    return {
+        "metric": field_name,
+        "days": len(values),
+        "mean": _round(sum(values) / len(values)),
+        "first_window_mean": _round(rolling[0]),
+        "last_window_mean": _round(rolling[-1]),
+        "change": _round(rolling[-1] - rolling[0]),
+        "rolling": [
+            {"date": date, "value": _round(value)}
+            for date, value in zip(dates[len(dates) - len(rolling):], rolling)
+        ],
+    }
+
+def trends(note_data, mood_data, window=ROLLING_WINDOW):
+    return [
+        _trend("mood", *_daily_series(mood_data, "rating"), window),
+        _trend("energy", *_daily_series(note_data, "energy"), window),
+        _trend("dayRating", *_daily_series(note_data, "dayRating"), window),
+    ]
+
+def _pearson(xs, ys):
+    if np is not None:
+        x = np.asarray(xs, dtype=np.float64)
+        y = np.asarray(ys, dtype=np.float64)
+        if x.std() == 0 or y.std() == 0:
+            return None
+        return float(np.corrcoef(x, y)[0, 1])
+    n = len(xs)
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    var_y = sum((y - mean_y) ** 2 for y in ys)
+    if var_x == 0 or var_y == 0:
+        return None
+    return cov / math.sqrt(var_x * var_y)
+
+def habit_correlations(quantifiable_habits, boolean_habits, note_data):
+    ratings = dict(zip(*_daily_series(note_data, "dayRating")))
+
+    pairs = defaultdict(lambda: ([], []))
+    for habits_by_date in (quantifiable_habits, boolean_habits):
+        for date, habits in habits_by_date.items():
+            rating = ratings.get(date[:10])
+            if rating is None:
+                continue
+            for habit, value in (habits or {}).items():
+                number = float(value) if isinstance(value, bool) else to_number(value)
+                if not math.isnan(number):
+                    xs, ys = pairs[habit]
+                    xs.append(number)
+                    ys.append(rating)
+
+    correlations = []
+    for habit, (xs, ys) in pairs.items():
+        if len(xs) < MIN_CORRELATION_DAYS:
+            continue
+        correlation = _pearson(xs, ys)
+        if correlation is not None:
+            correlations.append({"habit": habit, "correlation": _round(correlation), "days": len(xs)})
+    correlations.sort(key=lambda row: -abs(row["correlation"]))
+    return correlations
+
+def period_stats(note_data, mood_data, period='week'):
+    grouped = defaultdict(lambda: {"energy": [], "dayRating": [], "mood": []})
+    for note in note_data:
+        if note.get("date"):
+            bucket = grouped[_period_key(note["date"], period)]
+            bucket["energy"].append(to_number(note["energy"]))
+            bucket["dayRating"].append(to_number(note["dayRating"]))
+    for mood in mood_data:
+        grouped[_period_key(mood["date"], period)]["mood"].append(to_number(mood["rating"]))
+
+    return [
+        {
+            "period": key,
+            "days_logged": len(values["dayRating"]),
+            "avg_energy": _round(_mean(values["energy"])),
+            "avg_day_rating": _round(_mean(values["dayRating"])),
+            "avg_mood": _round(_mean(values["mood"])),
+        }
+        # "2024-W5" has to come before "2024-W10", so sort on the numbers rather than the string
+        for key, values in sorted(grouped.items(), key=lambda item: tuple(int(part) for part in item[0].replace('W', '').split('-')))
+    ]
+
+def compute_stats(cleaned_data, period='week', window=ROLLING_WINDOW):
+    quantifiable_habits = cleaned_data["quantifiableHabits"]
+    boolean_habits = cleaned_data["booleanHabits"]
+    note_data = cleaned_data["dailyNoteData"]
+    mood_data = cleaned_data["moodData"]
+
+    return {
+        "habits": habit_stats(quantifiable_habits, boolean_habits),
+        "time_per_tag": time_per_tag(cleaned_data["timeData"]),
+        "spend_per_tag": spend_per_tag(cleaned_data["moneyData"]),
+        "trends": trends(note_data, mood_data, window),
+        "habit_correlations": habit_correlations(quantifiable_habits, boolean_habits, note_data),
+        "periods": period_stats(note_data, mood_data, period),
+    }
+
+def stats_features(stats):
+    # Compact version for the prompts: one small table per key, which the prompt renderer
+    # turns into a few short rows
+    return {
+        "stats_habits": [
+            {key: row[key] for key in ("habit", "completion_rate", "current_streak", "longest_streak")}
+            for row in stats["habits"]
+        ],
+        "stats_time_per_tag": [{"tag": row["tag"], "hours": row["hours"]} for row in stats["time_per_tag"]],
+        "stats_spend_per_tag": [{"type": row["type"], "tag": row["tag"], "amount": row["amount"]} for row in stats["spend_per_tag"]],
+        "stats_trends": [
+            {key: row.get(key) for key in ("metric", "mean", "last_window_mean", "change")}
+            for row in stats["trends"]
+        ],
+        "stats_habit_vs_day_rating": stats["habit_correlations"][:TOP_CORRELATIONS],
+    }
@@ -1,69 +1,281 @@
-import json
-from datetime import datetime
+import math
+from array import array
 
-def clean_data(data):
-    cleaned = {
-        "quantifiableHabits": {},
-        "booleanHabits": {},
-        "dailyNoteData": [],
-        "timeData": [],
-        "moneyData": [],
-        "moodData": [],
-        "journalData": []
+from data_processing.json_stream import iter_records
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Fields kept for every record of each collection, in output order
+FIELD_SCHEMAS = {
+    "dailyNoteData": [
+        "date",
+        "morningComment",
+        "energy",
+        # "wakeHour", #^ temporarely removed since the model was overfixating on this
+        "success",
+        "beBetter",
+        "dayRating",
+        # "sleepTime" #^ same
+    ],
+    "timeData": ["date", "tag", "description", "duration", "startTime", "endTime"],
+    "moneyData": ["date", "amount", "type", "tag", "description"],
+    "moodData": ["date", "rating", "comment", "tag"],
+    "journalData": ["date", "text"],
+}
+
+# Fields exposed as float columns when columnar output is requested
+NUMERIC_FIELDS = {
+    "dailyNoteData": ["energy", "dayRating"],
+    "timeData": ["duration"],
+    "moneyData": ["amount"],
+    "moodData": ["rating"],
+}
+
+MAX_REPORTED_ERRORS = 50
+
+class DataValidationError(ValueError):
+    def __init__(self, errors):
+        self.errors = errors
+        shown = "; ".join(errors[:5])
+        more = f" (and {len(errors) - 5} more)" if len(errors) > 5 else ""
+        super().__init__(f"Invalid data: {shown}{more}")
+
+def _record_error(collection, index, record, fields):
+    if not isinstance(record, dict):
+        return f"{collection}[{index}]: expected an object, got {type(record).__name__}"
+    missing = [field for field in fields if field not in record]
+    return f"{collection}[{index}]: missing field(s) {', '.join(missing)}"
+
+# Notes may come without a date, everything else is required
+NOTE_OPTIONAL_FIELDS = ("date",)
+NOTE_REQUIRED_FIELDS = [field for field in FIELD_SCHEMAS["dailyNoteData"] if field not in NOTE_OPTIONAL_FIELDS]
+# Only dated notes carry habits, they are keyed by that date
+NOTE_HABIT_FIELDS = ["quantifiableHabits", "booleanHabits"]
+
+def _required_fields(collection, record):
+    if collection != "dailyNoteData":
+        return FIELD_SCHEMAS[collection]
+    if isinstance(record, dict) and record.get("date"):
+        return NOTE_REQUIRED_FIELDS + NOTE_HABIT_FIELDS
+    return NOTE_REQUIRED_FIELDS
+
+def _collect_errors(collection, records, errors):
+    for index, record in enumerate(records):
+        fields = _required_fields(collection, record)
+        if not isinstance(record, dict) or any(field not in record for field in fields):
+            errors.append(_record_error(collection, index, record, fields))
+        if len(errors) >= MAX_REPORTED_ERRORS:
+            break
+
+#^ one literal dict per collection: looping over FIELD_SCHEMAS for every record made cleaning
+#^ slower than the hand written loops it replaced. They must list the same fields, in the same
+#^ order, as FIELD_SCHEMAS (tests/test_data_cleaning.py checks it)
+def _clean_note(note):
+    return {
+        "date": note.get("date"),
+        "morningComment": note["morningComment"],
+        "energy": note["energy"],
+        "success": note["success"],
+        "beBetter": note["beBetter"],
+        "dayRating": note["dayRating"],
     }
 
-    # Process quantifiable habits
-    for note in data['dailyNoteData']:
-        date = note.get("date")
-        if date:
-            # Process quantifiable habits
-            cleaned["quantifiableHabits"][date] = note["quantifiableHabits"]
+def _clean_time_entry(entry):
+    return {
+        "date": entry["date"],
+        "tag": entry["tag"],
+        "description": entry["description"],
+        "duration": entry["duration"],
+        "startTime": entry["startTime"],
+        "endTime": entry["endTime"],
+    }
 
-            # Process boolean habits
-            cleaned["booleanHabits"][date] = note["booleanHabits"]
+def _clean_money_entry(entry):
+    return {"date": entry["date"], "amount": entry["amount"], "type": entry["type"], "tag": entry["tag"], "description": entry["description"]}
 
-        cleaned["dailyNoteData"].append({
+def _clean_mood_entry(entry):
+    return {"date": entry["date"], "rating": entry["rating"], "comment": entry["comment"], "tag": entry["tag"]}
+
+def _clean_journal_entry(entry):
+    return {"date": entry["date"], "text": entry["text"]}
+
+def _clean_notes(notes, quantifiable_habits, boolean_habits):
+    # Habits are picked up in the same pass over the notes
+    cleaned = []
+    append = cleaned.append
+    for note in notes:
+        date = note.get("date")
+        if date:
+            quantifiable_habits[date] = note["quantifiableHabits"]
+            boolean_habits[date] = note["booleanHabits"]
+        append({
             "date": date,
             "morningComment": note["morningComment"],
             "energy": note["energy"],
-            # "wakeHour": note["wakeHour"], #^ temporarely removed since the model was overfixating on this
             "success": note["success"],
             "beBetter": note["beBetter"],
             "dayRating": note["dayRating"],
-            # "sleepTime": note["sleepTime"] #^ same
         })
+    return cleaned
 
-    for time_entry in data["timeData"]:
-        cleaned["timeData"].append({
-            "date": time_entry["date"],
-            "tag": time_entry["tag"],
-            "description": time_entry["description"],
-            "duration": time_entry["duration"],
-            "startTime": time_entry["startTime"],
-            "endTime": time_entry["endTime"]
-        })
+def _clean_time_data(entries):
+    return [
+        {
+            "date": entry["date"],
+            "tag": entry["tag"],
+            "description": entry["description"],
+            "duration": entry["duration"],
+            "startTime": entry["startTime"],
+            "endTime": entry["endTime"],
+        }
+        for entry in entries
+    ]
 
-    for money_entry in data["moneyData"]:
-        cleaned["moneyData"].append({
-            "date": money_entry["date"],
-            "amount": money_entry["amount"],
-            "type": money_entry["type"],
-            "tag": money_entry["tag"],
-            "description": money_entry["description"]
-        })
+def _clean_money_data(entries):
+    return [
+        {"date": entry["date"], "amount": entry["amount"], "type": entry["type"], "tag": entry["tag"], "description": entry["description"]}
+        for entry in entries
+    ]
 
-    for mood_entry in data["moodData"]:
-        cleaned["moodData"].append({
-            "date": mood_entry["date"],
-            "rating": mood_entry["rating"],
-            "comment": mood_entry["comment"],
-            "tag": mood_entry["tag"],
-        })
+def _clean_mood_data(entries):
+    return [{"date": entry["date"], "rating": entry["rating"], "comment": entry["comment"], "tag": entry["tag"]} for entry in entries]
 
-    for journal_entry in data["journalData"]:
-        cleaned["journalData"].append({
-            "date": journal_entry["date"],
-            "text": journal_entry["text"]
-        })
+def _clean_journal_data(entries):
+    return [{"date": entry["date"], "text": entry["text"]} for entry in entries]
+
+# Whole collections at once for clean_data, one record at a time for clean_record_stream
+COLLECTION_CLEANERS = {
+    "timeData": _clean_time_data,
+    "moneyData": _clean_money_data,
+    "moodData": _clean_mood_data,
+    "journalData": _clean_journal_data,
+}
+RECORD_CLEANERS = {
+    "dailyNoteData": _clean_note,
+    "timeData": _clean_time_entry,
+    "moneyData": _clean_money_entry,
+    "moodData": _clean_mood_entry,
+    "journalData": _clean_journal_entry,
+}
+
+# Where each collection sits in a summary request body
+REQUEST_RECORD_PATHS = {(collection,): collection for collection in FIELD_SCHEMAS}
+
+def _clean_collection(collection, records, errors, cleaned):
+    # Fast path, only walk the records again to report errors if something is missing
+    try:
+        if collection == "dailyNoteData":
+            return _clean_notes(records, cleaned["quantifiableHabits"], cleaned["booleanHabits"])
+        return COLLECTION_CLEANERS[collection](records)
+    except (KeyError, TypeError, AttributeError):
+        _collect_errors(collection, records, errors)
+        return []
+
+def to_number(value):
+    if value is None or value == "":
+        return math.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and ":" in value:
+        # TIME columns like durations come as HH:MM:SS
+        try:
+            seconds = 0.0
+            for part in value.split(":"):
+                seconds = seconds * 60 + float(part)
+            return seconds
+        except ValueError:
+            return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+def _to_column(values):
+    if np is not None:
+        try:
+            # Plain numbers (and None, which becomes nan) convert in one go
+            return np.array(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            return np.array([to_number(value) for value in values], dtype=np.float64)
+    try:
+        return array('d', values)
+    except TypeError:
+        return array('d', [to_number(value) for value in values])
+
+def to_columns(records, fields):
+    return {field: _to_column([record[field] for record in records]) for field in fields}
+
+def clean_data(data, columnar=False):
+    errors = []
+    cleaned = {
+        "quantifiableHabits": {},
+        "booleanHabits": {},
+    }
+
+    missing_collections = [collection for collection in FIELD_SCHEMAS if not isinstance(data.get(collection), list)]
+    if missing_collections:
+        raise DataValidationError([f"{collection}: missing or not a list" for collection in missing_collections])
+
+    for collection in FIELD_SCHEMAS:
+        cleaned[collection] = _clean_collection(collection, data[collection], errors, cleaned)
+
+    if errors:
+        raise DataValidationError(errors[:MAX_REPORTED_ERRORS])
+
+    if columnar:
+        cleaned["columns"] = {
+            collection: to_columns(cleaned[collection], fields)
+            for collection, fields in NUMERIC_FIELDS.items()
+        }
 
     return cleaned
+
+def clean_record_stream(events, arrays):
+    # Same output as clean_data, but fed one (collection, record) pair at a time so nothing
+    # has to hold the raw payload. Values that are not records are returned as extras. arrays
+    # holds the collections that arrived as lists, it fills up while events is consumed
+    errors = []
+    cleaned = {
+        "quantifiableHabits": {},
+        "booleanHabits": {},
+    }
+    for collection in FIELD_SCHEMAS:
+        cleaned[collection] = []
+    counts = dict.fromkeys(FIELD_SCHEMAS, 0)
+    extras = {}
+
+    for name, record in events:
+        if name not in FIELD_SCHEMAS:
+            extras[name] = record
+            continue
+        if name not in arrays:
+            # The collection itself is not a list, reported below like clean_data does
+            continue
+
+        index = counts[name]
+        counts[name] += 1
+        try:
+            if name == "dailyNoteData":
+                date = record.get("date")
+                if date:
+                    cleaned["quantifiableHabits"][date] = record["quantifiableHabits"]
+                    cleaned["booleanHabits"][date] = record["booleanHabits"]
+            cleaned[name].append(RECORD_CLEANERS[name](record))
+        except (KeyError, TypeError, AttributeError):
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(_record_error(name, index, record, _required_fields(name, record)))
+
+    missing_collections = [collection for collection in FIELD_SCHEMAS if collection not in arrays]
+    if missing_collections:
+        raise DataValidationError([f"{collection}: missing or not a list" for collection in missing_collections])
+    if errors:
+        raise DataValidationError(errors)
+
+    return cleaned, extras
+
+def clean_json_stream(fp):
+    arrays = set()
+    return clean_record_stream(iter_records(fp, REQUEST_RECORD_PATHS, arrays=arrays), arrays)
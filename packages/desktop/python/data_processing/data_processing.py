@@ -1,5 +1,9 @@
+import os
 import json
 
+from data_processing.day_store import DayStore
+from data_processing.json_stream import iter_records
+
 ## STRUCURE OF DATA
 example_data = {
     'dayData': {
@@ -28,7 +32,8 @@ example_data = {
                 'beBetter': 'text',
                 'dayRating': 'value',
                 'sleepTime': 'value'
-            }
+            },
+            'journal': 'text'
         },
     },
     'timeData': {
@@ -40,65 +45,90 @@ example_data = {
 }
 
 
-def aggregate_data(data):
-    day_data = {}
-    mood_data = {}
-    journal_data = {}
-
-    # Process quantifiable habits
-    quantifiable_dates = data['quantifiableHabits']['dates']
-    for key in data['quantifiableHabits']:
-        if key != 'dates':
-            for index, value in enumerate(data['quantifiableHabits'][key]):
-                date = quantifiable_dates[index]
-                if date not in day_data:
-                    day_data[date] = {'quantifiableHabits': {}, 'booleanHabits': {}, 'moodData': [], 'noteData': {}}
-                day_data[date]['quantifiableHabits'][key.lower()] = value
-
-    # Process boolean habits
-    boolean_dates = data['booleanHabits']['dates']
-    for key in data['booleanHabits']:
-        if key != 'dates':
-            for index, value in enumerate(data['booleanHabits'][key]):
-                date = boolean_dates[index]
-                if date not in day_data:
-                    day_data[date] = {'quantifiableHabits': {}, 'booleanHabits': {}, 'moodData': [], 'noteData': {}}
-                day_data[date]['booleanHabits'][key.lower()] = value
-
-    # Process note data
-    for note in data['noteData']['data']:  # Adjusted to access 'data' inside 'noteData'
-        date = note['date']
-        if date not in day_data:
-            day_data[date] = {'quantifiableHabits': {}, 'booleanHabits': {}, 'moodData': [], 'noteData': {}}
-        day_data[date]['noteData'] = {
-            'morningComment': note['morningComment'],
-            'wakeHour': note['wakeHour'],
-            'energy': note['energy'],
-            'success': note['success'],
-            'beBetter': note['beBetter'],
-            'dayRating': note['dayRating'],
-            'sleepTime': note['sleepTime']
-        }
+def add_saved_habits(store, kind, habits):
+    # Habits are stored as one column per habit next to a dates column
+    dates = habits['dates']
+    for key, values in habits.items():
+        if key == 'dates':
+            continue
+        habit = key.lower()
+        for date, value in zip(dates, values):
+            if kind == 'quantifiableHabits':
+                store.add_habits(date, quantifiable={habit: value})
+            else:
+                store.add_habits(date, boolean={habit: value})
 
-    # Process mood data
-    for mood in data['moodData']:
-        date = mood['date'][:10]  # Extract just the date part (assuming it's in ISO format)
-        mood_entry = {
-            'rating': mood['rating'],
-            'comment': mood['comment'],
-            'tag': mood['tag'],
-            'description': mood['description']
-        }
-        mood_data[date]['moodData'].append(mood_entry)
+def add_saved_note(store, note):
+    store.add_note({
+        'date': note['date'],
+        'morningComment': note['morningComment'],
+        'wakeHour': note['wakeHour'],
+        'energy': note['energy'],
+        'success': note['success'],
+        'beBetter': note['beBetter'],
+        'dayRating': note['dayRating'],
+        'sleepTime': note['sleepTime']
+    })
+
+def add_saved_mood(store, mood):
+    # Dates are ISO timestamps and get bucketed by day
+    store.add_mood({
+        'date': mood['date'],
+        'rating': mood['rating'],
+        'comment': mood['comment'],
+        'tag': mood['tag'],
+        'description': mood['description']
+    })
+
+def add_saved_journal(store, journal):
+    store.add_journal(journal['date'], journal['journal'])
 
-    # Process journal data
+SAVED_RECORD_HANDLERS = {
+    'noteData': add_saved_note,
+    'moodData': add_saved_mood,
+    'journalData': add_saved_journal,
+}
+
+# Where the record arrays sit inside savedData.json
+SAVED_RECORD_PATHS = {
+    ('noteData', 'data'): 'noteData',  # Adjusted to access 'data' inside 'noteData'
+    ('moodData',): 'moodData',
+    ('journalData', 'data'): 'journalData',
+}
+
+def add_saved_data(store, data):
+    for kind in ('quantifiableHabits', 'booleanHabits'):
+        add_saved_habits(store, kind, data[kind])
+
+    for note in data['noteData']['data']:
+        add_saved_note(store, note)
+    for mood in data['moodData']:
+        add_saved_mood(store, mood)
     for journal in data['journalData']['data']:
-        date = journal['date']
-        journal_data[date] = journal['journal']
+        add_saved_journal(store, journal)
+
+    return store
+
+def add_saved_data_stream(store, fp):
+    # Records go into the store as soon as they are parsed, everything else
+    # (habit columns, timeData, moneyData) is returned as-is
+    extras = {}
+    for name, value in iter_records(fp, SAVED_RECORD_PATHS):
+        handler = SAVED_RECORD_HANDLERS.get(name)
+        if handler is not None:
+            handler(store, value)
+        elif name in ('quantifiableHabits', 'booleanHabits'):
+            add_saved_habits(store, name, value)
+        else:
+            extras[name] = value
+    return store, extras
+
+def aggregate_data(data, store=None):
+    store = add_saved_data(store if store is not None else DayStore(), data)
 
     # The timeData and moneyData remain unchanged since they are already aggregated
     aggregated_data = {
-        'dayData': day_data,
+        'dayData': store.to_day_data(),
         'timeData': data['timeData'],
         'moneyData': data['moneyData']
     }
@@ -120,15 +150,44 @@ def read_json_file(filepath):
         print(f"An error occurred: {e}")
         return None
 
+# Last built store for each export file, reused while the file is unchanged
+_store_cache = {}
+
+def load_day_store(filepath='savedData.json'):
+    try:
+        stat = os.stat(filepath)
+    except FileNotFoundError:
+        print(f"The file {filepath} was not found.")
+        return None, None
+
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _store_cache.get(filepath)
+    if cached and cached[0] == signature:
+        return cached[1], cached[2]
+
+    try:
+        with open(filepath, 'rb') as file:
+            store, extras = add_saved_data_stream(DayStore(), file)
+    except (ValueError, KeyError) as e:
+        print(f"Error decoding JSON from the file {filepath}: {e}")
+        return None, None
+
+    _store_cache[filepath] = (signature, store, extras)
+    return store, extras
+
 def read_and_aggregate_data():
     filepath = 'savedData.json'
-    data = read_json_file(filepath)
+    store, data = load_day_store(filepath)
 
-    if data is not None:
-        aggregated_data = aggregate_data(data)
+    if store is not None:
+        aggregated_data = {
+            'dayData': store.to_day_data(),
+            'timeData': data['timeData'],
+            'moneyData': data['moneyData']
+        }
 
         return aggregated_data
     else:
         print("No data available to process.")
 
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,126 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import date as date_cls, datetime, timedelta
+
+class DayRecord:
+    __slots__ = ('date', 'quantifiable_habits', 'boolean_habits', 'moods', 'note', 'journal')
+
+    def __init__(self, date):
+        self.date = date
+        self.quantifiable_habits = {}
+        self.boolean_habits = {}
+        # Keyed by the full mood timestamp so merging the same export twice is a no-op
+        self.moods = {}
+        self.note = None
+        self.journal = None
+
+    def note_row(self):
+        return {'date': self.date, **self.note} if self.note is not None else None
+
+    def mood_rows(self):
+        return [{'date': key, **self.moods[key]} for key in sorted(self.moods)]
+
+    def to_dict(self):
+        return {
+            'quantifiableHabits': self.quantifiable_habits,
+            'booleanHabits': self.boolean_habits,
+            'moodData': [self.moods[key] for key in sorted(self.moods)],
+            'noteData': self.note or {},
+            'journal': self.journal,
+        }
+
+class DayStore:
+    def __init__(self):
+        self._days = {}
+        # Kept sorted, ISO dates sort chronologically as strings
+        self._dates = []
+
+    def __len__(self):
+        return len(self._days)
+
+    def __contains__(self, date):
+        return date in self._days
+
+    def _day(self, date):
+        date = date[:10]
+        day = self._days.get(date)
+        if day is None:
+            day = DayRecord(date)
+            self._days[date] = day
+            # Days usually arrive in order, only pay for an insort when they don't
+            if not self._dates or date > self._dates[-1]:
+                self._dates.append(date)
+            else:
+                insort(self._dates, date)
+        return day
+
+    def get(self, date):
+        return self._days.get(date[:10])
+
+    def dates(self):
+        return list(self._dates)
+
+    def first_date(self):
+        return self._dates[0] if self._dates else None
+
+    def last_date(self):
+        return self._dates[-1] if self._dates else None
+
+    def add_habits(self, date, quantifiable=None, boolean=None):
+        day = self._day(date)
+        if quantifiable:
+            day.quantifiable_habits.update(quantifiable)
+        if boolean:
+            day.boolean_habits.update(boolean)
+
+    def add_note(self, note):
+        self._day(note['date']).note = {key: value for key, value in note.items() if key != 'date'}
+
+    def add_mood(self, mood):
+        self._day(mood['date']).moods[mood['date']] = {key: value for key, value in mood.items() if key != 'date'}
+
+    def add_journal(self, date, text):
+        self._day(date).journal = text
+
+    def add_cleaned_data(self, cleaned):
+        for date, habits in cleaned.get("quantifiableHabits", {}).items():
+            self.add_habits(date, quantifiable=habits)
+        for date, habits in cleaned.get("booleanHabits", {}).items():
+            self.add_habits(date, boolean=habits)
+        for note in cleaned.get("dailyNoteData", []):
+            if note.get("date"):
+                self.add_note(note)
+        for mood in cleaned.get("moodData", []):
+            self.add_mood(mood)
+        for journal in cleaned.get("journalData", []):
+            self.add_journal(journal["date"], journal["text"])
+        return self
+
+    def range(self, start, end):
+        # Inclusive on both ends, dates as YYYY-MM-DD
+        low = bisect_left(self._dates, start[:10])
+        high = bisect_right(self._dates, end[:10])
+        return [self._days[date] for date in self._dates[low:high]]
+
+    def week(self, week_str):
+        monday = datetime.strptime(week_str + '-1', '%G-W%V-%u').date()
+        return self.range(monday.isoformat(), (monday + timedelta(days=6)).isoformat())
+
+    def month(self, month_str):
+        year, month = (int(part) for part in month_str[:7].split('-'))
+        first = date_cls(year, month, 1)
+        last = date_cls(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+        return self.range(first.isoformat(), last.isoformat())
+
+    def weeks(self):
+        grouped = {}
+        for date in self._dates:
+            year, week, _ = datetime.strptime(date, '%Y-%m-%d').isocalendar()
+            grouped.setdefault(f"{year}-W{week}", []).append(self._days[date])
+        return grouped
+
+    def to_day_data(self):
+        return {date: self._days[date].to_dict() for date in self._dates}
+
+    @classmethod
+    def from_cleaned_data(cls, cleaned):
+        return cls().add_cleaned_data(cleaned)
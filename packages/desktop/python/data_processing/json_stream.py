@@ -0,0 +1,111 @@
+import codecs
+import json
+
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+class _Reader:
+    def __init__(self, fp, chunk_size=CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        # Request bodies come in as bytes, files opened in text mode as str
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+
+    def fill(self):
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            # Raises if the stream ended in the middle of a multi byte character
+            self.utf8.decode(b'', final=True)
+            return False
+        if isinstance(chunk, bytes):
+            # The incremental decoder holds back multi byte characters split across chunks
+            chunk = self.utf8.decode(chunk)
+        # Drop what was already consumed so the buffer stays around one record in size
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' in JSON stream, found '{found or 'end of input'}'")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                # A number right at the end of the buffer might continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+def _walk_array(reader, name, arrays):
+    reader.expect('[')
+    if arrays is not None:
+        arrays.add(name)
+    if reader.peek() == ']':
+        reader.pos += 1
+        return
+    while True:
+        yield name, reader.value()
+        if reader.peek() == ',':
+            reader.pos += 1
+            continue
+        reader.expect(']')
+        return
+
+def _walk_object(reader, prefix, record_paths, arrays):
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.pos += 1
+        return
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        path = prefix + (key,)
+
+        if path in record_paths and reader.peek() == '[':
+            yield from _walk_array(reader, record_paths[path], arrays)
+        elif any(record_path[:len(path)] == path for record_path in record_paths) and reader.peek() == '{':
+            yield from _walk_object(reader, path, record_paths, arrays)
+        else:
+            # Anything that is not a record array is small enough to decode in one go
+            yield ".".join(path), reader.value()
+
+        if reader.peek() == ',':
+            reader.pos += 1
+            continue
+        reader.expect('}')
+        return
+
+def iter_records(fp, record_paths, chunk_size=CHUNK_SIZE, arrays=None):
+    # record_paths maps a key path, e.g. ("noteData", "data"), to the name its records are yielded under.
+    # Records are yielded one at a time as (name, record); every other value comes out as (dotted.path, value).
+    # arrays, when given, collects the names of the record arrays found, empty ones included
+    reader = _Reader(fp, chunk_size)
+    yield from _walk_object(reader, (), record_paths, arrays)
+    if reader.peek() != '':
+        raise ValueError("Unexpected data after the end of the JSON document")
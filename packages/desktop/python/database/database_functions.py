@@ -1,8 +1,53 @@
+import time
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import settings
+from logger import logger
+from metrics import CACHE_REQUESTS, ERRORS
+
+DB_SERVICE_URL = settings.DB_SERVICE_URL
+REQUEST_TIMEOUT = 10
+POOL_SIZE = 10
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5  # Seconds, doubled on every retry
+
+def make_session():
+    retry = Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        # A read timeout on a POST may still have been applied, so those are not retried
+        read=0,
+        status=MAX_RETRIES,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "POST"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+    new_session = requests.Session()
+    new_session.mount("http://", adapter)
+    return new_session
+
+# One pooled session for every call to the local DB service, so connections get reused
+session = make_session()
+
+PILLARS_TTL = 300  # Seconds before cached pillars get revalidated in the background
+
+_pillars_lock = threading.Lock()
+_pillars_cache = {
+    "pillars": None,
+    "etag": None,
+    "last_modified": None,
+    "fetched_at": 0.0,
+    "refreshing": False,
+}
 
 def upsert_gpt_record(data):
     try:
-        response = requests.post("http://localhost:3001/gpt/upsert", json=data)
+        response = session.post(f"{DB_SERVICE_URL}/gpt/upsert", json=data, timeout=REQUEST_TIMEOUT)
         if response.status_code == 200 or response.status_code == 201:
             print("Record upserted successfully.")
             return response.json()  # Ensure response is JSON
@@ -16,10 +61,22 @@ def upsert_gpt_record(data):
         print(f"JSON decoding failed: {e}")
         return {"error": "JSONDecodeError", "details": str(e)}
 
-def fetch_pillars():
+def _request_pillars():
+    headers = {}
+    if _pillars_cache["pillars"] is not None:
+        # The express server answers these with a 304 when nothing changed
+        if _pillars_cache["etag"]:
+            headers["If-None-Match"] = _pillars_cache["etag"]
+        if _pillars_cache["last_modified"]:
+            headers["If-Modified-Since"] = _pillars_cache["last_modified"]
+
     try:
-        response = requests.get("http://localhost:3001/pillars/list")
-        if response.status_code == 200:
+        response = session.get(f"{DB_SERVICE_URL}/pillars/list", headers=headers, timeout=REQUEST_TIMEOUT)
+        if response.status_code == 304:
+            with _pillars_lock:
+                _pillars_cache["fetched_at"] = time.monotonic()
+            return _pillars_cache["pillars"]
+        elif response.status_code == 200:
             fetched_pillars = response.json()
             parsed_pillars = [
                 {
@@ -29,6 +86,11 @@ def fetch_pillars():
                 }
                 for pillar in fetched_pillars
             ]
+            with _pillars_lock:
+                _pillars_cache["pillars"] = parsed_pillars
+                _pillars_cache["etag"] = response.headers.get("ETag")
+                _pillars_cache["last_modified"] = response.headers.get("Last-Modified")
+                _pillars_cache["fetched_at"] = time.monotonic()
             return parsed_pillars
         else:
             print(f"Failed to fetch pillars. Status code: {response.status_code}")
@@ -36,3 +98,40 @@ def fetch_pillars():
     except requests.exceptions.RequestException as e:
         print(f"An error occurred: {e}")
         return {"error": "RequestException", "details": str(e)}
+    except (ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Unexpected pillars response: {e}")
+        return {"error": "InvalidResponse", "details": str(e)}
+
+def _refresh_pillars_in_background():
+    try:
+        _request_pillars()
+    finally:
+        with _pillars_lock:
+            _pillars_cache["refreshing"] = False
+
+def fetch_pillars(force_refresh=False):
+    with _pillars_lock:
+        cached = _pillars_cache["pillars"]
+        age = time.monotonic() - _pillars_cache["fetched_at"]
+        if cached is not None and not force_refresh:
+            # Stale pillars are still served while a single background refresh revalidates them
+            if age > PILLARS_TTL and not _pillars_cache["refreshing"]:
+                _pillars_cache["refreshing"] = True
+                threading.Thread(target=_refresh_pillars_in_background, daemon=True).start()
+            CACHE_REQUESTS.inc(cache="pillars", result="hit" if age <= PILLARS_TTL else "stale")
+            return cached
+
+    CACHE_REQUESTS.inc(cache="pillars", result="bypass" if force_refresh else "miss")
+    result = _request_pillars()
+    if isinstance(result, dict) and "error" in result:
+        ERRORS.inc(component="db", type=result["error"])
+    if isinstance(result, dict) and "error" in result and cached is not None:
+        logger.warning(f"Serving last known pillars after a failed refresh: {result['error']}")
+        return cached
+    return result
+
+def pillars_or_empty(pillars):
+    # fetch_pillars returns an error dict when nothing was ever fetched, that must not end up in a prompt
+    if isinstance(pillars, dict) and "error" in pillars:
+        return []
+    return pillars
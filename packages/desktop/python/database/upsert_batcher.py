@@ -0,0 +1,109 @@
+import time
+import uuid
+import atexit
+import threading
+
+from database.database_functions import upsert_gpt_record
+from logger import logger
+from metrics import timed_stage, ERRORS
+
+BATCH_SIZE = 20  # Flush as soon as this many records are waiting
+FLUSH_INTERVAL = 2.0  # Or after this many seconds, whichever comes first
+
+# Stable namespace so the same date and type always map to the same GPT row
+GPT_RECORD_NAMESPACE = uuid.UUID("5d1f3a0e-8c2b-4f6a-9e37-2b4c8d1a7f90")
+
+class UpsertBatcher:
+    def __init__(self, upsert_fn=upsert_gpt_record, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.upsert_fn = upsert_fn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Keyed by uuid, a newer version of a record replaces the one still waiting
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._worker = None
+        self._stopped = False
+        self.stats = {"queued": 0, "coalesced": 0, "sent": 0, "failed": 0, "flushes": 0}
+
+    def start(self):
+        with self._condition:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="upsert-batcher", daemon=True)
+                self._worker.start()
+
+    def enqueue(self, record):
+        self.start()
+        with self._condition:
+            if record["uuid"] in self._pending:
+                self.stats["coalesced"] += 1
+            self._pending[record["uuid"]] = record
+            self.stats["queued"] += 1
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+
+    def _take_batch(self):
+        with self._condition:
+            batch = list(self._pending.values())
+            self._pending = {}
+            return batch
+
+    def flush(self):
+        with self._flush_lock:
+            batch = self._take_batch()
+            if not batch:
+                return 0
+            # The DB service has no bulk route, the batch goes out back to back over one pooled connection
+            failed = 0
+            for record in batch:
+                with timed_stage("db_upsert"):
+                    result = self.upsert_fn(record)
+                if isinstance(result, dict) and "error" in result:
+                    failed += 1
+                    ERRORS.inc(component="db", type=result["error"])
+                    logger.error(f'Failed to persist GPT record {record["date"]} ({record["type"]}): {result}')
+            self.stats["sent"] += len(batch) - failed
+            self.stats["failed"] += failed
+            self.stats["flushes"] += 1
+            return len(batch)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._stopped and len(self._pending) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                stopped = self._stopped
+            self.flush()
+            if stopped:
+                return
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._worker is not None:
+            self._worker.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+batcher = UpsertBatcher()
+atexit.register(batcher.stop)
+
+def gpt_record(date, record_type, summary):
+    now = time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())
+    return {
+        "uuid": str(uuid.uuid5(GPT_RECORD_NAMESPACE, f"{date}|{record_type}")),
+        "date": date,
+        "type": record_type,
+        "summary": summary,
+        "createdAt": now,
+        "updatedAt": now,
+    }
+
+def queue_gpt_record(date, record_type, summary):
+    record = gpt_record(date, record_type, summary)
+    batcher.enqueue(record)
+    return record["uuid"]
@@ -1,26 +1,195 @@
-import logging
+import os
+import json
+import queue
+import atexit
 import socket
+import logging
+import threading
+import contextvars
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+import settings
+
+#^ request threads only put records on a bounded queue, a single listener thread formats them and
+#^ writes to the console and the rotating file. A slow or redirected stdout therefore slows the
+#^ listener down, never a request: once the queue is full new records are dropped and counted
 
 hostname = socket.gethostname()
 service_name = "ai-helpers"
-environment = "development"
+environment = settings.ENVIRONMENT
+
+# Set for every request by main_server, so each log line can be tied back to it
+request_id = contextvars.ContextVar("request_id", default=None)
+
+stats = {"dropped": 0, "sampled_out": 0, "truncated": 0}
+
+def truncate(value, limit=settings.LOG_MAX_FIELD_CHARS):
+    if not isinstance(value, str) or len(value) <= limit:
+        return value
+    stats["truncated"] += 1
+    return f"{value[:limit]}... ({len(value) - limit} more chars)"
+
+def parse_sampling(value):
+    # "name=rate,name=rate" -> {name: rate}
+    rates = {}
+    for part in (value or "").split(","):
+        name, _, rate = part.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+class RequestContextFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    # Keeps rate of the INFO and DEBUG records of each configured logger (children included). A
+    # running credit instead of random draws, so 0.1 keeps exactly every tenth record
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self._credit = {}
+        self._lock = threading.Lock()
+
+    def _rate(self, name):
+        while name:
+            if name in self.rates:
+                return name, self.rates[name]
+            name = name.rpartition(".")[0]
+        return None, 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        name, rate = self._rate(record.name)
+        if rate >= 1.0:
+            return True
+        with self._lock:
+            credit = self._credit.get(name, 1.0) + rate
+            keep = credit >= 1.0
+            self._credit[name] = credit - 1.0 if keep else credit
+        if not keep:
+            stats["sampled_out"] += 1
+        return keep
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line. Anything passed as extra={"fields": {...}} becomes top level keys
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "service": service_name,
+            "hostname": hostname,
+            "environment": environment,
+            "request_id": getattr(record, "request_id", None),
+            "file": record.filename,
+            "function": record.funcName,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class NonBlockingQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Runs on the request thread. Only the message is rendered here (and cut to size), the
+        # formatting is left to the listener. The traceback is turned into text now because the
+        # exception object should not outlive the request
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = truncate(record.getMessage())
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        fields = getattr(record, "fields", None)
+        if fields:
+            record.fields = {key: truncate(value) for key, value in fields.items()}
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            stats["dropped"] += 1
+        if record.levelno < logging.WARNING:
+            return
+        # Warnings and errors take the place of the oldest waiting record
+        try:
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.queue.put_nowait(record)
+        except (queue.Empty, queue.Full):
+            pass
+
+_listener = None
+
+def _console_formatter():
+    if settings.LOG_FORMAT == "json":
+        return JsonFormatter()
+    return logging.Formatter('%(levelname)s - %(request_id)s - %(filename)s - %(funcName)s - %(message)s')
+
+def _output_handlers():
+    # Create a console handler
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(_console_formatter())
+    handlers = [console_handler]
+
+    if settings.LOG_FILE:
+        try:
+            os.makedirs(os.path.dirname(settings.LOG_FILE), exist_ok=True)
+            file_handler = RotatingFileHandler(
+                settings.LOG_FILE, maxBytes=settings.LOG_FILE_MAX_BYTES, backupCount=settings.LOG_FILE_BACKUPS, encoding='utf-8', delay=True
+            )
+            # The file is for machines, always JSON
+            file_handler.setFormatter(JsonFormatter())
+            handlers.append(file_handler)
+        except OSError as e:
+            print(f"Could not open the log file {settings.LOG_FILE}, logging to the console only: {e}")
+    return handlers
+
+def _start_listener(queue_handler):
+    global _listener
+    queue_handler.queue = queue.Queue(settings.LOG_QUEUE_SIZE)
+    _listener = QueueListener(queue_handler.queue, *_output_handlers(), respect_handler_level=True)
+    _listener.start()
+
+def stop_logging():
+    # Writes out whatever is still queued, also runs at exit
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    # Executor threads do not inherit context variables, this carries the request id along
+    context = contextvars.copy_context()
+    return executor.submit(context.run, fn, *args, **kwargs)
 
 def setup_logging():
     # Create a logger
     logger = logging.getLogger(service_name)
-    logger.setLevel(logging.INFO)  # Set the default logging level
+    logger.setLevel(settings.LOG_LEVEL)  # Set the default logging level
 
-    # Create a console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)  # Set the logging level for the console
+    queue_handler = NonBlockingQueueHandler(None)
+    queue_handler.addFilter(SamplingFilter(parse_sampling(settings.LOG_SAMPLING)))
+    queue_handler.addFilter(RequestContextFilter())
+    _start_listener(queue_handler)
 
-    # Create a formatter and add it to the handler
-    formatter = logging.Formatter('%(levelname)s - %(filename)s - %(funcName)s - %(message)s')
-    # formatter = logging.Formatter('%(levelname)s - %(message)s')
-    console_handler.setFormatter(formatter)
+    # A forked worker (gunicorn) gets the queue but not the listener thread, so it starts its own
+    # on a fresh queue, the parent's one may have been locked mid write
+    os.register_at_fork(after_in_child=lambda: _start_listener(queue_handler))
+    atexit.register(stop_logging)
 
     # Add the handler to the logger
-    logger.addHandler(console_handler)
+    logger.addHandler(queue_handler)
 
     return logger
 
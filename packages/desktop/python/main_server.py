@@ -1,15 +1,79 @@
-from flask import Flask, jsonify, request  # Add 'request' here
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 import json
+import time
+import uuid
 from datetime import datetime
 
-from data_processing.data_cleaning import clean_data
-from database.database_functions import fetch_pillars
-from ai_helpers.claude import generate_mood_recap, generate_journal_entry, generate_monthly_mood_recap
-from ai_helpers.gpt import create_thoughts
-from logger import logger
+import settings
+from data_processing.data_cleaning import clean_data, clean_json_stream, DataValidationError, FIELD_SCHEMAS
+from data_processing.day_store import DayStore
+from data_processing.analytics import compute_stats, stats_features
+from ai_helpers.claude import (
+    generate_mood_recap, generate_monthly_mood_recap, generate_monthly_recap_from_weeks,
+    stream_mood_recap, stream_monthly_mood_recap, stream_monthly_recap_from_weeks
+)
+from pipeline.summary_pipeline import run_summary_pipeline, stream_summary_pipeline, StageTimeoutError
+from ai_helpers.llm_gateway import LLMUnavailableError
+from ai_helpers.claude import gateway as claude_gateway
+from ai_helpers.gpt import gateway as gpt_gateway
+from ai_helpers.semantic_index import index_data, related_entries, search as search_index, get_index, index_snapshots, SemanticIndexUnavailable
+from pipeline.journal_pipeline import generate_journal_reflection, stream_journal_reflection
+from pipeline.monthly_pipeline import build_incremental_monthly_data
+from pipeline.job_queue import submit_job, get_job, wait_for_job, request_key, recover_interrupted_jobs
+from pipeline.single_flight import SingleFlight
+from database.upsert_batcher import queue_gpt_record
+from logger import logger, request_id, stats as log_stats
+from metrics import registry, timed_stage, HTTP_REQUEST_SECONDS, ERRORS
 
 app = Flask(__name__)
 
+# Anything bigger is refused with a 413 before it is read
+MAX_REQUEST_BYTES = settings.MAX_REQUEST_BYTES
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+
+# Suggested wait for clients when the LLM providers stay saturated
+LLM_RETRY_AFTER = 30
+
+# Request bodies above this size are parsed record by record instead of through request.json
+STREAMING_INGEST_THRESHOLD = 2 * 1024 * 1024
+
+# Identical summary requests arriving together (double clicks, desktop and mobile asking for the
+# same week) share one pipeline run, jobs go through it too
+summary_flight = SingleFlight("summaries")
+
+# Echoed back on every response, and taken from the caller when it sends one
+REQUEST_ID_HEADER = "X-Request-ID"
+# One line per request, can be sampled through LOG_SAMPLING
+access_logger = logger.getChild("access")
+
+def _gateway_samples(field):
+    samples = []
+    for gateway in (claude_gateway, gpt_gateway):
+        for model, snapshot in gateway.snapshot().items():
+            if field in snapshot:
+                samples.append(({"provider": gateway.name, "model": model}, snapshot[field]))
+    return samples
+
+# The existing snapshots, read at scrape time
+registry.snapshot_metric(
+    "summary_requests_total", "Summary requests by whether they ran the pipeline or joined an identical one", "counter",
+    lambda: [({"result": result}, summary_flight.snapshot()[result]) for result in ("executions", "coalesced")])
+registry.snapshot_metric(
+    "summary_in_flight", "Summary pipelines running right now", "gauge",
+    lambda: [({}, summary_flight.snapshot()["in_flight"])])
+registry.snapshot_metric(
+    "llm_concurrency_limit", "Current adaptive concurrency limit per model", "gauge", lambda: _gateway_samples("limit"))
+registry.snapshot_metric(
+    "llm_in_flight", "LLM calls running right now per model", "gauge", lambda: _gateway_samples("in_flight"))
+registry.snapshot_metric(
+    "llm_blocked_seconds", "How long new calls are held back for the rate limit window", "gauge", lambda: _gateway_samples("blocked_for"))
+registry.snapshot_metric(
+    "semantic_index_entries", "Entries in the semantic index", "gauge",
+    lambda: [({"model": snapshot["model"]}, snapshot["entries"]) for snapshot in index_snapshots()])
+registry.snapshot_metric(
+    "log_records_total", "Log records dropped on a full queue, left out by sampling or cut to size", "counter",
+    lambda: [({"result": result}, count) for result, count in log_stats.items()])
+
 def get_week_number(date_str):
     date_obj = datetime.strptime(date_str, '%Y-%m-%d')
     week_number = date_obj.isocalendar()[1]
@@ -19,116 +83,315 @@ def get_week_number(date_str):
 
     return week_date
 
-@app.route('/weekly_summary', methods=['POST'])
-def weekly_summary():
-    try:
-        # Load data from request instead of file
+def read_summary_request():
+    if (request.content_length or 0) > STREAMING_INGEST_THRESHOLD:
+        # Records are cleaned as they are parsed, data only keeps the non-record fields
+        with timed_stage("clean_data"):
+            cleaned_data, data = clean_json_stream(request.stream)
+    else:
         data = request.json
-        logger.info('Data recieved')
-
-        cleaned_data = clean_data(data)
-        logger.info('Data cleaned')
-
-        # Unpack cleaned_data
-        boolean_habits = cleaned_data["booleanHabits"]
-        quantifiable_habits = cleaned_data["quantifiableHabits"]
-        note_data = cleaned_data["dailyNoteData"]
-        time_data = cleaned_data["timeData"]
-        mood_data = cleaned_data["moodData"]
-        journal_data = cleaned_data["journalData"]
+        with timed_stage("clean_data"):
+            cleaned_data = clean_data(data)
+    logger.info('Data cleaned')
+    return data, cleaned_data
 
-        del cleaned_data["booleanHabits"]
-        del cleaned_data["quantifiableHabits"]
+def request_options(data):
+    # Everything in the body that is not one of the record collections, e.g. bypassCache or currentDate
+    return {key: value for key, value in data.items() if key not in FIELD_SCHEMAS}
 
-        most_recent_date = max(mood_entry['date'].split('T')[0] for mood_entry in mood_data)
-        week_date = get_week_number(most_recent_date)
-        logger.info(f'Week date: {week_date}')
+def summary_key(kind, data, cleaned_data):
+    return request_key(kind, cleaned_data, request_options(data))
 
+def add_related_entries(data_to_send, cleaned_data):
+    # Past journal entries and notes that read like this period, the summary goes out without them
+    # if the index is unavailable
+    try:
+        with timed_stage("related_entries"):
+            data_to_send["related_past_entries"] = related_entries(cleaned_data)
+    except Exception as e:
+        logger.warning(f"Could not add related past entries: {str(e)}")
+
+def prepare_weekly_summary(cleaned_data, include_stats=False, include_related=False):
+    # Unpack cleaned_data
+    note_data = cleaned_data["dailyNoteData"]
+    mood_data = cleaned_data["moodData"]
+
+    store = DayStore.from_cleaned_data({"moodData": mood_data})
+    week_date = get_week_number(store.last_date())
+    logger.info(f'Week date: {week_date}')
+
+    data_to_send = {
+        "note_data": note_data,
+        "mood_data": mood_data,
+    }
+    if include_stats:
+        data_to_send.update(stats_features(compute_stats(cleaned_data)))
+    if include_related:
+        add_related_entries(data_to_send, cleaned_data)
+
+    return data_to_send, note_data, week_date
+
+def prepare_monthly_summary(data, cleaned_data, incremental=False, use_cache=True, include_stats=False, include_related=False):
+    # Unpack cleaned_data
+    note_data = cleaned_data["dailyNoteData"]
+    mood_data = cleaned_data["moodData"]
+
+    weekly_AI_summaries = data["weeklyAISummaries"]
+
+    if incremental:
+        # Only weekly summaries and per-week stats go to Claude, the raw daily rows stay here
+        data_to_send = build_incremental_monthly_data(note_data, mood_data, weekly_AI_summaries, use_cache)
+    else:
         data_to_send = {
+            "weekly_AI_summaries": weekly_AI_summaries,
             "note_data": note_data,
             "mood_data": mood_data,
         }
-        
-        claude_response = generate_mood_recap(data_to_send)
-        mood_summary = claude_response.content[0].text
-
-        data_to_give_gpt = {
-            "successes": [note["success"] for note in note_data],
-            "beBetters": [note["beBetter"] for note in note_data],
-            "claude_summary": mood_summary
-        }
-
-        pillars = fetch_pillars()
-
-        gpt_response = create_thoughts(data_to_give_gpt, pillars)
+    if include_stats:
+        data_to_send.update(stats_features(compute_stats(cleaned_data)))
+    if include_related:
+        add_related_entries(data_to_send, cleaned_data)
+
+    return data_to_send, note_data, data["currentDate"]
+
+def build_mood_summary(date, mood_summary, gpt_response):
+    return {
+        "id": None,
+        "date": date,
+        "type": "Mood Summary",
+        "claude_summary": mood_summary,
+        "gpt_summary": gpt_response
+    }
+
+def persist_mood_summary(mood_summary):
+    # Queued for the background batcher so the response never waits on the DB service. Only for
+    # clients that do not save the summary themselves: the apps upsert it without a uuid, which makes
+    # the DB service create a second row, so persist must not be combined with the client write
+    mood_summary["id"] = queue_gpt_record(mood_summary["date"], mood_summary["type"], mood_summary["claude_summary"])
+    return mood_summary
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+def sse_response(events):
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def stream_summary_events(stream_fn, data_to_send, note_data, date, use_cache, persist=False):
+    try:
+        for event, payload in stream_summary_pipeline(stream_fn, data_to_send, note_data, use_cache):
+            if event == "token":
+                yield sse_event("token", {"text": payload})
+            else:
+                mood_summary, gpt_response, timings = payload
+                data = build_mood_summary(date, mood_summary, gpt_response)
+                if persist:
+                    persist_mood_summary(data)
+                yield sse_event("done", {"message": "Data processed successfully", "mood_summary": data, "timings": timings})
+    except Exception as e:
+        logger.error(f"Error while streaming summary: {str(e)}", exc_info=True)
+        yield sse_event("error", {"error": str(e)})
+
+def weekly_summary_result(data, cleaned_data):
+    use_cache = not data.get('bypassCache', False)
+
+    data_to_send, note_data, week_date = prepare_weekly_summary(cleaned_data, data.get('includeStats', False), data.get('includeRelated', False))
+
+    mood_summary, gpt_response, timings = run_summary_pipeline(generate_mood_recap, data_to_send, note_data, use_cache)
+
+    summary = build_mood_summary(week_date, mood_summary, gpt_response)
+    if data.get('persist', False):
+        persist_mood_summary(summary)
+
+    return {"message": "Data processed successfully", "mood_summary": summary, "timings": timings}
+
+@app.before_request
+def start_request():
+    g.request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+    g.request_started = time.perf_counter()
+    request_id.set(g.request_id)
+
+@app.after_request
+def finish_request(response):
+    response.headers[REQUEST_ID_HEADER] = g.request_id
+    # The route pattern rather than the path, so /jobs/<job_id> stays one series
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    method, status, started = request.method, response.status_code, g.request_started
+
+    def record():
+        # Runs once the body is sent, so streamed responses are measured to their last event
+        elapsed = time.perf_counter() - started
+        HTTP_REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, method=method, status=status)
+        if status >= 500:
+            ERRORS.inc(component="http", type=str(status))
+        access_logger.info(f"{method} {endpoint} {status} in {elapsed:.3f}s", extra={"fields": {
+            "endpoint": endpoint,
+            "method": method,
+            "status": status,
+            "duration": round(elapsed, 3),
+        }})
+        request_id.set(None)
+
+    response.call_on_close(record)
+    return response
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({"error": f"Request body larger than {MAX_REQUEST_BYTES} bytes"}), 413
 
-        data = {
-            "id": None,
-            "date": week_date,
-            "type": "Mood Summary",
-            "claude_summary": mood_summary,
-            "gpt_summary": gpt_response
-        }
+@app.route('/weekly_summary', methods=['POST'])
+def weekly_summary():
+    try:
+        # Load data from request instead of file
+        data, cleaned_data = read_summary_request()
+        logger.info('Data recieved')
 
-        return jsonify({"message": "Data processed successfully", "mood_summary": data}), 200
+        key = summary_key('weekly_summary', data, cleaned_data)
+        return jsonify(summary_flight.do(key, weekly_summary_result, data, cleaned_data)), 200
+    except DataValidationError as e:
+        logger.error(f"Invalid data in weekly_summary: {str(e)}")
+        return jsonify({"error": str(e), "details": e.errors}), 400
+    except StageTimeoutError as e:
+        logger.error(f"Timeout in weekly_summary: {str(e)}")
+        return jsonify({"error": str(e)}), 504
+    except LLMUnavailableError as e:
+        logger.error(f"LLM unavailable in weekly_summary: {str(e)}")
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(LLM_RETRY_AFTER)}
     except Exception as e:
         logger.error(f"Error in process_data: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
-@app.route('/monthly_summary', methods=['POST'])
-def monthly_summary():
+@app.route('/weekly_summary/stream', methods=['POST'])
+def weekly_summary_stream():
     try:
-        data = request.json
+        data, cleaned_data = read_summary_request()
+        use_cache = not data.get('bypassCache', False)
+        persist = data.get('persist', False)
         logger.info('Data recieved')
 
-        cleaned_data = clean_data(data)
-        logger.info('Data cleaned')
+        data_to_send, note_data, week_date = prepare_weekly_summary(cleaned_data, data.get('includeStats', False), data.get('includeRelated', False))
 
-        # Unpack cleaned_data
-        boolean_habits = cleaned_data["booleanHabits"]
-        quantifiable_habits = cleaned_data["quantifiableHabits"]
-        note_data = cleaned_data["dailyNoteData"]
-        time_data = cleaned_data["timeData"]
-        mood_data = cleaned_data["moodData"]
-        journal_data = cleaned_data["journalData"]
+        return sse_response(stream_summary_events(stream_mood_recap, data_to_send, note_data, week_date, use_cache, persist))
+    except DataValidationError as e:
+        logger.error(f"Invalid data in weekly_summary_stream: {str(e)}")
+        return jsonify({"error": str(e), "details": e.errors}), 400
+    except Exception as e:
+        logger.error(f"Error in weekly_summary_stream: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
 
-        del cleaned_data["booleanHabits"]
-        del cleaned_data["quantifiableHabits"]
+def monthly_summary_result(data, cleaned_data):
+    use_cache = not data.get('bypassCache', False)
 
-        weekly_AI_summaries = data["weeklyAISummaries"]
+    incremental = data.get('incremental', False)
+    data_to_send, note_data, current_date = prepare_monthly_summary(data, cleaned_data, incremental, use_cache, data.get('includeStats', False), data.get('includeRelated', False))
 
-        data_to_send = {
-            "weekly_AI_summaries": weekly_AI_summaries,
-            "note_data": note_data,
-            "mood_data": mood_data,
-        }
+    recap_fn = generate_monthly_recap_from_weeks if incremental else generate_monthly_mood_recap
+    mood_summary, gpt_response, timings = run_summary_pipeline(recap_fn, data_to_send, note_data, use_cache)
 
-        claude_response = generate_monthly_mood_recap(data_to_send)
-        mood_summary = claude_response.content[0].text
+    summary = build_mood_summary(current_date, mood_summary, gpt_response)
+    if data.get('persist', False):
+        persist_mood_summary(summary)
 
-        pillars = fetch_pillars()
+    return {"message": "Data processed successfully", "mood_summary": summary, "timings": timings}
 
-        data_to_give_gpt = {
-            "successes": [note["success"] for note in note_data],
-            "beBetters": [note["beBetter"] for note in note_data],
-            "claude_summary": mood_summary
-        }
+@app.route('/monthly_summary', methods=['POST'])
+def monthly_summary():
+    try:
+        data, cleaned_data = read_summary_request()
+        logger.info('Data recieved')
 
-        gpt_response = create_thoughts(data_to_give_gpt, pillars)
+        key = summary_key('monthly_summary', data, cleaned_data)
+        return jsonify(summary_flight.do(key, monthly_summary_result, data, cleaned_data)), 200
+    except DataValidationError as e:
+        logger.error(f"Invalid data in monthly_summary: {str(e)}")
+        return jsonify({"error": str(e), "details": e.errors}), 400
+    except StageTimeoutError as e:
+        logger.error(f"Timeout in monthly_summary: {str(e)}")
+        return jsonify({"error": str(e)}), 504
+    except LLMUnavailableError as e:
+        logger.error(f"LLM unavailable in monthly_summary: {str(e)}")
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(LLM_RETRY_AFTER)}
+    except Exception as e:
+        logger.error(f"Error in monthly_summary: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
 
-        data = {
-            "id": None,
-            "date": data["currentDate"],
-            "type": "Mood Summary",
-            "claude_summary": mood_summary,
-            "gpt_summary": gpt_response
-        }
+@app.route('/monthly_summary/stream', methods=['POST'])
+def monthly_summary_stream():
+    try:
+        data, cleaned_data = read_summary_request()
+        use_cache = not data.get('bypassCache', False)
+        persist = data.get('persist', False)
+        logger.info('Data recieved')
+
+        incremental = data.get('incremental', False)
+        data_to_send, note_data, current_date = prepare_monthly_summary(data, cleaned_data, incremental, use_cache, data.get('includeStats', False), data.get('includeRelated', False))
 
-        return jsonify({"message": "Data processed successfully", "mood_summary": data}), 200
+        stream_fn = stream_monthly_recap_from_weeks if incremental else stream_monthly_mood_recap
+        return sse_response(stream_summary_events(stream_fn, data_to_send, note_data, current_date, use_cache, persist))
+    except DataValidationError as e:
+        logger.error(f"Invalid data in monthly_summary_stream: {str(e)}")
+        return jsonify({"error": str(e), "details": e.errors}), 400
     except Exception as e:
-        logger.error(f"Error in monthly_summary: {str(e)}", exc_info=True)
+        logger.error(f"Error in monthly_summary_stream: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/stats', methods=['POST'])
+def stats():
+    try:
+        data, cleaned_data = read_summary_request()
+        period = data.get('period', 'week')
+
+        if period not in ('week', 'month'):
+            return jsonify({"error": "period must be 'week' or 'month'"}), 400
+
+        return jsonify({"message": "Stats computed successfully", "stats": compute_stats(cleaned_data, period)}), 200
+    except DataValidationError as e:
+        logger.error(f"Invalid data in stats: {str(e)}")
+        return jsonify({"error": str(e), "details": e.errors}), 400
+    except Exception as e:
+        logger.error(f"Error in stats: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/search', methods=['POST'])
+def search():
+    try:
+        data = request.json
+        query = data.get('query')
+        if not isinstance(query, str) or not query.strip():
+            return jsonify({"error": "query must be a non empty string"}), 400
+        try:
+            k = int(data.get('k', 10))
+        except (TypeError, ValueError, OverflowError):
+            k = 0
+        if k < 1:
+            return jsonify({"error": "k must be a positive integer"}), 400
+
+        # journalData and dailyNoteData sent along are indexed first, only new or changed entries get embedded
+        indexed = index_data(data) if data.get('journalData') or data.get('dailyNoteData') else None
+        results = search_index(query, k, data.get('kinds'), data.get('startDate'), data.get('endDate'))
+
+        return jsonify({"results": results, "indexed": indexed, "index": get_index().snapshot()}), 200
+    except SemanticIndexUnavailable as e:
+        logger.error(f"Search unavailable: {str(e)}")
+        return jsonify({"error": str(e)}), 503
+    except LLMUnavailableError as e:
+        logger.error(f"Embeddings unavailable in search: {str(e)}")
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(LLM_RETRY_AFTER)}
+    except Exception as e:
+        logger.error(f"Error in search: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+def journal_result(journal_entries, use_cache):
+    # Generate AI entry using Claude, long ranges are summarised week by week first
+    generated_entry = generate_journal_reflection(journal_entries, use_cache)
+    # The entry itself goes in as a field, which is cut to LOG_MAX_FIELD_CHARS
+    logger.info(f'Generated a journal entry of {len(generated_entry)} chars', extra={"fields": {"generated_entry": generated_entry}})
+
+    return {"message": "Journal entry generated successfully", "generated_entry": generated_entry}
+
 @app.route('/generate_journal', methods=['POST'])
 def generate_journal():
     try:
@@ -137,20 +400,140 @@ def generate_journal():
         journal_entries = data['journalEntries']
         start_date = data['startDate']
         end_date = data['endDate']
+        use_cache = not data.get('bypassCache', False)
 
         logger.info(f'len journal entries: {len(journal_entries)}, start date: {start_date}, end date: {end_date}')
 
         if not journal_entries:
             return jsonify({"error": "No journal entries found in the specified date range"}), 400
 
-        # Generate AI entry using Claude
-        generated_entry = generate_journal_entry(journal_entries)
-        logger.info(f'generated_entry: {generated_entry}')
+        key = request_key('generate_journal', journal_entries, use_cache)
+        return jsonify(summary_flight.do(key, journal_result, journal_entries, use_cache)), 200
+    except StageTimeoutError as e:
+        logger.error(f"Timeout in generate_journal: {str(e)}")
+        return jsonify({"error": str(e)}), 504
+    except LLMUnavailableError as e:
+        logger.error(f"LLM unavailable in generate_journal: {str(e)}")
+        return jsonify({"error": str(e)}), 503, {"Retry-After": str(LLM_RETRY_AFTER)}
+    except Exception as e:
+        logger.error(f"Error in generate_journal: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/generate_journal/stream', methods=['POST'])
+def generate_journal_stream():
+    try:
+        logger.info('generate_journal_stream called')
+        data = request.json
+        journal_entries = data['journalEntries']
+        use_cache = not data.get('bypassCache', False)
+
+        logger.info(f'len journal entries: {len(journal_entries)}, start date: {data["startDate"]}, end date: {data["endDate"]}')
+
+        if not journal_entries:
+            return jsonify({"error": "No journal entries found in the specified date range"}), 400
+
+        def events():
+            try:
+                chunks = []
+                for text in stream_journal_reflection(journal_entries, use_cache):
+                    chunks.append(text)
+                    yield sse_event("token", {"text": text})
+                yield sse_event("done", {"message": "Journal entry generated successfully", "generated_entry": "".join(chunks)})
+            except Exception as e:
+                logger.error(f"Error while streaming journal entry: {str(e)}", exc_info=True)
+                yield sse_event("error", {"error": str(e)})
+
+        return sse_response(events())
+    except Exception as e:
+        logger.error(f"Error in generate_journal_stream: {str(e)}")
+        return jsonify({"error": str(e)}), 500
 
-        return jsonify({"message": "Journal entry generated successfully", "generated_entry": generated_entry}), 200
+SUMMARY_JOBS = {
+    "weekly_summary": weekly_summary_result,
+    "monthly_summary": monthly_summary_result,
+}
+MAX_JOB_WAIT = 60  # Longest a poll with ?wait= is held open, in seconds
+JOB_HEARTBEAT = 15  # Seconds between keep-alive comments on the job event stream
+
+def job_accepted(job, created):
+    body = {
+        "job_id": job.id,
+        "status": job.status,
+        "deduplicated": not created,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events",
+    }
+    return jsonify(body), 202, {"Location": f"/jobs/{job.id}"}
+
+@app.route('/jobs/<kind>', methods=['POST'])
+def submit_job_request(kind):
+    try:
+        if kind == 'generate_journal':
+            data = request.json
+            journal_entries = data['journalEntries']
+            use_cache = not data.get('bypassCache', False)
+            if not journal_entries:
+                return jsonify({"error": "No journal entries found in the specified date range"}), 400
+            key = request_key(kind, journal_entries, use_cache)
+            job, created = submit_job(kind, key, summary_flight.do, key, journal_result, journal_entries, use_cache)
+        elif kind in SUMMARY_JOBS:
+            # Validation still happens here so bad payloads get their 400 right away
+            data, cleaned_data = read_summary_request()
+            key = summary_key(kind, data, cleaned_data)
+            job, created = submit_job(kind, key, summary_flight.do, key, SUMMARY_JOBS[kind], data, cleaned_data)
+        else:
+            return jsonify({"error": f"Unknown job type '{kind}'"}), 404
+
+        return job_accepted(job, created)
+    except DataValidationError as e:
+        logger.error(f"Invalid data in {kind} job: {str(e)}")
+        return jsonify({"error": str(e), "details": e.errors}), 400
     except Exception as e:
-        logger.error(f"Error in generate_journal: {str(e)}")
+        logger.error(f"Error submitting {kind} job: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    wait = min(request.args.get('wait', 0, type=float), MAX_JOB_WAIT)
+    job = wait_for_job(job_id, wait) if wait > 0 else get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    def events():
+        current = job
+        yield sse_event("status", {"job_id": job_id, "status": current["status"]})
+        while current["status"] in ("queued", "running"):
+            current = wait_for_job(job_id, JOB_HEARTBEAT)
+            if current["status"] in ("queued", "running"):
+                yield ": keep-alive\n\n"
+        if current["status"] == "done":
+            yield sse_event("done", current)
+        else:
+            yield sse_event("error", current)
+
+    return sse_response(events())
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    #^ Prometheus text format, /metrics/coalescing and /metrics/llm keep the JSON snapshots
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/metrics/coalescing', methods=['GET'])
+def coalescing_metrics():
+    return jsonify({"summaries": summary_flight.snapshot()}), 200
+
+@app.route('/metrics/llm', methods=['GET'])
+def llm_metrics():
+    return jsonify({"anthropic": claude_gateway.snapshot(), "openai": gpt_gateway.snapshot()}), 200
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5050, debug=True)
\ No newline at end of file
+    #^ development server, serve.py is the multi threaded production entry point
+    recover_interrupted_jobs()
+    app.run(host='0.0.0.0', port=settings.SERVER_PORT, debug=True)
@@ -0,0 +1,171 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+#^ counters and histograms kept in memory and rendered in the Prometheus text format on /metrics.
+#^ Every gunicorn worker keeps its own numbers, so with SERVER_WORKERS > 1 each scrape only sees
+#^ the worker that answered it
+
+# Seconds, from a cache hit up to a slow monthly summary
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=""):
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, value=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def collect(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for key, value in values:
+            lines.append(f"{self.name}{_labels(self.label_names, key)} {_number(value)}")
+        return lines
+
+class Histogram:
+    # Cumulative buckets like Prometheus expects, quantiles are left to the query side
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self):
+        with self._lock:
+            series = sorted((key, {**value, "counts": list(value["counts"])}) for key, value in self._series.items())
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for key, value in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), value["counts"]):
+                cumulative += count
+                bound = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, bound)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(round(value['sum'], 6))}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {value['count']}")
+        return lines
+
+class SnapshotMetric:
+    # Read from an existing snapshot() at scrape time, read(snapshot) returns [(labels, value)]
+    def __init__(self, name, description, kind, read):
+        self.name = name
+        self.description = description
+        self.kind = kind
+        self.read = read
+
+    def collect(self):
+        try:
+            samples = self.read()
+        except Exception:
+            # A broken source must not take the other metrics down with it
+            return []
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in samples:
+            if value is None:
+                continue
+            lines.append(f"{self.name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _add(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, description, labels=()):
+        return self._add(Counter(name, description, labels))
+
+    def histogram(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, description, labels, buckets))
+
+    def snapshot_metric(self, name, description, kind, read):
+        return self._add(SnapshotMetric(name, description, kind, read))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "Time from request received to the last byte sent, streams included",
+    ("endpoint", "method", "status"))
+STAGE_SECONDS = registry.histogram(
+    "stage_duration_seconds", "Time spent in each step of a request (clean_data, claude, pillars, gpt, ...)",
+    ("stage",))
+LLM_CALL_SECONDS = registry.histogram(
+    "llm_call_duration_seconds", "Latency of successful LLM calls, by whether part of the prompt was cached",
+    ("provider", "model", "prompt_cache"))
+LLM_FIRST_TOKEN_SECONDS = registry.histogram(
+    "llm_first_token_seconds", "Time to the first streamed token", ("provider", "model"))
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total", "Tokens by type: input, cached_input, cache_write, output", ("provider", "model", "type"))
+LLM_COST = registry.counter(
+    "llm_cost_usd_total", "Estimated spend from the token counts and the list prices", ("provider", "model"))
+PROMPT_DATA_TOKENS = registry.counter(
+    "prompt_data_tokens_total", "Estimated tokens of the rendered <data> blocks, and saved against str(data)", ("prompt", "type"))
+CACHE_REQUESTS = registry.counter(
+    "cache_requests_total", "Lookups per cache, result is hit, miss or bypass", ("cache", "result"))
+ERRORS = registry.counter(
+    "errors_total", "Failures by component (anthropic, openai, a stage, http) and type", ("component", "type"))
+
+def observe_stage(name, seconds):
+    STAGE_SECONDS.observe(seconds, stage=name)
+
+def timed_stage(name):
+    return STAGE_SECONDS.time(stage=name)
@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from logger import logger, submit_in_context
+from metrics import ERRORS
+
+# Get the directory of the current script
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+JOBS_DIR = os.path.join(os.path.dirname(current_dir), 'cache')
+JOBS_PATH = os.path.join(JOBS_DIR, 'jobs.sqlite3')
+# Every job fans out to a few LLM calls, so this is what keeps us under the API rate limits
+JOB_WORKERS = 2
+JOB_TTL = 24 * 60 * 60  # Seconds a finished job can still be fetched
+# How often a job owned by another worker process is re-read while waiting on it
+JOB_POLL_INTERVAL = 0.5
+
+job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+
+class Job:
+    def __init__(self, kind, key):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.key = key
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+_lock = threading.Lock()
+_connection = None
+# Jobs that are queued or running, finished ones are only kept in sqlite
+_jobs = {}
+_inflight = {}  # request key -> job id
+
+def _connect():
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    # Several server workers may share the file, so wait on their write locks instead of failing
+    conn = sqlite3.connect(JOBS_PATH, check_same_thread=False, timeout=30)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            status TEXT NOT NULL,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            finished_at REAL
+        )
+    """)
+    conn.commit()
+    return conn
+
+def _get_connection():
+    global _connection
+    if _connection is None:
+        _connection = _connect()
+    return _connection
+
+def recover_interrupted_jobs():
+    # Called once when the server starts: whatever was still pending belonged to a previous
+    # process and will never finish. Uses its own connection so nothing is shared across a fork
+    conn = _connect()
+    try:
+        count = conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'Interrupted by a server restart', finished_at = ? "
+            "WHERE status IN ('queued', 'running')",
+            (time.time(),)
+        ).rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    if count:
+        logger.info(f"Marked {count} interrupted job(s) as failed")
+
+def _save(job):
+    with _lock:
+        conn = _get_connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO jobs (id, kind, key, status, result, error, created_at, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job.id, job.kind, job.key, job.status,
+             json.dumps(job.result, ensure_ascii=False) if job.result is not None else None,
+             job.error, job.created_at, job.finished_at)
+        )
+        conn.execute("DELETE FROM jobs WHERE finished_at < ?", (time.time() - JOB_TTL,))
+        conn.commit()
+
+def request_key(kind, *parts):
+    payload = json.dumps([kind, *parts], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _run(job, fn, args):
+    job.status = "running"
+    _save(job)
+    try:
+        job.result = fn(*args)
+        job.status = "done"
+    except Exception as e:
+        ERRORS.inc(component="job", type=job.kind)
+        logger.error(f"Job {job.id} ({job.kind}) failed: {str(e)}", exc_info=True)
+        job.error = str(e)
+        job.status = "failed"
+    job.finished_at = time.time()
+    _save(job)
+    with _lock:
+        _jobs.pop(job.id, None)
+        if _inflight.get(job.key) == job.id:
+            del _inflight[job.key]
+    job.done.set()
+
+def submit_job(kind, key, fn, *args):
+    # Returns (job, created). An identical request that is still queued or running gets the
+    # existing job back instead of a second pipeline run
+    with _lock:
+        existing = _inflight.get(key)
+        if existing is not None:
+            return _jobs[existing], False
+        job = Job(kind, key)
+        _jobs[job.id] = job
+        _inflight[key] = job.id
+    _save(job)
+    # The job logs under the id of the request that submitted it
+    submit_in_context(job_executor, _run, job, fn, args)
+    logger.info(f"Job {job.id} ({kind}) queued")
+    return job, True
+
+def get_job(job_id):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        row = _get_connection().execute(
+            "SELECT id, kind, status, result, error, created_at, finished_at FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+    if row is None:
+        return None
+    return {
+        "job_id": row[0],
+        "kind": row[1],
+        "status": row[2],
+        "result": json.loads(row[3]) if row[3] is not None else None,
+        "error": row[4],
+        "created_at": row[5],
+        "finished_at": row[6],
+    }
+
+def wait_for_job(job_id, timeout):
+    # Blocks until the job finishes or the timeout passes, then returns its current state
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is not None:
+        job.done.wait(timeout)
+        return get_job(job_id)
+
+    # Queued by another worker process, all we can do is watch its row
+    deadline = time.monotonic() + timeout
+    current = get_job(job_id)
+    while current is not None and current["status"] in ("queued", "running") and time.monotonic() < deadline:
+        time.sleep(min(JOB_POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+        current = get_job(job_id)
+    return current
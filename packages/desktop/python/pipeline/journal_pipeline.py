@@ -0,0 +1,88 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime
+
+from ai_helpers.claude import (
+    create_message, stream_message, generate_journal_entry, stream_journal_entry,
+    journal_chunk_request, journal_reduce_request, format_journal_entries
+)
+from ai_helpers.prompt_rendering import estimate_tokens
+from logger import logger, submit_in_context
+from metrics import timed_stage, ERRORS
+from pipeline.summary_pipeline import StageTimeoutError
+
+# Above this many (estimated) prompt tokens the journal is summarised week by week first
+HIERARCHICAL_THRESHOLD_TOKENS = 20000
+# Weeks bigger than this are split further so every chunk fits comfortably in one call
+CHUNK_TOKEN_BUDGET = 8000
+CHUNK_TIMEOUT = 120
+CHUNK_WORKERS = 4
+
+# Kept separate from the summary stage pool so a journal job never waits on its own pool
+chunk_executor = ThreadPoolExecutor(max_workers=CHUNK_WORKERS, thread_name_prefix="journal-chunk")
+
+def should_use_hierarchical(journal_entries):
+    return estimate_tokens(format_journal_entries(journal_entries)) > HIERARCHICAL_THRESHOLD_TOKENS
+
+def chunk_entries(journal_entries):
+    weeks = OrderedDict()
+    for entry in sorted(journal_entries, key=lambda entry: entry['date']):
+        year, week, _ = datetime.strptime(entry['date'][:10], '%Y-%m-%d').isocalendar()
+        weeks.setdefault(f"{year}-W{week}", []).append(entry)
+
+    chunks = []
+    for week, entries in weeks.items():
+        current = []
+        current_tokens = 0
+        for entry in entries:
+            entry_tokens = estimate_tokens(format_journal_entries([entry]))
+            if current and current_tokens + entry_tokens > CHUNK_TOKEN_BUDGET:
+                chunks.append({"period": week, "entries": current})
+                current = []
+                current_tokens = 0
+            current.append(entry)
+            current_tokens += entry_tokens
+        chunks.append({"period": week, "entries": current})
+
+    return chunks
+
+def summarise_chunk(chunk, use_cache=True):
+    # Each chunk prompt only depends on its own entries, so the response cache
+    # turns already summarised weeks into cache hits when the range grows
+    with timed_stage("journal_chunk"):
+        return create_message(**journal_chunk_request(chunk["period"], chunk["entries"]), use_cache=use_cache)
+
+def summarise_chunks(journal_entries, use_cache=True):
+    chunks = chunk_entries(journal_entries)
+    logger.info(f'Summarising {len(journal_entries)} journal entries in {len(chunks)} chunks')
+
+    futures = [submit_in_context(chunk_executor, summarise_chunk, chunk, use_cache) for chunk in chunks]
+    try:
+        return [
+            {"period": chunk["period"], "summary": future.result(timeout=CHUNK_TIMEOUT)}
+            for chunk, future in zip(chunks, futures)
+        ]
+    except FutureTimeoutError:
+        for future in futures:
+            future.cancel()
+        ERRORS.inc(component="journal_chunk", type="timeout")
+        raise StageTimeoutError(f"A journal chunk summary timed out after {CHUNK_TIMEOUT}s")
+
+def generate_hierarchical_journal_entry(journal_entries, use_cache=True):
+    # Failures are raised, the endpoint turns them into the same statuses as the summaries
+    chunk_summaries = summarise_chunks(journal_entries, use_cache)
+    return create_message(**journal_reduce_request(chunk_summaries), use_cache=use_cache)
+
+def stream_hierarchical_journal_entry(journal_entries, use_cache=True):
+    chunk_summaries = summarise_chunks(journal_entries, use_cache)
+    yield from stream_message(**journal_reduce_request(chunk_summaries), use_cache=use_cache)
+
+def generate_journal_reflection(journal_entries, use_cache=True):
+    if should_use_hierarchical(journal_entries):
+        return generate_hierarchical_journal_entry(journal_entries, use_cache)
+    return generate_journal_entry(journal_entries, use_cache)
+
+def stream_journal_reflection(journal_entries, use_cache=True):
+    if should_use_hierarchical(journal_entries):
+        return stream_hierarchical_journal_entry(journal_entries, use_cache)
+    return stream_journal_entry(journal_entries, use_cache)
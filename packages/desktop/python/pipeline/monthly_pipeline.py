@@ -0,0 +1,101 @@
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime
+
+from ai_helpers.claude import generate_mood_recap
+from data_processing.day_store import DayStore
+from logger import logger, submit_in_context
+from metrics import timed_stage, ERRORS
+from pipeline.summary_pipeline import StageTimeoutError
+
+WEEK_SUMMARY_WORKERS = 4
+WEEK_SUMMARY_TIMEOUT = 120
+TOP_TAGS = 3
+
+week_executor = ThreadPoolExecutor(max_workers=WEEK_SUMMARY_WORKERS, thread_name_prefix="week-summary")
+
+def normalise_week(week_str):
+    #^ the clients store weeks zero padded (2024-W05), the server writes them unpadded (2024-W5)
+    match = re.match(r'^(\d{4})-W(\d{1,2})$', str(week_str))
+    if not match:
+        return None
+    return f"{match.group(1)}-W{int(match.group(2))}"
+
+def _average(values):
+    numbers = []
+    for value in values:
+        try:
+            numbers.append(float(value))
+        except (TypeError, ValueError):
+            continue
+    if not numbers:
+        return None
+    return round(sum(numbers) / len(numbers), 2)
+
+def group_by_week(note_data, mood_data):
+    store = DayStore.from_cleaned_data({"dailyNoteData": note_data, "moodData": mood_data})
+    weeks = {}
+    for week, days in store.weeks().items():
+        weeks[week] = {
+            "note_data": [day.note_row() for day in days if day.note is not None],
+            "mood_data": [mood for day in days for mood in day.mood_rows()],
+        }
+    return weeks
+
+def week_stats(week_data):
+    notes = week_data["note_data"]
+    moods = week_data["mood_data"]
+    tags = Counter(mood["tag"] for mood in moods if mood.get("tag"))
+
+    return {
+        "days_logged": len(notes),
+        "avg_energy": _average(note["energy"] for note in notes),
+        "avg_day_rating": _average(note["dayRating"] for note in notes),
+        "mood_entries": len(moods),
+        "avg_mood": _average(mood["rating"] for mood in moods),
+        "top_mood_tags": [tag for tag, _ in tags.most_common(TOP_TAGS)],
+    }
+
+def existing_week_summaries(weekly_AI_summaries):
+    summaries = {}
+    for record in weekly_AI_summaries or []:
+        week = normalise_week(record.get("date"))
+        text = record.get("summary") or record.get("claude_summary")
+        if week and text:
+            summaries[week] = text
+    return summaries
+
+def generate_week_summary(week_data, use_cache=True):
+    with timed_stage("week_summary"):
+        return generate_mood_recap(week_data, use_cache)
+
+def build_incremental_monthly_data(note_data, mood_data, weekly_AI_summaries, use_cache=True):
+    weeks = group_by_week(note_data, mood_data)
+    summaries = existing_week_summaries(weekly_AI_summaries)
+
+    # Weeks the client has no summary for are summarised now, the response cache keeps them for next time
+    missing = [week for week in weeks if week not in summaries]
+    if missing:
+        logger.info(f'Summarising weeks on demand: {missing}')
+    futures = {week: submit_in_context(week_executor, generate_week_summary, weeks[week], use_cache) for week in missing}
+    try:
+        for week, future in futures.items():
+            summaries[week] = future.result(timeout=WEEK_SUMMARY_TIMEOUT)
+    except FutureTimeoutError:
+        for future in futures.values():
+            future.cancel()
+        ERRORS.inc(component="week_summary", type="timeout")
+        raise StageTimeoutError(f"A week summary timed out after {WEEK_SUMMARY_TIMEOUT}s")
+
+    all_weeks = sorted(set(weeks) | set(summaries), key=lambda week: datetime.strptime(week + '-1', '%G-W%V-%u'))
+    return {
+        "weeks": [
+            {
+                "week": week,
+                "stats": week_stats(weeks[week]) if week in weeks else None,
+                "summary": summaries[week]
+            }
+            for week in all_weeks
+        ]
+    }
@@ -0,0 +1,118 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import settings
+from database.database_functions import fetch_pillars, pillars_or_empty
+from ai_helpers.gpt import create_thoughts
+from ai_helpers.llm_gateway import LLMUnavailableError
+from ai_helpers.thoughts import ThoughtsValidationError
+from logger import logger, submit_in_context
+from metrics import observe_stage, ERRORS
+
+# Shared by every request in the process, so this caps how many LLM calls run at once
+MAX_WORKERS = settings.PIPELINE_WORKERS
+
+# Per-stage timeouts in seconds
+STAGE_TIMEOUTS = {
+    "claude": 120,
+    "pillars": 10,
+    "gpt": 90,
+}
+
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="summary-stage")
+
+class StageTimeoutError(Exception):
+    pass
+
+def _timed(name, fn, timings, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        timings[name] = round(elapsed, 3)
+        observe_stage(name, elapsed)
+
+def submit_stage(name, fn, timings, *args, **kwargs):
+    return submit_in_context(executor, _timed, name, fn, timings, *args, **kwargs)
+
+def wait_stage(name, future):
+    timeout = STAGE_TIMEOUTS.get(name)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        #^ the worker thread keeps running, we just stop waiting for it
+        future.cancel()
+        ERRORS.inc(component=name, type="timeout")
+        raise StageTimeoutError(f"Stage '{name}' timed out after {timeout}s")
+
+def _run_gpt_stage(mood_summary, note_data, pillars_future, timings, use_cache):
+    data_to_give_gpt = {
+        "successes": [note["success"] for note in note_data],
+        "beBetters": [note["beBetter"] for note in note_data],
+        "claude_summary": mood_summary
+    }
+
+    # GPT starts as soon as the Claude summary is in (pillars are usually long done)
+    pillars = wait_stage("pillars", pillars_future)
+    if not isinstance(pillars, list):
+        logger.warning(f'No pillars available, generating goals without them: {pillars}')
+        pillars = pillars_or_empty(pillars)
+    gpt_future = submit_stage("gpt", create_thoughts, timings, data_to_give_gpt, pillars, use_cache=use_cache)
+    # The Claude summary is already paid for, whatever goes wrong with GPT it is sent without the
+    # GPT part (clients skip a null gpt_summary). Only a timeout still fails the request
+    try:
+        return wait_stage("gpt", gpt_future)
+    except StageTimeoutError:
+        raise
+    except LLMUnavailableError as e:
+        logger.error(f'GPT unavailable, returning the summary without thoughts: {str(e)}')
+        return None
+    except ThoughtsValidationError as e:
+        ERRORS.inc(component="gpt", type="invalid_thoughts")
+        logger.error(f'GPT never returned usable JSON, returning the summary without thoughts: {str(e)}')
+        return None
+    except Exception as e:
+        ERRORS.inc(component="gpt", type=type(e).__name__)
+        logger.error(f'GPT failed, returning the summary without thoughts: {str(e)}', exc_info=True)
+        return None
+
+def run_summary_pipeline(recap_fn, data_to_send, note_data, use_cache=True):
+    timings = {}
+    start = time.perf_counter()
+
+    # Pillars don't depend on the Claude output, fetch them while Claude is working
+    claude_future = submit_stage("claude", recap_fn, timings, data_to_send, use_cache=use_cache)
+    pillars_future = submit_stage("pillars", fetch_pillars, timings)
+
+    mood_summary = wait_stage("claude", claude_future)
+    gpt_response = _run_gpt_stage(mood_summary, note_data, pillars_future, timings, use_cache)
+
+    timings["total"] = round(time.perf_counter() - start, 3)
+    logger.info(f'Stage timings: {timings}')
+
+    return mood_summary, gpt_response, timings
+
+def stream_summary_pipeline(stream_fn, data_to_send, note_data, use_cache=True):
+    timings = {}
+    start = time.perf_counter()
+
+    pillars_future = submit_stage("pillars", fetch_pillars, timings)
+
+    chunks = []
+    for text in stream_fn(data_to_send, use_cache=use_cache):
+        if not chunks:
+            timings["claude_first_token"] = round(time.perf_counter() - start, 3)
+            observe_stage("claude_first_token", time.perf_counter() - start)
+        chunks.append(text)
+        yield "token", text
+    timings["claude"] = round(time.perf_counter() - start, 3)
+    observe_stage("claude", time.perf_counter() - start)
+
+    mood_summary = "".join(chunks)
+    gpt_response = _run_gpt_stage(mood_summary, note_data, pillars_future, timings, use_cache)
+
+    timings["total"] = round(time.perf_counter() - start, 3)
+    logger.info(f'Stage timings: {timings}')
+
+    yield "done", (mood_summary, gpt_response, timings)
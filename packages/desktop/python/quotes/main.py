@@ -1,59 +1,126 @@
-import json
 import time
+import hashlib
 import requests
-from flask import Flask, jsonify
+from datetime import date, datetime, timedelta
+from flask import Flask, jsonify, request
 from threading import Thread
 
+from quote_store import QuoteStore
+from selection import QuoteSelector, MODES
+
 #^ this was used to steal all them quotes from quotable.io
 
 app = Flask(__name__)
 
-QUOTES_FILE = 'quotes.json'
 API_URL = 'https://api.quotable.io/quotes/random'  # Updated URL
 FETCH_INTERVAL = 1  # Fetch every second
 LIMIT = 1000  # Number of quotes to fetch per request
+MAX_LIST_LIMIT = 500  # Most quotes /quotes returns in one go
+MAX_BATCH = 366  # A year of quotes of the day, for offline prefetch
+DEFAULT_MODE = "daily"
+SEEDED_MAX_AGE = 24 * 60 * 60  # A client and seed always get the same quotes, clients may keep them a day
 
-def load_quotes():
-    try:
-        with open(QUOTES_FILE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return []
-
-def save_quotes(quotes):
-    with open(QUOTES_FILE, 'w') as f:
-        json.dump(quotes, f, indent=2)
+# Loaded once, every request is served from memory
+store = QuoteStore()
+selector = QuoteSelector(store)
 
 def fetch_and_save_quote():
-    quotes = load_quotes()
     while True:
         try:
             response = requests.get(f"{API_URL}?limit={LIMIT}")
             if response.status_code == 200:
-                new_quotes = response.json()
-                added_count = 0
-                for new_quote in new_quotes:
-                    if not any(q['_id'] == new_quote['_id'] for q in quotes):
-                        quotes.append(new_quote)
-                        added_count += 1
+                added_count = store.add_many(response.json())
                 if added_count > 0:
-                    save_quotes(quotes)
                     print(f"Added {added_count} new quotes")
-                print(f"Total quotes stored: {len(quotes)}")
+                print(f"Total quotes stored: {len(store)}")
             else:
                 print(f"Error fetching quotes: HTTP {response.status_code}")
         except Exception as e:
             print(f"Error fetching quotes: {e}")
         time.sleep(FETCH_INTERVAL)
 
+def seconds_until_midnight():
+    now = datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return max(int((midnight - now).total_seconds()), 1)
+
+def conditional_response(payload, cache_control):
+    # The ETag is the hash of the body, so an unchanged selection answers a conditional request with a 304
+    response = jsonify(payload)
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    response.headers['Cache-Control'] = cache_control
+    return response.make_conditional(request)
+
+def select(count):
+    # (quotes, Cache-Control) for the mode in the query string, daily quotes come with their dates.
+    # Raises ValueError for bad arguments
+    mode = request.args.get('mode', DEFAULT_MODE)
+    author = request.args.get('author')
+    tag = request.args.get('tag')
+    client = request.args.get('client')
+
+    if mode == 'daily':
+        day = date.fromisoformat(request.args['date']) if request.args.get('date') else None
+        picks = selector.daily(day, count, author, tag)
+        # Today's pick is good until midnight, other days never change once they are shown
+        max_age = seconds_until_midnight() if day in (None, date.today()) else SEEDED_MAX_AGE
+        return [{"date": day, "quote": quote} for day, quote in picks], f"public, max-age={max_age}"
+    if mode == 'random':
+        if not client:
+            return selector.any(count, author, tag), "no-store"
+        seed = request.args.get('seed', 0, type=int)
+        start = request.args.get('start', 0, type=int)
+        return selector.seeded(client, seed, start, count, author, tag), f"private, max-age={SEEDED_MAX_AGE}"
+    if mode == 'shuffle':
+        if not client:
+            raise ValueError("shuffle needs a client id")
+        # Every call moves the bag on, nothing to cache
+        return selector.shuffle(client, count, author, tag), "no-store"
+    raise ValueError(f"mode must be one of: {', '.join(MODES)}")
+
 @app.route('/quote')
 def get_random_quote():
-    quotes = load_quotes()
+    #^ ?mode=daily (default), random with &client=<id>[&seed=<n>], or shuffle with &client=<id>
+    try:
+        quotes, cache_control = select(1)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     if quotes:
-        return jsonify(quotes[int(time.time()) % len(quotes)])
+        quote = quotes[0]["quote"] if "date" in quotes[0] else quotes[0]
+        return conditional_response(quote, cache_control)
     else:
         return jsonify({"error": "No quotes available"}), 404
 
+@app.route('/quotes/batch')
+def get_quote_batch():
+    # n quotes in one call so the mobile app can prefetch, for daily these are the next n days
+    count = request.args.get('n', 30, type=int)
+    if not 1 <= count <= MAX_BATCH:
+        return jsonify({"error": f"n must be between 1 and {MAX_BATCH}"}), 400
+    try:
+        quotes, cache_control = select(count)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return conditional_response({"mode": request.args.get('mode', DEFAULT_MODE), "quotes": quotes}, cache_control)
+
+@app.route('/quote/<quote_id>')
+def get_quote(quote_id):
+    quote = store.get(quote_id)
+    if quote is None:
+        return jsonify({"error": "Quote not found"}), 404
+    return conditional_response(quote, f"public, max-age={SEEDED_MAX_AGE}")
+
+@app.route('/quotes')
+def list_quotes():
+    limit = min(request.args.get('limit', 50, type=int), MAX_LIST_LIMIT)
+    matches = store.filter(request.args.get('author'), request.args.get('tag'))
+    return jsonify({"count": len(matches), "quotes": matches[:limit]})
+
+@app.route('/tags')
+def list_tags():
+    return jsonify(store.tags())
+
 if __name__ == '__main__':
+    store.watch()
     Thread(target=fetch_and_save_quote, daemon=True).start()
-    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import threading
+
+# Get the directory of the current script
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+#^ quotes.json is also bundled by the apps (shared/src/components/DailyNote/components/Quote.tsx),
+#^ so it stays a plain JSON array. New quotes are appended to quotes.jsonl and folded into the
+#^ array by compaction
+QUOTES_FILE = os.path.join(current_dir, 'quotes.json')
+LOG_FILE = os.path.join(current_dir, 'quotes.jsonl')
+# Log lines that trigger a compaction
+COMPACT_AFTER = 5000
+RELOAD_INTERVAL = 2  # Seconds between checks for files changed by someone else
+
+def author_key(value):
+    # Matches both "Oscar Wilde" and the authorSlug "oscar-wilde"
+    return "-".join(str(value).lower().replace("-", " ").split())
+
+def tag_key(value):
+    return str(value).strip().lower()
+
+def _file_state(path):
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except FileNotFoundError:
+        return None
+
+class QuoteStore:
+    # Every quote in memory with an _id hash index and inverted indexes on author and tag, the
+    # posting lists hold positions in self.quotes
+    def __init__(self, quotes_file=QUOTES_FILE, log_file=LOG_FILE, compact_after=COMPACT_AFTER):
+        self.quotes_file = quotes_file
+        self.log_file = log_file
+        self.compact_after = compact_after
+        self._lock = threading.RLock()
+        # Bumped on every change, handy for anything derived from the quotes
+        self.version = 0
+        self._reset()
+        self.load()
+
+    def _reset(self):
+        self.quotes = []
+        self.by_id = {}
+        self.by_author = {}
+        self.by_tag = {}
+        self.log_lines = 0
+        self._seen_state = (None, None)
+
+    def _index(self, quote):
+        position = self.by_id.get(quote['_id'])
+        if position is not None:
+            # A later copy of the same quote replaces the earlier one, the postings stay valid
+            self.quotes[position] = quote
+            return False
+        position = len(self.quotes)
+        self.quotes.append(quote)
+        self.by_id[quote['_id']] = position
+        for key in {author_key(quote.get('author', '')), author_key(quote.get('authorSlug', ''))} - {""}:
+            self.by_author.setdefault(key, []).append(position)
+        for tag in {tag_key(tag) for tag in quote.get('tags') or []}:
+            self.by_tag.setdefault(tag, []).append(position)
+        return True
+
+    def _read_log(self):
+        quotes = []
+        try:
+            with open(self.log_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        quotes.append(json.loads(line))
+                    except ValueError:
+                        # A write cut short by a crash, everything before it is fine
+                        print(f"Skipping a broken line in {self.log_file}")
+        except FileNotFoundError:
+            pass
+        return quotes
+
+    def load(self):
+        # Under the lock so nothing appended meanwhile gets lost, reading the files takes milliseconds
+        with self._lock:
+            try:
+                with open(self.quotes_file, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except FileNotFoundError:
+                snapshot = []
+            logged = self._read_log()
+
+            self._reset()
+            for quote in snapshot:
+                self._index(quote)
+            for quote in logged:
+                self._index(quote)
+            self.log_lines = len(logged)
+            self.version += 1
+            self._seen_state = (_file_state(self.quotes_file), _file_state(self.log_file))
+        return len(self.quotes)
+
+    def reload_if_changed(self):
+        # Picks up edits to quotes.json or the log made outside this process
+        with self._lock:
+            seen = self._seen_state
+        current = (_file_state(self.quotes_file), _file_state(self.log_file))
+        if current == seen:
+            return False
+        count = self.load()
+        print(f"Quotes changed on disk, reloaded {count} quotes")
+        return True
+
+    def watch(self, interval=RELOAD_INTERVAL):
+        def run():
+            while True:
+                try:
+                    self.reload_if_changed()
+                except Exception as e:
+                    print(f"Error reloading quotes: {e}")
+                time.sleep(interval)
+
+        thread = threading.Thread(target=run, name="quotes-reload", daemon=True)
+        thread.start()
+        return thread
+
+    def add_many(self, new_quotes):
+        with self._lock:
+            added = []
+            for quote in new_quotes:
+                if quote.get('_id') and quote['_id'] not in self.by_id and self._index(quote):
+                    added.append(quote)
+            if not added:
+                return 0
+
+            # Appending is the only write on the hot path, the snapshot is rewritten by compaction
+            lines = "".join(json.dumps(quote, ensure_ascii=False) + "\n" for quote in added)
+            with open(self.log_file, 'ab+') as f:
+                # Never glue new quotes onto a line a crash cut short
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        lines = "\n" + lines
+                f.write(lines.encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+            self.log_lines += len(added)
+            self.version += 1
+            self._seen_state = (self._seen_state[0], _file_state(self.log_file))
+
+            if self.log_lines >= self.compact_after:
+                self.compact()
+            return len(added)
+
+    def compact(self):
+        # The new snapshot is written next to the old one and swapped in, so a crash leaves either
+        # the old snapshot plus the full log or the new one. Replaying the log again is harmless,
+        # quotes already in the snapshot are skipped by _id
+        with self._lock:
+            temp_path = f"{self.quotes_file}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.quotes, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.quotes_file)
+            open(self.log_file, 'w').close()
+            self.log_lines = 0
+            self._seen_state = (_file_state(self.quotes_file), _file_state(self.log_file))
+            print(f"Compacted {len(self.quotes)} quotes into {self.quotes_file}")
+
+    def get(self, quote_id):
+        with self._lock:
+            position = self.by_id.get(quote_id)
+            return self.quotes[position] if position is not None else None
+
+    def at(self, positions):
+        # Quotes at the given positions, any that a reload made stale are left out
+        with self._lock:
+            return [self.quotes[position] for position in positions if position < len(self.quotes)]
+
+    def positions(self, author=None, tag=None):
+        # Positions of the quotes matching every given filter, all of them without filters
+        with self._lock:
+            postings = []
+            if author:
+                postings.append(self.by_author.get(author_key(author), []))
+            if tag:
+                postings.append(self.by_tag.get(tag_key(tag), []))
+            if not postings:
+                return range(len(self.quotes))
+            postings.sort(key=len)
+            if len(postings) == 1:
+                return postings[0]
+            others = [set(posting) for posting in postings[1:]]
+            return [position for position in postings[0] if all(position in other for other in others)]
+
+    def filter(self, author=None, tag=None, limit=None):
+        with self._lock:
+            matches = self.positions(author, tag)
+            if limit is not None:
+                matches = matches[:limit]
+            return [self.quotes[position] for position in matches]
+
+    def tags(self):
+        with self._lock:
+            return {tag: len(positions) for tag, positions in sorted(self.by_tag.items())}
+
+    def __len__(self):
+        return len(self.quotes)
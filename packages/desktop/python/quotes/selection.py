@@ -0,0 +1,117 @@
+import random
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import date as date_cls
+
+from quote_store import author_key, tag_key
+
+#^ every mode walks a shuffled order of the matching quotes, so nothing repeats before the whole
+#^ list has been shown. The orders are computed once per filter and seed and dropped when the
+#^ store changes
+MODES = ["daily", "random", "shuffle"]
+DAILY_SEED = "quote-of-the-day"
+MAX_ORDERS = 256  # Cached orders, one per filter and seed
+MAX_BAGS = 10000  # Clients with a shuffle bag, least recently used go first
+
+def _filters(author, tag):
+    return (author_key(author) if author else None, tag_key(tag) if tag else None)
+
+def _seed(*parts):
+    return int.from_bytes(hashlib.sha256("|".join(str(part) for part in parts).encode('utf-8')).digest()[:8], 'big')
+
+class QuoteSelector:
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._orders = OrderedDict()
+        self._bags = OrderedDict()
+        # Once a day has its quote it keeps it, even if new quotes change the order later on
+        self._daily = {}
+        self._version = None
+
+    def _check_version(self):
+        # Called with the lock held
+        if self._version != self.store.version:
+            self._orders.clear()
+            self._version = self.store.version
+
+    def _order(self, author, tag, seed):
+        with self._lock:
+            self._check_version()
+            key = (author, tag, seed)
+            order = self._orders.get(key)
+            if order is None:
+                order = list(self.store.positions(author, tag))
+                random.Random(_seed(seed, author, tag)).shuffle(order)
+                self._orders[key] = order
+                if len(self._orders) > MAX_ORDERS:
+                    self._orders.popitem(last=False)
+            else:
+                self._orders.move_to_end(key)
+            return order
+
+    def daily(self, day=None, count=1, author=None, tag=None):
+        # [(date, quote)] for count days from day on, the same for every client
+        day = day or date_cls.today()
+        author, tag = _filters(author, tag)
+        order = self._order(author, tag, DAILY_SEED)
+        if not order:
+            return []
+        picks = []
+        for offset in range(count):
+            current = date_cls.fromordinal(day.toordinal() + offset)
+            key = (current, author, tag)
+            quote_id = self._daily.get(key)
+            quote = self.store.get(quote_id) if quote_id else None
+            if quote is None:
+                quote = self.store.at([order[current.toordinal() % len(order)]])[0]
+                # Only days that were actually served are pinned, a batch looking ahead is not
+                if offset == 0 and current <= date_cls.today():
+                    self._daily[key] = quote['_id']
+            picks.append((current.isoformat(), quote))
+        return picks
+
+    def seeded(self, client, seed=0, start=0, count=1, author=None, tag=None):
+        # The same client and seed always get the same quotes, a new seed moves on
+        author, tag = _filters(author, tag)
+        order = self._order(author, tag, f"client:{client}:{seed}")
+        if not order:
+            return []
+        return self.store.at([order[(start + offset) % len(order)] for offset in range(count)])
+
+    def shuffle(self, client, count=1, author=None, tag=None):
+        # A bag per client, drawn without replacement and refilled with a new order when empty
+        author, tag = _filters(author, tag)
+        key = (client, author, tag)
+        picks = []
+        with self._lock:
+            bag = self._bags.get(key)
+            if bag is not None and bag["version"] != self.store.version:
+                # New quotes join the rest of the bag, what was drawn this round stays drawn
+                drawn = bag["order"][:bag["next"]]
+                seen = set(drawn)
+                remaining = [position for position in self.store.positions(author, tag) if position not in seen]
+                random.Random(_seed("bag", client, author, tag, bag["rounds"], self.store.version)).shuffle(remaining)
+                bag = {**bag, "order": drawn + remaining, "version": self.store.version}
+            for _ in range(count):
+                if bag is None or bag["next"] >= len(bag["order"]):
+                    rounds = bag["rounds"] + 1 if bag else 0
+                    order = list(self.store.positions(author, tag))
+                    if not order:
+                        return []
+                    random.Random(_seed("bag", client, author, tag, rounds)).shuffle(order)
+                    bag = {"order": order, "next": 0, "rounds": rounds, "version": self.store.version}
+                picks.append(bag["order"][bag["next"]])
+                bag["next"] += 1
+            self._bags[key] = bag
+            self._bags.move_to_end(key)
+            if len(self._bags) > MAX_BAGS:
+                self._bags.popitem(last=False)
+        return self.store.at(picks)
+
+    def any(self, count=1, author=None, tag=None):
+        positions = self.store.positions(*_filters(author, tag))
+        if not positions:
+            return []
+        return self.store.at([random.choice(positions) for _ in range(count)])
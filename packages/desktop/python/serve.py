@@ -0,0 +1,111 @@
+import os
+import signal
+import sys
+
+import settings
+from main_server import app, MAX_REQUEST_BYTES
+from pipeline.job_queue import recover_interrupted_jobs
+from ai_helpers.clients import warm_up
+from logger import logger
+
+#^ production entry point: python serve.py, the debug server is still python main_server.py
+HOST = settings.SERVER_HOST
+PORT = settings.SERVER_PORT
+# Every worker process has its own caches, job pool and request coalescing. The requests spend
+# nearly all their time waiting on the LLM APIs, so threads are usually the better knob
+WORKERS = settings.SERVER_WORKERS
+THREADS = settings.SERVER_THREADS
+KEEPALIVE = settings.SERVER_KEEPALIVE  # Seconds an idle connection stays open
+# A monthly summary can take a couple of minutes end to end
+REQUEST_TIMEOUT = settings.SERVER_TIMEOUT
+GRACEFUL_TIMEOUT = settings.SERVER_GRACEFUL_TIMEOUT  # In-flight requests get this long on shutdown
+SERVER_BACKEND = settings.SERVER_BACKEND
+
+def start_warm_up():
+    # With many workers on few cores the SDK imports all land at once, SERVER_WARM_UP=0 leaves
+    # them to each worker's first LLM call instead
+    if settings.SERVER_WARM_UP:
+        warm_up()
+
+def run_gunicorn():
+    from gunicorn.app.base import BaseApplication
+
+    class StandaloneApplication(BaseApplication):
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    options = {
+        "bind": f"{HOST}:{PORT}",
+        "workers": WORKERS,
+        "threads": THREADS,
+        "worker_class": "gthread",
+        "keepalive": KEEPALIVE,
+        "timeout": REQUEST_TIMEOUT,
+        # SIGTERM stops accepting connections and lets running requests finish for this long
+        "graceful_timeout": GRACEFUL_TIMEOUT,
+        "limit_request_line": 8190,
+        "limit_request_fields": 100,
+        # Runs in every worker after the fork
+        "post_worker_init": lambda worker: start_warm_up(),
+    }
+    logger.info(f"Serving on {HOST}:{PORT} with gunicorn ({WORKERS} worker(s) x {THREADS} threads)")
+    StandaloneApplication(app, options).run()
+
+def run_waitress():
+    from waitress import create_server
+
+    # waitress is a single process, so every worker's threads go into one pool
+    server = create_server(
+        app,
+        host=HOST,
+        port=PORT,
+        threads=WORKERS * THREADS,
+        channel_timeout=KEEPALIVE,
+        max_request_body_size=MAX_REQUEST_BYTES,
+    )
+    start_warm_up()
+    # waitress closes down cleanly on SystemExit, which SIGTERM does not raise by itself
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    logger.info(f"Serving on {HOST}:{PORT} with waitress ({WORKERS * THREADS} threads)")
+    server.run()
+
+def run_flask():
+    logger.warning("Neither gunicorn nor waitress is installed, falling back to the threaded Flask server")
+    start_warm_up()
+    app.run(host=HOST, port=PORT, debug=False, threaded=True)
+
+def main():
+    recover_interrupted_jobs()
+
+    backend = SERVER_BACKEND
+    if backend == "auto":
+        # gunicorn does not run on Windows, waitress does
+        try:
+            import gunicorn  # noqa: F401
+            backend = "gunicorn" if os.name != "nt" else "waitress"
+        except ImportError:
+            backend = "waitress"
+        if backend == "waitress":
+            try:
+                import waitress  # noqa: F401
+            except ImportError:
+                backend = "flask"
+
+    if backend == "gunicorn":
+        run_gunicorn()
+    elif backend == "waitress":
+        run_waitress()
+    else:
+        run_flask()
+
+if __name__ == '__main__':
+    main()
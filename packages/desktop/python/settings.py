@@ -0,0 +1,54 @@
+import os
+from dotenv import load_dotenv
+
+#^ every environment setting of the python side lives here, read once at import. The .env next to
+#^ this file is loaded first, whatever folder the server is started from. Variables already set in
+#^ the environment win over the file
+PYTHON_DIR = os.path.dirname(os.path.abspath(__file__))
+ENV_PATH = os.path.join(PYTHON_DIR, '.env')
+load_dotenv(ENV_PATH)
+
+def _int(name, default):
+    return int(os.getenv(name, default))
+
+# LLM providers, the SDKs also pick up ANTHROPIC_BASE_URL and OPENAI_BASE_URL by themselves
+ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# openai, or local for the deterministic offline embeddings
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "openai")
+
+DB_SERVICE_URL = os.getenv("DB_SERVICE_URL", "http://localhost:3001")
+
+# Shared by every request in the process, so this caps how many LLM calls run at once
+PIPELINE_WORKERS = _int("PIPELINE_WORKERS", 8)
+# Anything bigger is refused with a 413 before it is read
+MAX_REQUEST_BYTES = _int("MAX_REQUEST_BYTES", 64 * 1024 * 1024)
+
+# Server, see serve.py
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = _int("SERVER_PORT", 5050)
+SERVER_WORKERS = _int("SERVER_WORKERS", 1)
+SERVER_THREADS = _int("SERVER_THREADS", 16)
+SERVER_KEEPALIVE = _int("SERVER_KEEPALIVE", 5)
+SERVER_TIMEOUT = _int("SERVER_TIMEOUT", 300)
+SERVER_GRACEFUL_TIMEOUT = _int("SERVER_GRACEFUL_TIMEOUT", 30)
+SERVER_BACKEND = os.getenv("SERVER_BACKEND", "auto")  # auto, gunicorn, waitress or flask
+# Build the LLM clients in the background as soon as a worker is up, instead of on the first call
+SERVER_WARM_UP = os.getenv("SERVER_WARM_UP", "1") == "1"
+
+# Logging, json for one structured line per record, text for the plain console format
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Rotating JSON log file, an empty LOG_FILE turns it off. With several server workers every
+# process rotates on its own, so give each one its own file there
+LOG_FILE = os.getenv("LOG_FILE", os.path.join(PYTHON_DIR, 'logs', 'ai-helpers.log'))
+LOG_FILE_MAX_BYTES = _int("LOG_FILE_MAX_BYTES", 10 * 1024 * 1024)
+LOG_FILE_BACKUPS = _int("LOG_FILE_BACKUPS", 5)
+# Records waiting for the writer thread, anything past this is dropped instead of blocking a request
+LOG_QUEUE_SIZE = _int("LOG_QUEUE_SIZE", 10000)
+# Longer messages and field values are cut, full journal entries and prompts do not belong in a log
+LOG_MAX_FIELD_CHARS = _int("LOG_MAX_FIELD_CHARS", 2000)
+# Share of the INFO and DEBUG records kept per logger, e.g. "ai-helpers.prompts=0.1,ai-helpers.access=0.5".
+# Warnings and errors are always kept
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "ai-helpers.prompts=0.1")
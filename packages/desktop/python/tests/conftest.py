@@ -0,0 +1,33 @@
+import os
+import sys
+import time
+
+import pytest
+
+#^ run from the python folder: python -m pytest tests
+#^ nothing here talks to the real APIs or the DB service, the stub backends stand in for them
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PYTHON_DIR)
+
+# Read by settings at import, so they have to be in place before any module of the server is imported
+os.environ["LOG_FILE"] = ""
+os.environ["LOG_FORMAT"] = "text"
+
+from benchmarks.stub_backends import StubBackends
+
+@pytest.fixture
+def stubs():
+    backends = StubBackends(claude_latency=0, gpt_latency=0, db_latency=0).start()
+    yield backends
+    backends.stop()
+
+@pytest.fixture
+def wait_until():
+    # Polls condition until it is true or the timeout passes, returns its last value
+    def wait(condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return condition()
+    return wait
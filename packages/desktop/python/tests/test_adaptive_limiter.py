@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from ai_helpers import llm_gateway
+from ai_helpers.llm_gateway import AdaptiveLimiter, parse_reset
+
+def test_acquire_waits_for_a_free_slot():
+    limiter = AdaptiveLimiter("test", initial=2)
+    assert limiter.acquire(timeout=0.05)
+    assert limiter.acquire(timeout=0.05)
+    assert not limiter.acquire(timeout=0.05)
+
+    limiter.release("ok")
+    assert limiter.acquire(timeout=0.05)
+    assert limiter.in_flight == 2
+
+def test_success_grows_the_limit_by_about_one_per_round():
+    limiter = AdaptiveLimiter("test", initial=4, maximum=16)
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release("ok")
+    assert 4.9 < limiter.limit < 5
+
+def test_limit_stays_between_minimum_and_maximum():
+    limiter = AdaptiveLimiter("test", initial=2, minimum=1, maximum=3)
+    for _ in range(50):
+        limiter.acquire()
+        limiter.release("ok")
+    assert limiter.limit == 3
+
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release("saturated")
+    assert limiter.limit == 1
+    assert limiter.stats == {"calls": 55, "saturated": 5, "errors": 0}
+
+def test_saturation_halves_the_limit_and_errors_leave_it_alone():
+    limiter = AdaptiveLimiter("test", initial=8)
+    limiter.acquire()
+    limiter.release("saturated")
+    assert limiter.limit == 4
+
+    limiter.acquire()
+    limiter.release("error")
+    assert limiter.limit == 4
+    assert limiter.stats["errors"] == 1
+
+def test_blocked_limiter_holds_calls_until_the_window_resets():
+    limiter = AdaptiveLimiter("test")
+    limiter.block_for(0.2)
+    assert not limiter.acquire(timeout=0.05)
+
+    started = time.monotonic()
+    assert limiter.acquire(timeout=2)
+    assert time.monotonic() - started >= 0.1
+
+def test_low_remaining_requests_in_the_headers_block_new_calls():
+    limiter = AdaptiveLimiter("test")
+    limiter.observe({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "2s"})
+    assert 1.5 < limiter.wait_time() <= 2
+
+    plenty = AdaptiveLimiter("test")
+    plenty.observe({"anthropic-ratelimit-requests-remaining": "50", "anthropic-ratelimit-requests-reset": "2024-01-01T00:00:00Z"})
+    assert plenty.wait_time() == 0
+
+def test_saturated_streak_only_counts_while_blocked():
+    limiter = AdaptiveLimiter("test")
+    for _ in range(llm_gateway.SATURATED_STREAK):
+        limiter.acquire()
+        limiter.release("saturated")
+    assert not limiter.is_saturated()
+
+    limiter.block_for(0.5)
+    assert limiter.is_saturated()
+
+    long_block = AdaptiveLimiter("test")
+    long_block.block_for(llm_gateway.FALLBACK_AFTER + 5)
+    assert long_block.is_saturated()
+
+@pytest.mark.parametrize("value, seconds", [
+    ("12", 12.0),
+    ("1m30s", 90.0),
+    ("250ms", 0.25),
+    ("-3", 0.0),
+    ("soon", None),
+    (None, None),
+])
+def test_parse_reset(value, seconds):
+    assert parse_reset(value) == seconds
@@ -0,0 +1,71 @@
+import io
+import json
+
+import pytest
+
+from benchmarks.payloads import make_records
+from data_processing.data_cleaning import clean_data, clean_json_stream, DataValidationError, FIELD_SCHEMAS, RECORD_CLEANERS
+
+def stream(data):
+    return io.BytesIO(json.dumps(data).encode('utf-8'))
+
+def errors_of(clean, data):
+    with pytest.raises(DataValidationError) as raised:
+        clean(data)
+    return raised.value.errors
+
+def clean_streamed(data):
+    return clean_json_stream(stream(data))
+
+def test_both_paths_give_the_same_output():
+    data = {**make_records(10), "currentDate": "2024-W02"}
+    cleaned, extras = clean_streamed(data)
+    assert cleaned == clean_data(data)
+    assert extras == {"currentDate": "2024-W02"}
+
+@pytest.mark.parametrize("value", ["missing", None, {}, "text"])
+def test_both_paths_refuse_a_collection_that_is_not_a_list(value):
+    data = make_records(3)
+    if value == "missing":
+        del data["moodData"]
+    else:
+        data["moodData"] = value
+
+    expected = ["moodData: missing or not a list"]
+    assert errors_of(clean_data, data) == expected
+    assert errors_of(clean_streamed, data) == expected
+
+def test_empty_collections_are_accepted():
+    data = {collection: [] for collection in make_records(1)}
+    cleaned, _ = clean_streamed(data)
+    assert cleaned == clean_data(data)
+
+def test_both_paths_report_bad_records():
+    data = make_records(3)
+    del data["moodData"][1]["rating"]
+    data["timeData"][0] = "not a record"
+
+    expected = ["timeData[0]: expected an object, got str", "moodData[1]: missing field(s) rating"]
+    assert errors_of(clean_data, data) == expected
+    assert errors_of(clean_streamed, data) == expected
+
+def test_cleaners_keep_the_schema_fields_in_order():
+    data = make_records(2)
+    cleaned = clean_data(data)
+    for collection, fields in FIELD_SCHEMAS.items():
+        assert [list(record) for record in cleaned[collection]] == [fields] * len(data[collection])
+        assert list(RECORD_CLEANERS[collection](data[collection][0])) == fields
+
+def test_habits_come_from_dated_notes_only():
+    data = make_records(2)
+    del data["dailyNoteData"][1]["date"]
+    del data["dailyNoteData"][1]["booleanHabits"]
+    for clean in (clean_data, lambda payload: clean_streamed(payload)[0]):
+        cleaned = clean(data)
+        assert list(cleaned["quantifiableHabits"]) == [data["dailyNoteData"][0]["date"]]
+        assert cleaned["dailyNoteData"][1]["date"] is None
+
+    data["dailyNoteData"][1]["date"] = "2024-01-02"
+    expected = ["dailyNoteData[1]: missing field(s) booleanHabits"]
+    assert errors_of(clean_data, data) == expected
+    assert errors_of(clean_streamed, data) == expected
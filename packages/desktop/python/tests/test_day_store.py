@@ -0,0 +1,42 @@
+from data_processing.data_processing import aggregate_data
+from data_processing.day_store import DayStore
+
+def saved_data():
+    # A savedData.json with mood entries, which used to raise KeyError in aggregate_data
+    return {
+        "quantifiableHabits": {"dates": ["2024-01-01", "2024-01-02"], "Pushups": [10, 20]},
+        "booleanHabits": {"dates": ["2024-01-02"], "Read": [True]},
+        "noteData": {"data": [{
+            "date": "2024-01-01", "morningComment": "slept ok", "wakeHour": "07:00", "energy": 3,
+            "success": "shipped it", "beBetter": "sleep earlier", "dayRating": 4, "sleepTime": "23:30",
+        }]},
+        "moodData": [
+            {"date": "2024-01-02T18:00:00", "rating": 2, "comment": "tired", "tag": "work", "description": "late"},
+            {"date": "2024-01-02T09:00:00", "rating": 4, "comment": "fine", "tag": "calm", "description": ""},
+            {"date": "2024-01-03T12:00:00", "rating": 5, "comment": "great", "tag": "happy", "description": "sun"},
+        ],
+        "journalData": {"data": [{"date": "2024-01-01", "journal": "long walk"}]},
+        "timeData": [{"date": "2024-01-01", "tag": "work"}],
+        "moneyData": [{"date": "2024-01-01", "amount": 12.5}],
+    }
+
+def test_aggregate_data_groups_moods_by_day():
+    aggregated = aggregate_data(saved_data())
+    day_data = aggregated["dayData"]
+
+    assert list(day_data) == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert [mood["rating"] for mood in day_data["2024-01-02"]["moodData"]] == [4, 2]
+    assert day_data["2024-01-03"]["moodData"][0]["comment"] == "great"
+    assert day_data["2024-01-01"]["moodData"] == []
+
+    assert day_data["2024-01-01"]["quantifiableHabits"] == {"pushups": 10}
+    assert day_data["2024-01-02"]["booleanHabits"] == {"read": True}
+    assert day_data["2024-01-01"]["noteData"]["dayRating"] == 4
+    assert day_data["2024-01-01"]["journal"] == "long walk"
+    assert aggregated["timeData"] == saved_data()["timeData"]
+    assert aggregated["moneyData"] == saved_data()["moneyData"]
+
+def test_aggregating_the_same_export_twice_changes_nothing():
+    store = DayStore()
+    once = aggregate_data(saved_data(), store)
+    assert aggregate_data(saved_data(), store) == once
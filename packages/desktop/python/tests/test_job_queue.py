@@ -0,0 +1,106 @@
+import threading
+
+import pytest
+
+from pipeline import job_queue
+
+@pytest.fixture(autouse=True)
+def jobs_db(tmp_path, monkeypatch):
+    # Every test gets its own sqlite file and an empty in memory state
+    monkeypatch.setattr(job_queue, "JOBS_DIR", str(tmp_path))
+    monkeypatch.setattr(job_queue, "JOBS_PATH", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(job_queue, "JOB_POLL_INTERVAL", 0.02)
+    monkeypatch.setattr(job_queue, "_connection", None)
+    monkeypatch.setattr(job_queue, "_jobs", {})
+    monkeypatch.setattr(job_queue, "_inflight", {})
+    yield
+    if job_queue._connection is not None:
+        job_queue._connection.close()
+
+def test_submitted_job_runs_and_can_be_waited_on():
+    job, created = job_queue.submit_job("weekly_summary", "key", lambda value: {"doubled": value * 2}, 21)
+
+    assert created
+    state = job_queue.wait_for_job(job.id, 5)
+    assert state["status"] == "done"
+    assert state["result"] == {"doubled": 42}
+    assert state["finished_at"] >= state["created_at"]
+
+def test_identical_request_in_flight_gets_the_same_job():
+    release = threading.Event()
+    runs = []
+
+    def slow():
+        runs.append(1)
+        release.wait(5)
+        return "done"
+
+    first, created = job_queue.submit_job("weekly_summary", "same", slow)
+    second, created_again = job_queue.submit_job("weekly_summary", "same", slow)
+    release.set()
+
+    assert created and not created_again
+    assert second is first
+    assert job_queue.wait_for_job(first.id, 5)["result"] == "done"
+    assert len(runs) == 1
+
+    # Once it finished the same request makes a new job
+    third, created = job_queue.submit_job("weekly_summary", "same", lambda: "again")
+    assert created and third.id != first.id
+    assert job_queue.wait_for_job(third.id, 5)["result"] == "again"
+
+def test_failed_job_keeps_the_error():
+    def failing():
+        raise RuntimeError("claude failed")
+
+    job, _ = job_queue.submit_job("weekly_summary", "key", failing)
+    state = job_queue.wait_for_job(job.id, 5)
+
+    assert state["status"] == "failed"
+    assert state["error"] == "claude failed"
+    assert state["result"] is None
+
+def test_wait_returns_the_current_state_after_the_timeout():
+    release = threading.Event()
+    job, _ = job_queue.submit_job("weekly_summary", "key", release.wait, 5)
+
+    state = job_queue.wait_for_job(job.id, 0.05)
+    assert state["status"] in ("queued", "running")
+
+    release.set()
+    assert job_queue.wait_for_job(job.id, 5)["status"] == "done"
+
+def test_job_of_another_worker_is_watched_through_sqlite():
+    # Saved but not registered in this process, like a job queued by another server worker
+    job = job_queue.Job("weekly_summary", "key")
+    job.status = "running"
+    job_queue._save(job)
+
+    def finish():
+        job.status = "done"
+        job.result = {"summary": "from the other worker"}
+        job.finished_at = job.created_at + 1
+        job_queue._save(job)
+
+    timer = threading.Timer(0.1, finish)
+    timer.start()
+    state = job_queue.wait_for_job(job.id, 5)
+    timer.join()
+
+    assert state["status"] == "done"
+    assert state["result"] == {"summary": "from the other worker"}
+
+def test_unknown_job_is_none():
+    assert job_queue.wait_for_job("missing", 0.05) is None
+    assert job_queue.get_job("missing") is None
+
+def test_interrupted_jobs_are_marked_failed():
+    job = job_queue.Job("weekly_summary", "key")
+    job.status = "running"
+    job_queue._save(job)
+
+    job_queue.recover_interrupted_jobs()
+
+    state = job_queue.get_job(job.id)
+    assert state["status"] == "failed"
+    assert state["error"] == "Interrupted by a server restart"
@@ -0,0 +1,65 @@
+import io
+import json
+
+import pytest
+
+from data_processing.json_stream import iter_records
+
+DOCUMENT = {
+    "currentDate": "2024-W05",
+    "moodData": [
+        {"date": "2024-01-29", "rating": 4, "comment": "café ☕ and a long walk 🚶"},
+        {"date": "2024-01-30", "rating": 1.25e2, "comment": "escaped \"quotes\" \\ and é"},
+    ],
+    "noteData": {"data": [{"date": "2024-01-29"}, []], "total": 12345},
+    "journalData": [],
+    "settings": {"bypassCache": True, "tags": [1, 2, 3]},
+    "count": 67890,
+}
+RECORD_PATHS = {("moodData",): "moodData", ("noteData", "data"): "notes", ("journalData",): "journalData"}
+
+EXPECTED = [
+    ("currentDate", "2024-W05"),
+    ("moodData", DOCUMENT["moodData"][0]),
+    ("moodData", DOCUMENT["moodData"][1]),
+    ("notes", {"date": "2024-01-29"}),
+    ("notes", []),
+    ("noteData.total", 12345),
+    ("settings", {"bypassCache": True, "tags": [1, 2, 3]}),
+    ("count", 67890),
+]
+
+def as_bytes(value, indent=None):
+    return io.BytesIO(json.dumps(value, ensure_ascii=False, indent=indent).encode('utf-8'))
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 64 * 1024])
+def test_records_come_out_one_at_a_time_whatever_the_chunk_size(chunk_size):
+    # Small chunks split keys, numbers, escapes and multi byte characters at every position
+    assert list(iter_records(as_bytes(DOCUMENT), RECORD_PATHS, chunk_size)) == EXPECTED
+
+def test_text_streams_and_whitespace():
+    text = io.StringIO(json.dumps(DOCUMENT, indent=4))
+    assert list(iter_records(text, RECORD_PATHS, 5)) == EXPECTED
+
+def test_records_are_yielded_before_the_rest_is_read():
+    stream = as_bytes({"moodData": [{"rating": index} for index in range(1000)]})
+    records = iter_records(stream, RECORD_PATHS, 16)
+    assert next(records) == ("moodData", {"rating": 0})
+    assert stream.tell() < 100
+
+def test_record_path_that_is_not_an_array_comes_out_as_a_value():
+    assert list(iter_records(as_bytes({"moodData": None}), RECORD_PATHS)) == [("moodData", None)]
+
+def test_empty_object():
+    assert list(iter_records(io.BytesIO(b" { } "), RECORD_PATHS)) == []
+
+@pytest.mark.parametrize("body", [
+    b'{"moodData": [{"rating": 1}',
+    b'{"moodData": [{"rating": 1}] "count": 1}',
+    b'[1, 2]',
+    b'{"count": 1} {"count": 2}',
+    b'{"comment": "caf\xc3',
+])
+def test_broken_documents_raise_value_error(body):
+    with pytest.raises(ValueError):
+        list(iter_records(io.BytesIO(body), RECORD_PATHS, 4))
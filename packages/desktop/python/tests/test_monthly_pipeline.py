@@ -0,0 +1,17 @@
+import threading
+
+import pytest
+
+from pipeline import monthly_pipeline
+from pipeline.summary_pipeline import StageTimeoutError
+
+def test_week_summary_timeout_is_a_stage_timeout(monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(monthly_pipeline, "generate_week_summary", lambda week_data, use_cache=True: release.wait(5))
+    monkeypatch.setattr(monthly_pipeline, "WEEK_SUMMARY_TIMEOUT", 0.05)
+    note_data = [{"date": f"2024-10-{day:02d}", "energy": 3, "dayRating": 4} for day in range(7, 21)]
+    try:
+        with pytest.raises(StageTimeoutError):
+            monthly_pipeline.build_incremental_monthly_data(note_data, [], [])
+    finally:
+        release.set()
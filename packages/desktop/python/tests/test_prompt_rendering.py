@@ -0,0 +1,21 @@
+from ai_helpers.prompt_rendering import fit_to_budget, render_data, render_prompt_data, estimate_tokens
+from metrics import PROMPT_DATA_TOKENS
+
+def rows(days):
+    return [{"date": f"2024-01-{day:02d}", "rating": day} for day in days]
+
+def test_rows_out_of_order_still_drop_the_oldest_first():
+    data = {"mood_data": rows([5, 1, 4, 2, 3])}
+    text, trimmed = fit_to_budget(data, estimate_tokens(render_data({"mood_data": rows([4, 5])})))
+    assert trimmed == ["dropped 3 oldest rows"]
+    assert text == render_data({"mood_data": rows([4, 5])})
+    # The caller's data is left alone
+    assert [row["date"] for row in data["mood_data"]] == ["2024-01-05", "2024-01-01", "2024-01-04", "2024-01-02", "2024-01-03"]
+
+def test_every_prompt_counts_its_saved_tokens():
+    before = PROMPT_DATA_TOKENS.value(prompt="test prompt", type="saved")
+    data = {"mood_data": rows(range(1, 29))}
+    text = render_prompt_data(data, name="test prompt")
+    saved = estimate_tokens(str(data)) - estimate_tokens(text)
+    assert saved > 0
+    assert PROMPT_DATA_TOKENS.value(prompt="test prompt", type="saved") - before == saved
@@ -0,0 +1,60 @@
+import json
+
+from quotes.quote_store import QuoteStore
+
+def quote(quote_id, author, tags):
+    return {"_id": quote_id, "content": f"quote {quote_id}", "author": author, "authorSlug": author.lower().replace(" ", "-"), "tags": tags}
+
+QUOTES = [
+    quote("a", "Oscar Wilde", ["Wisdom", "Humor"]),
+    quote("b", "Seneca", ["Wisdom"]),
+    quote("c", "Oscar Wilde", ["Life"]),
+]
+
+def open_store(tmp_path, compact_after=100):
+    return QuoteStore(str(tmp_path / "quotes.json"), str(tmp_path / "quotes.jsonl"), compact_after)
+
+def ids(quotes):
+    return [quote["_id"] for quote in quotes]
+
+def test_lookups_go_through_the_author_and_tag_indexes(tmp_path):
+    (tmp_path / "quotes.json").write_text(json.dumps(QUOTES))
+    store = open_store(tmp_path)
+
+    assert ids(store.filter(author="oscar-wilde")) == ["a", "c"]
+    assert ids(store.filter(author="Oscar Wilde")) == ["a", "c"]
+    assert ids(store.filter(tag="wisdom")) == ["a", "b"]
+    assert ids(store.filter(author="Oscar Wilde", tag="WISDOM")) == ["a"]
+    assert store.filter(author="Plato") == []
+    assert store.get("b")["author"] == "Seneca"
+    assert store.tags() == {"humor": 1, "life": 1, "wisdom": 2}
+
+def test_the_log_is_replayed_after_compaction(tmp_path):
+    store = open_store(tmp_path, compact_after=3)
+    assert store.add_many(QUOTES[:2]) == 2
+    assert (tmp_path / "quotes.jsonl").read_text().count("\n") == 2
+
+    # The third logged quote folds the log into quotes.json
+    assert store.add_many(QUOTES[2:] + QUOTES[:1]) == 1
+    assert ids(json.loads((tmp_path / "quotes.json").read_text())) == ["a", "b", "c"]
+    assert (tmp_path / "quotes.jsonl").read_text() == ""
+
+    store.add_many([quote("d", "Seneca", ["Time"])])
+    reopened = open_store(tmp_path)
+    assert ids(reopened.quotes) == ["a", "b", "c", "d"]
+    assert ids(reopened.filter(author="seneca")) == ["b", "d"]
+
+def test_a_log_left_behind_by_a_crash_does_not_duplicate_quotes(tmp_path):
+    (tmp_path / "quotes.json").write_text(json.dumps(QUOTES))
+    (tmp_path / "quotes.jsonl").write_text(json.dumps(QUOTES[1]) + "\n" + '{"_id": "cut sho')
+    store = open_store(tmp_path)
+    assert ids(store.quotes) == ["a", "b", "c"]
+    assert ids(store.filter(tag="wisdom")) == ["a", "b"]
+
+def test_quotes_added_by_another_process_are_reloaded(tmp_path):
+    store = open_store(tmp_path)
+    assert store.reload_if_changed() is False
+
+    open_store(tmp_path).add_many([QUOTES[1]])
+    assert store.reload_if_changed() is True
+    assert ids(store.filter(tag="wisdom")) == ["b"]
@@ -0,0 +1,88 @@
+import os
+import multiprocessing
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from ai_helpers import semantic_index
+from ai_helpers.semantic_index import SemanticIndex, local_embed, records_from_data
+
+def journal(day, text):
+    return {"id": f"journal:2024-01-{day:02d}", "date": f"2024-01-{day:02d}", "kind": "journal", "text": text}
+
+def open_index(directory):
+    # One instance per server worker, they only share the folder
+    return SemanticIndex("test", local_embed, str(directory))
+
+def vector_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.npy'))
+
+def test_update_embeds_only_new_or_changed_records(tmp_path):
+    index = open_index(tmp_path)
+    assert index.update([journal(1, "long walk by the river"), journal(2, "deadline at work")])["embedded"] == 2
+    assert index.update([journal(1, "long walk by the river"), journal(2, "deadline met at work")]) == {"embedded": 1, "unchanged": 1, "total": 2}
+    assert len(vector_files(tmp_path)) == 1
+
+    reopened = open_index(tmp_path)
+    assert [result["date"] for result in reopened.search("walk by the river", k=1)] == ["2024-01-01"]
+
+def test_workers_sharing_the_folder_keep_each_others_entries(tmp_path):
+    first = open_index(tmp_path)
+    second = open_index(tmp_path)
+
+    first.update([journal(1, "long walk by the river")])
+    second.update([journal(2, "deadline at work")])
+    first.update([journal(3, "dinner with friends")])
+
+    assert [entry["id"] for entry in first.entries] == ["journal:2024-01-01", "journal:2024-01-02", "journal:2024-01-03"]
+    # A search picks up what another worker saved since
+    assert [result["date"] for result in second.search("dinner with friends", k=1)] == ["2024-01-03"]
+    assert len(vector_files(tmp_path)) == 1
+
+def test_old_manifest_without_a_vectors_name_still_loads(tmp_path):
+    np.save(tmp_path / "vectors-3.npy", local_embed(["long walk"]))
+    (tmp_path / "manifest.json").write_text(
+        '{"model": "test", "generation": 3, "entries": [{"id": "journal:2024-01-01", "date": "2024-01-01", "kind": "journal", "text": "long walk", "hash": "x"}]}'
+    )
+    index = open_index(tmp_path)
+    assert index.generation == 3
+    assert len(index.entries) == 1
+
+def test_notes_on_the_same_day_get_their_own_entries(tmp_path):
+    data = {"dailyNoteData": [
+        {"date": "2024-01-01", "morningComment": "long walk by the river"},
+        {"date": "2024-01-01T10:00", "morningComment": "deadline at work"},
+    ]}
+    records = records_from_data(data)
+    assert [record["id"] for record in records] == ["morningComment:2024-01-01", "morningComment:2024-01-01#2"]
+
+    index = open_index(tmp_path)
+    assert index.update(records) == {"embedded": 2, "unchanged": 0, "total": 2}
+    assert [result["text"] for result in index.search("deadline at work", k=1)] == ["deadline at work"]
+
+def test_repeated_ids_in_one_update_keep_the_last_record(tmp_path):
+    index = open_index(tmp_path)
+    assert index.update([journal(1, "long walk by the river"), journal(1, "deadline at work")]) == {"embedded": 1, "unchanged": 0, "total": 1}
+    assert [entry["text"] for entry in index.entries] == ["deadline at work"]
+    assert index.vectors.shape[0] == 1
+
+def _update_in_worker(directory, day):
+    index = open_index(directory)
+    for round_number in range(5):
+        index.update([journal(day, f"worker {day} round {round_number} wrote about the week")])
+
+@pytest.mark.skipif(semantic_index.fcntl is None or "fork" not in multiprocessing.get_all_start_methods(), reason="needs fork and fcntl")
+def test_concurrent_worker_processes_do_not_lose_updates(tmp_path):
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_update_in_worker, args=(str(tmp_path), day)) for day in range(1, 5)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+        assert worker.exitcode == 0
+
+    index = open_index(tmp_path)
+    assert sorted(entry["id"] for entry in index.entries) == [f"journal:2024-01-{day:02d}" for day in range(1, 5)]
+    assert index.vectors.shape[0] == 4
+    assert [entry["text"] for entry in index.entries] == [f"worker {int(entry['date'][-2:])} round 4 wrote about the week" for entry in index.entries]
@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+
+from pipeline.single_flight import SingleFlight
+
+def start_callers(flight, key, fn, count):
+    # Returns the threads and a list that collects what each of them got back (or raised)
+    outcomes = []
+    lock = threading.Lock()
+
+    def call():
+        try:
+            result = flight.do(key, fn)
+        except Exception as e:
+            result = e
+        with lock:
+            outcomes.append(result)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+def test_identical_calls_in_flight_share_one_execution(wait_until):
+    flight = SingleFlight("test")
+    release = threading.Event()
+    runs = []
+
+    def slow():
+        runs.append(1)
+        release.wait(5)
+        return {"summary": "shared"}
+
+    threads, outcomes = start_callers(flight, "week-1", slow, 4)
+    assert wait_until(lambda: flight.stats["coalesced"] == 3)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(runs) == 1
+    assert outcomes == [{"summary": "shared"}] * 4
+    assert flight.snapshot() == {"requests": 4, "executions": 1, "coalesced": 3, "in_flight": 0}
+
+def test_waiting_callers_get_the_same_exception(wait_until):
+    flight = SingleFlight("test")
+    release = threading.Event()
+    error = RuntimeError("claude failed")
+
+    def failing():
+        release.wait(5)
+        raise error
+
+    threads, outcomes = start_callers(flight, "week-1", failing, 3)
+    assert wait_until(lambda: flight.stats["coalesced"] == 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert outcomes == [error] * 3
+
+def test_different_keys_run_separately():
+    flight = SingleFlight("test")
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.stats["executions"] == 2
+
+def test_nothing_is_kept_once_the_call_finishes():
+    flight = SingleFlight("test")
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("a", lambda: 2) == 2
+    with pytest.raises(ValueError):
+        flight.do("a", int, "not a number")
+    assert flight.do("a", lambda: 3) == 3
+    assert flight.snapshot()["in_flight"] == 0
@@ -0,0 +1,37 @@
+import pytest
+
+from ai_helpers.thoughts import validate_sections
+
+PILLARS = [
+    {"uuid": "uuid-health", "name": "Health", "emoji": "🔵"},
+    {"uuid": "uuid-work", "name": "Work", "emoji": "🟢"},
+]
+
+def reply(goals):
+    return {
+        "successes": ["a", "b", "c"],
+        "areas_for_improvement": ["a", "b", "c"],
+        "insights": ["a", "b", "c"],
+        "next_week_goals": goals,
+    }
+
+def goal(pillar_uuid, pillar_name="Nothing like it"):
+    return {"goal": "Sleep earlier", "pillar_uuid": pillar_uuid, "pillar_name": pillar_name, "pillar_emoji": "🔵"}
+
+def test_goals_take_name_and_emoji_from_the_fetched_pillar():
+    valid, errors = validate_sections(reply([goal("uuid-health"), goal("made-up", "work"), goal("uuid-work")]), PILLARS)
+    assert errors == {}
+    assert [(g.pillar_uuid, g.pillar_name, g.pillar_emoji) for g in valid["next_week_goals"]] == [
+        ("uuid-health", "Health", "🔵"), ("uuid-work", "Work", "🟢"), ("uuid-work", "Work", "🟢"),
+    ]
+
+@pytest.mark.parametrize("pillar_uuid, pillar_name", [
+    (["uuid-health"], None),
+    ({"uuid": "uuid-health"}, ["Health"]),
+    (None, {"name": "Health"}),
+    (42, 42),
+])
+def test_pillar_that_is_not_a_string_goes_to_repair(pillar_uuid, pillar_name):
+    valid, errors = validate_sections(reply([goal("uuid-health"), goal(pillar_uuid, pillar_name), goal("uuid-work")]), PILLARS)
+    assert "next_week_goals" not in valid
+    assert errors == {"next_week_goals": [f"goal 2 has unknown pillar_uuid {pillar_uuid!r}"]}
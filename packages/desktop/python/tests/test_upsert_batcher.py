@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+from database import database_functions
+from database.upsert_batcher import UpsertBatcher, gpt_record
+
+@pytest.fixture
+def db(stubs, monkeypatch):
+    monkeypatch.setattr(database_functions, "DB_SERVICE_URL", stubs.url)
+    return stubs
+
+def test_flushes_when_the_batch_is_full(db, wait_until):
+    batcher = UpsertBatcher(batch_size=3, flush_interval=60)
+    try:
+        for day in range(3):
+            batcher.enqueue(gpt_record(f"2024-01-0{day + 1}", "Mood Summary", "summary"))
+        # Long before the interval, the full batch wakes the worker
+        assert wait_until(lambda: batcher.stats["flushes"] == 1)
+        assert batcher.stats["sent"] == 3
+        assert len(db.upserts) == 3
+    finally:
+        batcher.stop()
+
+def test_flushes_after_the_interval(db, wait_until):
+    batcher = UpsertBatcher(batch_size=100, flush_interval=0.2)
+    try:
+        started = time.monotonic()
+        batcher.enqueue(gpt_record("2024-01-01", "Mood Summary", "summary"))
+        assert db.upserts == []
+        assert wait_until(lambda: len(db.upserts) == 1)
+        assert time.monotonic() - started >= 0.15
+    finally:
+        batcher.stop()
+
+def test_newer_version_of_a_waiting_record_replaces_it(db):
+    batcher = UpsertBatcher(batch_size=100, flush_interval=60)
+    batcher.enqueue(gpt_record("2024-01-01", "Mood Summary", "first"))
+    batcher.enqueue(gpt_record("2024-01-01", "Mood Summary", "second"))
+    batcher.enqueue(gpt_record("2024-01-02", "Mood Summary", "other day"))
+    batcher.stop()
+
+    assert [record["summary"] for record in db.upserts] == ["second", "other day"]
+    assert batcher.stats["coalesced"] == 1
+    assert batcher.stats["queued"] == 3
+
+def test_stop_flushes_what_is_waiting_and_ends_the_worker(db):
+    batcher = UpsertBatcher(batch_size=100, flush_interval=60)
+    batcher.enqueue(gpt_record("2024-01-01", "Mood Summary", "summary"))
+    worker = batcher._worker
+
+    started = time.monotonic()
+    batcher.stop()
+
+    assert time.monotonic() - started < 5
+    assert not worker.is_alive()
+    assert len(db.upserts) == 1
+
+def test_failed_upserts_are_counted(stubs, monkeypatch):
+    # The stub answers unknown routes with a 404
+    monkeypatch.setattr(database_functions, "DB_SERVICE_URL", f"{stubs.url}/missing")
+    batcher = UpsertBatcher(batch_size=100, flush_interval=60)
+    batcher.enqueue(gpt_record("2024-01-01", "Mood Summary", "summary"))
+    batcher.stop()
+
+    assert batcher.stats["failed"] == 1
+    assert batcher.stats["sent"] == 0
+
+def test_same_date_and_type_map_to_the_same_uuid():
+    first = gpt_record("2024-01-01", "Mood Summary", "a")
+    assert gpt_record("2024-01-01", "Mood Summary", "b")["uuid"] == first["uuid"]
+    assert gpt_record("2024-01-01", "Monthly Summary", "a")["uuid"] != first["uuid"]